@@ -0,0 +1,166 @@
+"""Crash-safe file writes for the patient data tree.
+
+Every file is written to a temp file, fsynced and renamed into place, so a
+reader sees either the old or the new content. WriteTransaction batches a
+multi-file save: all temp files are written and fsynced first, then renamed
+in the order they were staged. One file can be marked as the commit point:
+readers trust only what it refers to, so a crash at any rename before it
+leaves the previous save visible and any rename after it the new one. The
+directories of the files renamed before it are fsynced before the commit
+point is renamed, so a commit that survives a power loss never names a file
+that did not. If the process dies before the renames nothing changes on
+disk except stray .tmp files, which every reader ignores.
+
+"latest" files are small pointers ({"pointer": "<file name>"}) to the newest
+timestamped file in the same folder rather than a second copy of the data.
+resolve_pointer also accepts the plain data copies written by older versions.
+"""
+import json
+import os
+import threading
+
+from instrumentation import count, record_bytes, span
+
+POINTER_KEY = "pointer"
+POINTER_PREFIX = b'{"pointer":'
+
+
+def _temp_name(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _write_temp(path, payload, sync=True):
+    temp = _temp_name(path)
+    with open(temp, 'wb') as f:
+        f.write(payload)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+            count("io.fsync")
+    record_bytes("io.write", len(payload))
+    return temp
+
+
+def fsync_directory(directory):
+    """fsync a directory so renames inside it survive a crash (no-op where unsupported)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+        count("io.fsync")
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, payload, sync=True):
+    """Write bytes to path through a fsynced temp file and rename"""
+    temp = _write_temp(path, payload, sync)
+    try:
+        os.replace(temp, path)
+    except OSError:
+        os.remove(temp)
+        raise
+    if sync:
+        fsync_directory(os.path.dirname(path) or ".")
+
+
+def pointer_payload(pointer_path, target_path):
+    """Return the bytes of a pointer file at pointer_path referring to target_path"""
+    target = os.path.relpath(target_path, os.path.dirname(pointer_path) or ".")
+    return json.dumps({POINTER_KEY: target.replace(os.sep, "/")}).encode("utf-8")
+
+
+def resolve_pointer(path):
+    """Return the file a latest pointer refers to, path itself for a plain data file, or None"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(4096)
+    except OSError:
+        return None
+    if not head.startswith(POINTER_PREFIX):
+        return path
+    try:
+        target = json.loads(head)[POINTER_KEY]
+    except (ValueError, KeyError):
+        return None
+    return os.path.join(os.path.dirname(path), *target.split("/"))
+
+
+class WriteTransaction:
+    """All-or-nothing batch of file writes and pointer updates
+
+    Writes are staged in memory and applied by commit(); renames happen in
+    staging order, so stage the file that makes a save visible last, or
+    mark it with commit=True.
+    """
+
+    def __init__(self, sync=True):
+        """Start an empty transaction; sync=False skips every fsync"""
+        self.sync = sync
+        self._staged = []
+
+    def write(self, path, payload, commit=False):
+        """Stage bytes to be written to path; commit=True makes it the commit point"""
+        self._staged.append((path, payload, commit))
+
+    def write_json(self, path, data, indent=4, commit=False):
+        """Stage data to be written to path as JSON"""
+        self.write(path, json.dumps(data, indent=indent).encode("utf-8"), commit)
+
+    def point(self, pointer_path, target_path, commit=False):
+        """Stage pointer_path to refer to target_path"""
+        self.write(pointer_path, pointer_payload(pointer_path, target_path), commit)
+
+    def commit(self):
+        """Write and fsync every staged file, rename them in order, then fsync their directories
+
+        With a commit point, the other directories holding files renamed
+        before it are fsynced just before it is renamed, and its own
+        directory right after. Each touched directory is fsynced once.
+        """
+        with span("io.transaction_commit"):
+            return self._commit()
+
+    def _commit(self):
+        temps = []
+        try:
+            for path, payload, _ in self._staged:
+                temps.append((_write_temp(path, payload, self.sync), path))
+        except OSError:
+            for temp, _ in temps:
+                os.remove(temp)
+            raise
+        commit_dirs = {os.path.dirname(path) or "." for path, _, commit in self._staged if commit}
+        renamed = []
+        synced = set()
+        for (temp, path), (_, _, commit) in zip(temps, self._staged):
+            if commit and self.sync:
+                # Everything the commit point refers to must be durable before it is
+                for directory in renamed:
+                    if directory not in commit_dirs and directory not in synced:
+                        fsync_directory(directory)
+                        synced.add(directory)
+            os.replace(temp, path)
+            directory = os.path.dirname(path) or "."
+            if directory not in renamed:
+                renamed.append(directory)
+        if self.sync:
+            for directory in renamed:
+                if directory not in synced:
+                    fsync_directory(directory)
+        self._staged = []
+        return len(temps)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self._staged = []
+        return False
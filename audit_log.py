@@ -0,0 +1,146 @@
+import atexit
+import json
+import os
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: rely on O_APPEND for whole-batch writes
+    fcntl = None
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def _forget_loggers_after_fork():
+    # A forked child has no flusher thread; let it start its own loggers
+    global _loggers_lock
+    _loggers.clear()
+    _loggers_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_loggers_after_fork)
+
+
+def get_audit_logger(log_directory, **options):
+    """Return the process-wide AuditLogger for log_directory, creating it on first use"""
+    key = os.path.abspath(log_directory)
+    with _loggers_lock:
+        logger = _loggers.get(key)
+        if logger is None:
+            logger = AuditLogger(log_directory, **options)
+            _loggers[key] = logger
+        return logger
+
+
+class AuditLogger:
+    """Buffered writer for the monthly audit_log_YYYY_MM.jsonl files
+
+    Entries are batched in memory and appended with one write per month file,
+    either when max_batch entries are pending, every flush_interval seconds
+    from a background thread, or when flush() is called. Each batch write
+    takes an exclusive file lock (where available) and uses O_APPEND, so
+    concurrent sessions and processes never interleave partial lines.
+    flush(sync=True) additionally fsyncs, and is the durability point used
+    after saves and backups.
+    """
+
+    def __init__(self, log_directory, flush_interval=1.0, max_batch=256):
+        """Start the background flusher for log_directory"""
+        self.log_directory = log_directory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._handles = {}
+        self.entries_written = 0
+        self.batches_written = 0
+        self._stopped = threading.Event()
+        os.makedirs(log_directory, exist_ok=True)
+        if flush_interval:
+            self._thread = threading.Thread(target=self._run, name="audit-log-flusher", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, entry, month_year=None):
+        """Queue an audit entry for the month file it belongs to"""
+        month_year = month_year or datetime.now().strftime("%Y_%m")
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._pending.append((month_year, line))
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self.flush()
+
+    def flush(self, sync=False):
+        """Write pending entries; with sync=True also fsync the touched files"""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            by_month = {}
+            for month_year, line in pending:
+                by_month.setdefault(month_year, []).append(line)
+            touched = set()
+            months = list(by_month)
+            for index, month_year in enumerate(months):
+                lines = by_month[month_year]
+                try:
+                    fd = self._handle(month_year)
+                    self._append(fd, "".join(lines).encode("utf-8"))
+                except OSError:
+                    # Put back everything not yet written so no entry is lost
+                    unwritten = [(month, line) for month in months[index:] for line in by_month[month]]
+                    with self._lock:
+                        self._pending[:0] = unwritten
+                    raise
+                touched.add(month_year)
+                self.entries_written += len(lines)
+                self.batches_written += 1
+            if sync:
+                for month_year, fd in self._handles.items():
+                    if month_year in touched or not pending:
+                        os.fsync(fd)
+            return len(pending)
+
+    def close(self):
+        """Flush and fsync pending entries and close the month files"""
+        self._stopped.set()
+        self.flush(sync=True)
+        with self._write_lock:
+            for fd in self._handles.values():
+                os.close(fd)
+            self._handles.clear()
+
+    def _handle(self, month_year):
+        fd = self._handles.get(month_year)
+        if fd is None:
+            # Keep only the current month open; older months are closed on rollover
+            for old_month in list(self._handles):
+                os.fsync(self._handles[old_month])
+                os.close(self._handles.pop(old_month))
+            path = os.path.join(self.log_directory, f"audit_log_{month_year}.jsonl")
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._handles[month_year] = fd
+        return fd
+
+    def _append(self, fd, payload):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            view = memoryview(payload)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError:
+                pass
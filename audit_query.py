@@ -0,0 +1,249 @@
+"""Query the monthly audit_log_YYYY_MM.jsonl files written by AuditLogger.
+
+scan_entries streams every month file line by line and filters lazily. It
+needs no index, but each query reads the whole log. AuditIndex keeps a
+SQLite sidecar (audit_index.db next to the logs) holding the byte offset,
+patient_id, action_type, user and timestamp of every line. A query then
+reads only the matching lines. The index records how far into each month
+file it has read, so refresh() only parses lines appended since the last
+refresh. A file that shrank is indexed again from the start. Results are
+generators in either mode, so memory use does not grow with the log size.
+
+    python audit_query.py patient_data/audit_logs --patient P001 --since 2025-01-01
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+
+INDEX_FILENAME = "audit_index.db"
+LOG_FILE_PATTERN = re.compile(r"^audit_log_(\d{4})_(\d{2})\.jsonl$")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+INDEX_BATCH = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    month TEXT PRIMARY KEY,
+    indexed_bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    month TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    action_type TEXT NOT NULL,
+    user TEXT NOT NULL,
+    PRIMARY KEY (month, offset)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_patient ON entries (patient_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_entries_action ON entries (action_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries (timestamp);
+"""
+
+
+def _timestamp_bound(value):
+    """Normalise a date, datetime or timestamp string to the audit timestamp format"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def _month_bounds(since, until):
+    """Return the YYYY_MM range a time range can touch"""
+    low = since[:7].replace("-", "_") if since else None
+    high = until[:7].replace("-", "_") if until else None
+    return low, high
+
+
+def list_log_files(log_directory, since=None, until=None):
+    """Return (month, path) for each month file that can hold entries in the time range, oldest first"""
+    low, high = _month_bounds(_timestamp_bound(since), _timestamp_bound(until))
+    files = []
+    for name in os.listdir(log_directory):
+        match = LOG_FILE_PATTERN.match(name)
+        if not match:
+            continue
+        month = f"{match.group(1)}_{match.group(2)}"
+        if (low and month < low) or (high and month > high):
+            continue
+        files.append((month, os.path.join(log_directory, name)))
+    return sorted(files)
+
+
+def _matches(entry, patient_id, action_type, user, since, until):
+    timestamp = entry.get("timestamp", "")
+    return ((patient_id is None or entry.get("patient_id") == patient_id)
+            and (action_type is None or entry.get("action_type") == action_type)
+            and (user is None or entry.get("user") == user)
+            and (since is None or timestamp >= since)
+            and (until is None or timestamp <= until))
+
+
+def scan_entries(log_directory, patient_id=None, action_type=None, user=None, since=None, until=None):
+    """Yield matching audit entries by streaming every month file (no index)"""
+    since, until = _timestamp_bound(since), _timestamp_bound(until)
+    for _, path in list_log_files(log_directory, since, until):
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a line still being appended
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if _matches(entry, patient_id, action_type, user, since, until):
+                    yield entry
+
+
+class AuditIndex:
+    """Incrementally maintained SQLite index over the audit log files"""
+
+    def __init__(self, log_directory, index_path=None):
+        """Open (or create) the index for log_directory"""
+        self.log_directory = log_directory
+        self.index_path = index_path or os.path.join(log_directory, INDEX_FILENAME)
+        self._conn = sqlite3.connect(self.index_path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        """Close the index database"""
+        self._conn.close()
+
+    def refresh(self):
+        """Index lines appended since the last refresh and return how many were added"""
+        known = dict(self._conn.execute("SELECT month, indexed_bytes FROM files"))
+        added = 0
+        for month, path in list_log_files(self.log_directory):
+            size = os.path.getsize(path)
+            start = known.get(month, 0)
+            if size < start:
+                # The file was truncated or replaced: index it again from the start
+                with self._conn:
+                    self._conn.execute("DELETE FROM entries WHERE month = ?", (month,))
+                start = 0
+            if size > start:
+                added += self._index_file(month, path, start)
+        return added
+
+    def _index_file(self, month, path, offset):
+        added = 0
+        rows = []
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial line: pick it up on the next refresh
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    entry = None
+                if isinstance(entry, dict):
+                    rows.append((month, offset, str(entry.get("timestamp", "")),
+                                 str(entry.get("patient_id", "")), str(entry.get("action_type", "")),
+                                 str(entry.get("user", ""))))
+                offset += len(line)
+                if len(rows) >= INDEX_BATCH:
+                    self._store(month, rows, offset)
+                    added += len(rows)
+                    rows = []
+        self._store(month, rows, offset)
+        return added + len(rows)
+
+    def _store(self, month, rows, indexed_bytes):
+        # Rows and the file position commit together, so an interrupted refresh resumes cleanly
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO files (month, indexed_bytes) VALUES (?, ?)",
+                               (month, indexed_bytes))
+
+    def _where(self, patient_id, action_type, user, since, until):
+        clauses = []
+        params = []
+        for column, value in (("patient_id", patient_id), ("action_type", action_type), ("user", user)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(_timestamp_bound(since))
+        if until is not None:
+            clauses.append("timestamp <= ?")
+            params.append(_timestamp_bound(until))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, patient_id=None, action_type=None, user=None, since=None, until=None,
+              limit=None, newest_first=False, refresh=True):
+        """Yield matching audit entries in time order, reading only the matching lines"""
+        if refresh:
+            self.refresh()
+        where, params = self._where(patient_id, action_type, user, since, until)
+        order = "DESC" if newest_first else "ASC"
+        sql = (f"SELECT month, offset FROM entries{where} "
+               f"ORDER BY timestamp {order}, month {order}, offset {order}")
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        handles = {}
+        try:
+            for month, offset in self._conn.execute(sql, params):
+                f = handles.get(month)
+                if f is None:
+                    f = handles[month] = open(
+                        os.path.join(self.log_directory, f"audit_log_{month}.jsonl"), 'rb')
+                f.seek(offset)
+                yield json.loads(f.readline())
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def count(self, patient_id=None, action_type=None, user=None, since=None, until=None, refresh=True):
+        """Return the number of matching audit entries"""
+        if refresh:
+            self.refresh()
+        where, params = self._where(patient_id, action_type, user, since, until)
+        return self._conn.execute(f"SELECT COUNT(*) FROM entries{where}", params).fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the patient data audit logs")
+    parser.add_argument("log_directory", nargs="?", default=os.path.join("patient_data", "audit_logs"))
+    parser.add_argument("--patient", dest="patient_id")
+    parser.add_argument("--action", dest="action_type")
+    parser.add_argument("--user")
+    parser.add_argument("--since", help="YYYY-MM-DD[ HH:MM:SS]")
+    parser.add_argument("--until", help="YYYY-MM-DD[ HH:MM:SS]")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--newest-first", action="store_true", help="newest entries first (indexed queries)")
+    parser.add_argument("--count", action="store_true", help="print only the number of matches")
+    parser.add_argument("--no-index", action="store_true", help="stream the files instead of using the index")
+    args = parser.parse_args(argv)
+
+    # A bare date as --until means the whole day
+    until = f"{args.until} 23:59:59" if args.until and len(args.until) == 10 else args.until
+    filters = {"patient_id": args.patient_id, "action_type": args.action_type, "user": args.user,
+               "since": args.since, "until": until}
+    if args.no_index:
+        entries = scan_entries(args.log_directory, **filters)
+        if args.count:
+            print(sum(1 for _ in entries))
+            return 0
+        if args.limit:
+            entries = (entry for _, entry in zip(range(args.limit), entries))
+    else:
+        index = AuditIndex(args.log_directory)
+        if args.count:
+            print(index.count(**filters))
+            return 0
+        entries = index.query(limit=args.limit, newest_first=args.newest_first, **filters)
+    for entry in entries:
+        sys.stdout.write(json.dumps(entry) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Debounced background autosave of the patient being edited.
+
+The app calls record() on every rerun with the current form and drawing
+state. Each record component (demographics, medical record, drawings) is
+fingerprinted, and nothing is queued unless one of them changed. Edits to a
+patient that arrive while a save is still pending are merged into it: the
+pending save keeps the newest data and the union of changed components.
+
+State is kept per (session, patient): each browser session's edits are
+compared with what that session loaded or last saved, so an idle session
+never writes its stale copy over another session's edit, and a session's
+pending save is never dropped by another session loading the patient.
+
+A pending save is written once the patient has been quiet for the debounce
+window, or once its oldest unsaved edit is max_staleness seconds old,
+whichever comes first. No patient is written more than max_write_rate times
+a second. Writes go through DataManager.save_patient_components, so only
+the changed component files are rewritten.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from data_manager import (COMPONENT_DEMOGRAPHICS, COMPONENT_DRAWINGS, COMPONENT_MEDICAL_RECORD,
+                          RECORD_COMPONENTS)
+from record_cache import copy_record
+
+logger = logging.getLogger(__name__)
+
+# Record fields that make up each component, as read by DataManager's payload builders
+COMPONENT_FIELDS = {
+    COMPONENT_DEMOGRAPHICS: ("name", "age"),
+    COMPONENT_MEDICAL_RECORD: ("diagnosis", "diagnosis_other", "left_eye", "right_eye", "va_left",
+                               "va_right", "iop_left", "iop_right", "provider"),
+    COMPONENT_DRAWINGS: ("left_drawings", "right_drawings", "legend_data"),
+}
+
+
+def component_fingerprints(data):
+    """Return {component: content hash} for a patient record dict"""
+    fingerprints = {}
+    for component in RECORD_COMPONENTS:
+        values = [data.get(field) for field in COMPONENT_FIELDS[component]]
+        encoded = json.dumps(values, sort_keys=True, separators=(",", ":"), default=str)
+        fingerprints[component] = hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+    return fingerprints
+
+
+class PendingSave:
+    """Unsaved edits to one patient"""
+
+    def __init__(self, data, components, version, now):
+        """Start a pending save from the first changed edit"""
+        self.data = data
+        self.components = set(components)
+        self.version = version
+        self.first_edit = now
+        self.last_edit = now
+
+
+class Autosaver:
+    """Background thread that coalesces edits and writes only changed components"""
+
+    def __init__(self, data_manager, debounce=2.0, max_staleness=10.0, max_write_rate=0.5):
+        """Start the autosave thread writing through data_manager
+
+        debounce is the quiet period before a save, max_staleness the longest
+        an edit may wait for the patient to go quiet, and max_write_rate the
+        most saves per second for one patient.
+        """
+        self.data_manager = data_manager
+        self.debounce = debounce
+        self.max_staleness = max_staleness
+        self.min_interval = 1.0 / max_write_rate if max_write_rate else 0.0
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._known = {}
+        self._pending = {}
+        self._versions = {}
+        self._written = {}
+        self._last_write = {}
+        self._failed = {}
+        self._closed = False
+        self.last_error = None
+        self.counters = {"edits": 0, "unchanged": 0, "coalesced": 0, "writes": 0,
+                         "components_written": 0, "components_skipped": 0, "failures": 0,
+                         "max_edit_age": 0.0}
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def track(self, patient_id, data, session=None):
+        """Take data as the saved state of patient_id in session, e.g. after loading it
+
+        Only tracked patients are autosaved, so typing the ID of an existing
+        patient never writes the blank form over their record. Edits the
+        session still has pending for the patient are written first.
+        """
+        key = (session, patient_id)
+        self.flush(patient_id, session)
+        with self._condition:
+            self._known[key] = component_fingerprints(data)
+            version = self._versions[key] = self._versions.get(key, 0) + 1
+            self._written[key] = version
+
+    def is_tracked(self, patient_id, session=None):
+        """True if edits to patient_id in session are being autosaved"""
+        with self._condition:
+            return (session, patient_id) in self._known
+
+    def record(self, patient_id, data, session=None):
+        """Note the current state of a tracked patient in session; return the changed components"""
+        key = (session, patient_id)
+        fingerprints = component_fingerprints(data)
+        with self._condition:
+            known = self._known.get(key)
+            if known is None:
+                return set()
+            changed = {component for component in RECORD_COMPONENTS
+                       if fingerprints[component] != known[component]}
+            if not changed:
+                self.counters["unchanged"] += 1
+                return changed
+            self.counters["edits"] += 1
+            self._known[key] = fingerprints
+            version = self._versions[key] = self._versions.get(key, 0) + 1
+            now = time.monotonic()
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = PendingSave(copy_record(data), changed, version, now)
+            else:
+                # Folded into the save already waiting, which now carries the newest data
+                self.counters["coalesced"] += 1
+                pending.data = copy_record(data)
+                pending.components |= changed
+                pending.version = version
+                pending.last_edit = now
+            self._condition.notify()
+            return changed
+
+    def save_now(self, patient_id, data, changed_only=True, session=None):
+        """Save data immediately and start tracking patient_id in session; return the record set file or None
+
+        Only components that differ from the session's tracked state are
+        written, and nothing if none changed. An untracked patient, or
+        changed_only=False, saves every component.
+        """
+        key = (session, patient_id)
+        fingerprints = component_fingerprints(data)
+        with self._condition:
+            known = self._known.get(key)
+            pending = self._pending.pop(key, None)
+            if known is None or not changed_only:
+                changed = set(RECORD_COMPONENTS)
+            else:
+                changed = {component for component in RECORD_COMPONENTS
+                           if fingerprints[component] != known[component]}
+                if pending is not None:
+                    changed |= pending.components
+            self._known[key] = fingerprints
+            version = self._versions[key] = self._versions.get(key, 0) + 1
+        if not changed:
+            with self._condition:
+                self._written[key] = max(version, self._written.get(key, 0))
+                self.counters["unchanged"] += 1
+            return None
+        first_edit = pending.first_edit if pending is not None else time.monotonic()
+        return self._write(key, copy_record(data), changed, version, first_edit)
+
+    def pending(self, patient_id=None, session=None):
+        """Number of pending saves, or 0/1 for patient_id in session"""
+        with self._condition:
+            if patient_id is not None:
+                return int((session, patient_id) in self._pending)
+            return len(self._pending)
+
+    def last_saved(self, patient_id):
+        """time.time() of the last autosave of patient_id, or None"""
+        with self._condition:
+            return self._last_write.get(patient_id, (None, None))[1]
+
+    def last_failure(self, patient_id):
+        """Error of the last save of patient_id if it failed (it is retried), else None"""
+        with self._condition:
+            return self._failed.get(patient_id)
+
+    def stats(self):
+        """Return a copy of the counters, including writes avoided by coalescing"""
+        with self._condition:
+            return dict(self.counters, pending=len(self._pending))
+
+    def flush(self, patient_id=None, session=None):
+        """Write pending saves now: all of them, or just patient_id's in session"""
+        with self._condition:
+            keys = [(session, patient_id)] if patient_id is not None else list(self._pending)
+            due = [(key, self._pending.pop(key)) for key in keys if key in self._pending]
+        for key, pending in due:
+            self._write(key, pending.data, pending.components, pending.version, pending.first_edit)
+        with self._write_lock:
+            pass  # wait for a save the thread had already started
+
+    def close(self):
+        """Stop the thread after writing every pending save"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.flush()
+
+    def _due_at(self, key, pending):
+        due = min(pending.last_edit + self.debounce, pending.first_edit + self.max_staleness)
+        last_write = self._last_write.get(key[1])
+        if last_write is not None:
+            due = max(due, last_write[0] + self.min_interval)
+        return due
+
+    def _write(self, key, data, components, version, first_edit):
+        patient_id = key[1]
+        with self._write_lock:
+            with self._condition:
+                if version <= self._written.get(key, 0):
+                    # A newer save from this session (e.g. an explicit Save) already reached the disk
+                    return None
+            try:
+                filename = self.data_manager.save_patient_components(patient_id, data, components)
+            except Exception as exc:
+                # Anything, so a bad record or a bug never stops later saves
+                logger.exception("Autosave of patient %s failed", patient_id)
+                with self._condition:
+                    self.counters["failures"] += 1
+                    self.last_error = f"{patient_id}: {exc}"
+                    self._failed[patient_id] = str(exc) or type(exc).__name__
+                    if key not in self._pending:
+                        # Retry after the debounce window unless newer edits already replaced it
+                        retry = PendingSave(data, components, version, time.monotonic())
+                        retry.first_edit = first_edit
+                        self._pending[key] = retry
+                    previous = self._last_write.get(patient_id, (None, None))[1]
+                    self._last_write[patient_id] = (time.monotonic(), previous)
+                return None
+            with self._condition:
+                self._failed.pop(patient_id, None)
+                self._written[key] = version
+                self._last_write[patient_id] = (time.monotonic(), time.time())
+                self.counters["writes"] += 1
+                self.counters["components_written"] += len(components)
+                self.counters["components_skipped"] += len(RECORD_COMPONENTS) - len(components)
+                self.counters["max_edit_age"] = max(self.counters["max_edit_age"],
+                                                    time.monotonic() - first_edit)
+            return filename
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    due = {key: self._due_at(key, pending) for key, pending in self._pending.items()}
+                    ready = [key for key, at in due.items() if at <= now]
+                    if ready:
+                        break
+                    self._condition.wait(min(due.values()) - now if due else None)
+                batch = [(key, self._pending.pop(key)) for key in ready]
+            for key, pending in batch:
+                try:
+                    self._write(key, pending.data, pending.components, pending.version, pending.first_edit)
+                except Exception:
+                    # The thread must outlive any failure, or every later edit goes unsaved
+                    logger.exception("Autosave thread error for patient %s", key[1])
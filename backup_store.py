@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from atomic_io import atomic_write, fsync_directory
+from record_ids import new_record_id
+
+HASH_CHUNK = 1024 * 1024
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_hashed(src, temp):
+    """Copy the open file src into temp, fsynced, and return the SHA-256 of the bytes written"""
+    digest = hashlib.sha256()
+    with open(temp, 'wb') as dst:
+        for chunk in iter(lambda: src.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+            dst.write(chunk)
+        dst.flush()
+        os.fsync(dst.fileno())
+    return digest.hexdigest()
+
+
+def _temp_name(directory):
+    return os.path.join(directory, f"{os.getpid()}.{threading.get_ident()}.{new_record_id()}.tmp")
+
+
+def _walk_files(root):
+    """Yield (relative path, os.stat_result) for every regular file under root"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and not entry.name.endswith(".tmp"):
+                    yield os.path.relpath(entry.path, root).replace(os.sep, "/"), entry.stat()
+
+
+class BackupStore:
+    """Content-addressed, deduplicating backups of a directory tree
+
+    Every distinct file content is stored once under objects/<hash[:2]>/<hash>
+    and each backup is a small manifest mapping relative paths to hashes.
+    Files whose size and mtime match the previous manifest reuse its hash
+    without being read, so only new or changed files are hashed and copied.
+    A file is read once, hashed as it is copied to a temp file, and renamed
+    to the hash of exactly those bytes; objects are fsynced before the
+    manifest naming them is written.
+    """
+
+    def __init__(self, backups_dir, workers=None):
+        """Use objects/ and manifests/ under backups_dir"""
+        self.backups_dir = backups_dir
+        self.objects_dir = os.path.join(backups_dir, "objects")
+        self.manifests_dir = os.path.join(backups_dir, "manifests")
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def list_backups(self):
+        """Return backup names, oldest first"""
+        return sorted(name[:-len(".json")] for name in os.listdir(self.manifests_dir)
+                      if name.endswith(".json"))
+
+    def load_manifest(self, name):
+        """Return the manifest dict for a backup"""
+        with open(os.path.join(self.manifests_dir, f"{name}.json"), 'r') as f:
+            return json.load(f)
+
+    def create(self, source_dir, name=None):
+        """Back up source_dir and return the new manifest (with a "stats" entry)"""
+        name = name or f"backup_{new_record_id()}"
+        backups = self.list_backups()
+        previous = self.load_manifest(backups[-1])["files"] if backups else {}
+
+        files = {}
+        to_hash = []
+        for relpath, stat in _walk_files(source_dir):
+            known = previous.get(relpath)
+            if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                files[relpath] = known
+            else:
+                to_hash.append((relpath, stat))
+
+        def store(item):
+            """Copy one file into the object store; copied is None if its object already existed"""
+            relpath, _ = item
+            temp = _temp_name(self.objects_dir)
+            # Saves replace files by rename, so hash, copy and stat one open file
+            with open(os.path.join(source_dir, relpath), 'rb') as src:
+                try:
+                    digest = _copy_hashed(src, temp)
+                except OSError:
+                    if os.path.exists(temp):
+                        os.remove(temp)
+                    raise
+                stat = os.fstat(src.fileno())
+            target = self._object_path(digest)
+            copied = None
+            if os.path.exists(target):
+                os.remove(temp)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(temp, target)
+                copied = stat.st_size
+            record = {"hash": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            return relpath, record, copied
+
+        bytes_copied = 0
+        new_object_dirs = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for relpath, record, copied in pool.map(store, to_hash):
+                files[relpath] = record
+                if copied is not None:
+                    bytes_copied += copied
+                    new_object_dirs.add(os.path.dirname(self._object_path(record["hash"])))
+        # Object data was fsynced before its rename; make the renames durable before the manifest
+        for directory in new_object_dirs:
+            fsync_directory(directory)
+
+        manifest = {
+            "name": name,
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "source": os.path.abspath(source_dir),
+            "files": dict(sorted(files.items())),
+        }
+        atomic_write(os.path.join(self.manifests_dir, f"{name}.json"),
+                     json.dumps(manifest, separators=(",", ":")).encode("utf-8"))
+        manifest["stats"] = {
+            "files": len(files),
+            "hashed": len(to_hash),
+            "bytes_copied": bytes_copied,
+            "bytes_total": sum(record["size"] for record in files.values()),
+        }
+        return manifest
+
+    def verify(self, name):
+        """Re-hash every object referenced by a backup; return the list of bad paths"""
+        manifest = self.load_manifest(name)
+
+        def check(item):
+            relpath, record = item
+            path = self._object_path(record["hash"])
+            if not os.path.exists(path) or _file_digest(path) != record["hash"]:
+                return relpath
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return [relpath for relpath in pool.map(check, manifest["files"].items()) if relpath]
+
+    def restore(self, name, target_dir):
+        """Restore a backup into target_dir, verifying each file's hash as it is copied
+
+        Each file is copied to a temp file and renamed into place only once
+        its hash matches, so a corrupt object raises ValueError and leaves
+        the file already at that path untouched.
+        """
+        manifest = self.load_manifest(name)
+
+        def restore_one(item):
+            relpath, record = item
+            target = os.path.join(target_dir, *relpath.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temp = _temp_name(os.path.dirname(target))
+            try:
+                with open(self._object_path(record["hash"]), 'rb') as src:
+                    digest = _copy_hashed(src, temp)
+                if digest != record["hash"]:
+                    raise ValueError(f"Backup object for {relpath} is corrupt")
+                os.replace(temp, target)
+            except (OSError, ValueError):
+                if os.path.exists(temp):
+                    os.remove(temp)
+                raise
+            return os.path.dirname(target)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            restored = list(pool.map(restore_one, manifest["files"].items()))
+        for directory in set(restored):
+            fsync_directory(directory)
+        return len(restored)
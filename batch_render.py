@@ -0,0 +1,132 @@
+"""Render patient charts headlessly across a process pool.
+
+Each worker loads its patients through DataManager and renders the chart
+with the legend and both eyes' drawings, with no Streamlit session. Every
+worker warms up once: it imports matplotlib, builds its fonts and
+rasterizes the chart template at the target DPI before taking patients.
+The run is logged as one SYSTEM audit entry, not one per patient read.
+
+Output is deterministic and idempotent. Each chart goes to
+<output-dir>/<patient_id>.png, written atomically, with the content hash
+of its inputs stored in the PNG metadata. A patient whose inputs have not
+changed since the last run is skipped without rendering, so a nightly
+re-render of the whole archive only redraws what changed.
+
+    python batch_render.py --all --dpi 300 --workers 8
+    python batch_render.py P001 P002 --output-dir charts
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from atomic_io import atomic_write
+from chart_cache import chart_cache_key
+from chart_rendering import encode_png, patient_chart_header, render_chart
+from chart_template import TemplateChartRenderer
+from data_manager import DataManager
+
+CHART_KEY_FIELD = "chart_key"
+STATUS_RENDERED = "rendered"
+STATUS_UNCHANGED = "unchanged"
+STATUS_MISSING = "missing"
+STATUS_FAILED = "failed"
+
+_worker = {}
+
+
+def chart_path(output_dir, patient_id):
+    """Return the output file for a patient's chart"""
+    return os.path.join(output_dir, f"{patient_id}.png")
+
+
+def stored_chart_key(path):
+    """Return the content hash stored in a rendered chart, or None"""
+    try:
+        with Image.open(path) as image:
+            return image.text.get(CHART_KEY_FIELD)
+    except (OSError, ValueError):
+        return None
+
+
+def _init_worker(base_directory, output_dir, dpi, force):
+    renderer = TemplateChartRenderer()
+    renderer.template(dpi)  # warm-up: font cache and template raster for this DPI
+    _worker.update(manager=DataManager(base_directory), renderer=renderer,
+                   output_dir=output_dir, dpi=dpi, force=force)
+
+
+def render_patient(patient_id):
+    """Render one patient's chart in a worker and return (patient_id, status, detail)"""
+    manager = _worker["manager"]
+    try:
+        data = manager.load_patient(patient_id, audit=False)
+        if data is None:
+            return patient_id, STATUS_MISSING, ""
+        header = patient_chart_header(patient_id, data)
+        legend_data = data.get("legend_data", [])
+        left, right = data.get("left_drawings", []), data.get("right_drawings", [])
+        key = chart_cache_key(header, legend_data, _worker["dpi"], (left, right))
+        path = chart_path(_worker["output_dir"], patient_id)
+        if not _worker["force"] and stored_chart_key(path) == key:
+            return patient_id, STATUS_UNCHANGED, path
+        image = render_chart(header, legend_data, _worker["dpi"], _worker["renderer"], left, right)
+        atomic_write(path, encode_png(image, _worker["dpi"], {CHART_KEY_FIELD: key}))
+        return patient_id, STATUS_RENDERED, path
+    except Exception as exc:
+        return patient_id, STATUS_FAILED, str(exc)
+
+
+def render_patients(patient_ids=None, base_directory="patient_data", output_dir=None, dpi=300,
+                    workers=None, force=False):
+    """Render the given patients (default: every registered patient); return (results, seconds)"""
+    output_dir = output_dir or os.path.join(base_directory, "rendered_charts")
+    os.makedirs(output_dir, exist_ok=True)
+    manager = DataManager(base_directory)
+    patient_ids = sorted(patient_ids) if patient_ids else manager.list_patients()
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(base_directory, output_dir, dpi, force)) as pool:
+        chunksize = max(1, min(16, len(patient_ids) // (workers * 4) or 1))
+        results = list(pool.map(render_patient, patient_ids, chunksize=chunksize))
+    seconds = time.perf_counter() - start
+    rendered = sum(1 for _, status, _ in results if status == STATUS_RENDERED)
+    manager.log_change("SYSTEM", "charts_rendered",
+                       f"Rendered {rendered} of {len(results)} patient charts to {output_dir}")
+    manager.flush_audit_log()
+    return results, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render patient charts without a Streamlit session")
+    parser.add_argument("patient_ids", nargs="*", help="patients to render (default: all with --all)")
+    parser.add_argument("--all", action="store_true", help="render every registered patient")
+    parser.add_argument("--base-directory", default="patient_data")
+    parser.add_argument("--output-dir", default=None, help="default: <base-directory>/rendered_charts")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="re-render charts whose inputs are unchanged")
+    args = parser.parse_args(argv)
+    if not args.patient_ids and not args.all:
+        parser.error("give patient IDs or --all")
+
+    results, seconds = render_patients(args.patient_ids or None, args.base_directory, args.output_dir,
+                                       args.dpi, args.workers, args.force)
+    counts = {}
+    for patient_id, status, detail in results:
+        counts[status] = counts.get(status, 0) + 1
+        if status in (STATUS_MISSING, STATUS_FAILED):
+            print(f"  {patient_id}: {status} {detail}".rstrip(), file=sys.stderr)
+    rendered = counts.get(STATUS_RENDERED, 0)
+    print(f"{len(results)} patients in {seconds:.2f} s: {rendered} rendered "
+          f"({rendered / seconds if seconds else 0:.1f}/s), {counts.get(STATUS_UNCHANGED, 0)} unchanged, "
+          f"{counts.get(STATUS_MISSING, 0)} missing, {counts.get(STATUS_FAILED, 0)} failed")
+    return 1 if counts.get(STATUS_FAILED) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Compare audit logging throughput: open-append-close per entry vs the buffered AuditLogger.
+
+Run from the repository root:
+
+    python benchmarks/bench_audit_log.py --entries 20000 --threads 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audit_log import AuditLogger
+
+
+def make_entry(i):
+    return {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "patient_id": f"P{i % 500:05d}",
+        "action_type": "data_access",
+        "description": "Loaded patient record",
+        "user": "bench",
+    }
+
+
+def per_call_open(log_dir, count):
+    month_year = datetime.now().strftime("%Y_%m")
+    log_file = os.path.join(log_dir, f"audit_log_{month_year}.jsonl")
+    for i in range(count):
+        with open(log_file, 'a') as f:
+            f.write(json.dumps(make_entry(i)) + "\n")
+
+
+def buffered(log_dir, count, threads):
+    logger = AuditLogger(log_dir, flush_interval=0.5)
+
+    def worker(offset):
+        for i in range(offset, count, threads):
+            logger.log(make_entry(i))
+
+    pool = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    logger.close()
+    return logger
+
+
+def count_lines(log_dir):
+    total = 0
+    for name in os.listdir(log_dir):
+        with open(os.path.join(log_dir, name)) as f:
+            for line in f:
+                json.loads(line)
+                total += 1
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as legacy_dir, tempfile.TemporaryDirectory() as buffered_dir:
+        start = time.perf_counter()
+        per_call_open(legacy_dir, args.entries)
+        legacy = time.perf_counter() - start
+        start = time.perf_counter()
+        logger = buffered(buffered_dir, args.entries, args.threads)
+        batched = time.perf_counter() - start
+        written = count_lines(buffered_dir)
+        assert written == args.entries, (written, args.entries)
+        print(f"{args.entries} entries")
+        print(f"  open per call        {args.entries / legacy:>10,.0f} entries/s")
+        print(f"  buffered, {args.threads} threads  {args.entries / batched:>10,.0f} entries/s "
+              f"({logger.batches_written} batch writes, final fsync included)")
+
+
+if __name__ == "__main__":
+    main()
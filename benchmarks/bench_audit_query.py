@@ -0,0 +1,78 @@
+"""Compare a streaming scan of the audit logs with the indexed audit query.
+
+Writes a synthetic year of monthly audit logs, then times "who accessed
+patient X" through scan_entries and through AuditIndex, and the incremental
+refresh after more lines are appended. Run from the repository root:
+
+    python benchmarks/bench_audit_query.py --entries 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audit_query import AuditIndex, scan_entries
+
+ACTIONS = ("data_access", "demographic_update", "medical_record_update", "fundus_drawing_update", "image_saved")
+
+
+def write_logs(log_directory, entries, patients, rng, month_offset=0):
+    per_month = entries // 12
+    for month in range(1, 13):
+        path = os.path.join(log_directory, f"audit_log_2025_{month:02d}.jsonl")
+        with open(path, 'a') as f:
+            for index in range(per_month):
+                second = (index + month_offset) * 2592000 // per_month
+                timestamp = (f"2025-{month:02d}-{1 + second // 86400:02d} "
+                             f"{second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d}")
+                f.write(json.dumps({
+                    "timestamp": timestamp, "patient_id": f"P{rng.randrange(patients):05d}",
+                    "action_type": rng.choice(ACTIONS), "description": "synthetic entry",
+                    "user": rng.choice(("alice", "bob", "carol")),
+                }) + "\n")
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=300000)
+    parser.add_argument("--patients", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(4)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_logs(tmp, args.entries, args.patients, rng)
+        size = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+        print(f"{args.entries} entries in 12 month files, {size / 1e6:.0f} MB")
+        filters = {"patient_id": "P00042", "action_type": "data_access", "since": "2025-03-01"}
+
+        scanned, scan_time = timed(lambda: list(scan_entries(tmp, **filters)))
+        index = AuditIndex(tmp)
+        added, build_time = timed(index.refresh)
+        indexed, query_time = timed(lambda: list(index.query(refresh=False, **filters)))
+        assert scanned == indexed
+        print(f"  streaming scan                {scan_time * 1000:9.1f} ms  ({len(scanned)} matches)")
+        print(f"  initial index build           {build_time * 1000:9.1f} ms  ({added} lines)")
+        print(f"  indexed query                 {query_time * 1000:9.1f} ms")
+
+        write_logs(tmp, 12000, args.patients, rng, month_offset=1)
+        added, refresh_time = timed(index.refresh)
+        _, noop_time = timed(index.refresh)
+        print(f"  refresh after {added} appends  {refresh_time * 1000:9.1f} ms")
+        print(f"  refresh with nothing new      {noop_time * 1000:9.1f} ms")
+        assert list(index.query(**filters)) == list(scan_entries(tmp, **filters))
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
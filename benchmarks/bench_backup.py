@@ -0,0 +1,61 @@
+"""Compare a full copytree backup with the incremental content-addressed backup.
+
+Run from the repository root:
+
+    python benchmarks/bench_backup.py --patients 5000 --changed 50
+"""
+import argparse
+import filecmp
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_manager import DataManager
+
+
+def populate(dm, count, rng):
+    for i in range(count):
+        dm.save_patient_demographics(f"P{i:06d}", {"name": f"Patient {i}", "age": str(rng.randint(18, 90))})
+        dm.save_medical_record(f"P{i:06d}", {"diagnosis": "Glaucoma", "va_left": "6/6"})
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--changed", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        dm = DataManager(os.path.join(tmp, "patient_data"))
+        populate(dm, args.patients, rng)
+        _, full = timed(dm.create_backup)
+        _, first = timed(lambda: dm.create_backup(incremental=True))
+        time.sleep(1)  # next backup gets a new timestamped name
+        for i in rng.sample(range(args.patients), args.changed):
+            dm.save_medical_record(f"P{i:06d}", {"diagnosis": "Retinal Detachment"})
+        manifest_path, second = timed(lambda: dm.create_backup(incremental=True))
+        name = os.path.basename(manifest_path)[:-len(".json")]
+        restore_dir = os.path.join(tmp, "restored")
+        _, restore = timed(lambda: dm.restore_backup(name, restore_dir))
+        comparison = filecmp.dircmp(os.path.join(dm.base_directory, "patients"), restore_dir)
+        assert not comparison.diff_files and not comparison.left_only
+        print(f"{args.patients} patients, {args.changed} changed between backups")
+        print(f"  full copytree            {full:7.2f} s")
+        print(f"  incremental (first run)  {first:7.2f} s")
+        print(f"  incremental (unchanged)  {second:7.2f} s")
+        print(f"  verified restore         {restore:7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Time headless batch rendering with one worker and with every core.
+
+Also checks that the output does not depend on the worker count and that a
+second run skips every unchanged chart. Run from the repository root:
+
+    python benchmarks/bench_batch_render.py --patients 64 --dpi 300
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_render import STATUS_RENDERED, STATUS_UNCHANGED, render_patients
+from bench_load_patient import synthetic_drawings
+from data_manager import DataManager
+
+
+def digests(output_dir):
+    result = {}
+    for name in sorted(os.listdir(output_dir)):
+        with open(os.path.join(output_dir, name), 'rb') as f:
+            result[name] = hashlib.sha256(f.read()).hexdigest()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=32)
+    parser.add_argument("--strokes", type=int, default=100, help="strokes per eye")
+    parser.add_argument("--dpi", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(8)
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "patient_data")
+        dm = DataManager(base)
+        for index in range(args.patients):
+            dm.save_complete_patient_record(f"P{index:04d}", {
+                "name": f"Patient {index}", "age": "70", "va_left": "6/9",
+                "left_drawings": synthetic_drawings(rng, args.strokes),
+                "right_drawings": synthetic_drawings(rng, args.strokes),
+                "legend_data": [{"label": "Hemorrhage", "color": "red", "fill_type": "none",
+                                 "alpha": 1.0, "line_width": 2}],
+            })
+        print(f"{args.patients} patients, {args.strokes} strokes per eye, {args.dpi} dpi, "
+              f"{os.cpu_count()} CPUs")
+        outputs = []
+        for workers in sorted({1, os.cpu_count() or 1}):
+            output_dir = os.path.join(tmp, f"charts_{workers}")
+            results, seconds = render_patients(None, base, output_dir, args.dpi, workers)
+            assert all(status == STATUS_RENDERED for _, status, _ in results)
+            print(f"  {workers:2d} worker(s)  {seconds:7.2f} s  {len(results) / seconds:6.1f} charts/s")
+            outputs.append(digests(output_dir))
+        assert all(output == outputs[0] for output in outputs), "output depends on worker count"
+        results, seconds = render_patients(None, base, output_dir, args.dpi, os.cpu_count())
+        assert all(status == STATUS_UNCHANGED for _, status, _ in results)
+        print(f"  rerun, nothing changed  {seconds:7.2f} s  (all {len(results)} skipped)")
+
+
+if __name__ == "__main__":
+    main()
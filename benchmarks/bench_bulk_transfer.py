@@ -0,0 +1,64 @@
+"""Compare one-at-a-time saves with the bulk_transfer import and export pipeline.
+
+Run from the repository root:
+
+    python benchmarks/bench_bulk_transfer.py --records 2000 --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_load_patient import synthetic_drawings
+from bulk_transfer import export_records, import_records
+from data_manager import DataManager
+
+
+def write_archive(path, count, strokes, rng):
+    with open(path, 'w') as f:
+        for index in range(count):
+            f.write(json.dumps({
+                "patient_id": f"P{index:06d}", "name": f"Patient {index}", "age": str(20 + index % 70),
+                "diagnosis": "Glaucoma", "va_left": "6/9", "va_right": "6/6",
+                "left_drawings": synthetic_drawings(rng, strokes),
+                "right_drawings": synthetic_drawings(rng, strokes),
+            }) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--strokes", type=int, default=5, help="strokes per eye")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, "archive.jsonl")
+        write_archive(archive, args.records, args.strokes, random.Random(2))
+        print(f"{args.records} records, {args.strokes} strokes per eye, {os.cpu_count()} CPUs")
+
+        dm = DataManager(os.path.join(tmp, "sequential"))
+        start = time.perf_counter()
+        with open(archive, 'r') as f:
+            for line in f:
+                record = json.loads(line)
+                dm.save_complete_patient_record(record["patient_id"], record)
+        elapsed = time.perf_counter() - start
+        print(f"  {'one save per record':28s}{args.records / elapsed:8,.0f} records/s")
+
+        base = os.path.join(tmp, "bulk")
+        stats = import_records(archive, base, workers=args.workers)
+        assert stats["saved"] == args.records
+        print(f"  {f'bulk import, {args.workers} workers':28s}{stats['saved'] / stats['seconds']:8,.0f} records/s")
+        stats = export_records(os.path.join(tmp, "export.jsonl"), base, workers=args.workers)
+        assert stats["exported"] == args.records
+        print(f"  {f'bulk export, {args.workers} workers':28s}{stats['exported'] / stats['seconds']:8,.0f} records/s")
+
+
+if __name__ == "__main__":
+    main()
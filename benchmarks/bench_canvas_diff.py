@@ -0,0 +1,74 @@
+"""Compare rebuilding every drawing per rerun against incremental canvas diffing.
+
+Run from the repository root:
+
+    python benchmarks/bench_canvas_diff.py --objects 2000
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from canvas_diff import CanvasDiffer, canvas_object_to_drawing
+
+
+def fabric_path(rng, points=40):
+    x, y = rng.uniform(0, 400), rng.uniform(0, 400)
+    path = [["M", x, y]]
+    for _ in range(points):
+        x, y = x + rng.uniform(-3, 3), y + rng.uniform(-3, 3)
+        path.append(["Q", x, y, x + 0.5, y + 0.5])
+    return {"type": "path", "stroke": "#ff0000", "strokeWidth": 2, "opacity": 0.7,
+            "fill": None, "left": x, "top": y, "path": path}
+
+
+def rebuild(objects, drawings):
+    drawings.clear()
+    for obj in objects:
+        drawing = canvas_object_to_drawing(obj, 0.7)
+        if drawing is not None:
+            drawings.append(drawing)
+
+
+def best_ms(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    base = [fabric_path(rng) for _ in range(args.objects)]
+    edited = copy.deepcopy(base)
+    edited[len(edited) // 2]["left"] += 10
+    scenarios = (("unchanged rerun", copy.deepcopy(base)),
+                 ("one object moved", edited),
+                 ("one object added", copy.deepcopy(base) + [fabric_path(rng)]))
+    print(f"{args.objects} freehand objects on the canvas")
+    for label, payload in scenarios:
+        drawings = []
+        differ = CanvasDiffer("left")
+        differ.apply(copy.deepcopy(base), drawings, 0.7)
+
+        def diff_once():
+            differ.apply(base, drawings, 0.7)
+            differ.apply(payload, drawings, 0.7)
+
+        diff_ms = best_ms(diff_once) / 2
+        rebuild_ms = best_ms(lambda: rebuild(payload, []))
+        print(f"  {label:<18} rebuild {rebuild_ms:7.2f} ms   diff {diff_ms:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
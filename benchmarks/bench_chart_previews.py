@@ -0,0 +1,100 @@
+"""Measure chart preview pyramids: build cost, sizes, and gallery load against full images.
+
+Run from the repository root:
+
+    python benchmarks/bench_chart_previews.py --patients 8 --charts 3
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+
+from bench_load_patient import synthetic_drawings
+from chart_previews import PreviewStore, backfill
+from chart_rendering import render_chart_png
+from chart_template import TemplateChartRenderer
+from data_manager import DataManager
+
+LEGEND = [{"label": "Haemorrhage", "color": "red", "fill_type": "solid", "alpha": 0.7, "line_width": 2}]
+
+
+def header(index):
+    return {"name": f"Patient {index}", "pid": f"P{index:04d}", "age": "64", "diagnosis": "Glaucoma",
+            "va_left": "6/9", "va_right": "6/12", "iop_left": "16", "iop_right": "18"}
+
+
+def decode_ms(paths, size=None):
+    """Median ms to open and decode each file, downscaling to size like a gallery would"""
+    samples = []
+    for path in paths:
+        start = time.perf_counter()
+        with Image.open(path) as image:
+            image.load()
+            if size is not None:
+                image.thumbnail((size, size))
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=8)
+    parser.add_argument("--charts", type=int, default=3, help="saved charts per patient")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    renderer = TemplateChartRenderer()
+    with tempfile.TemporaryDirectory() as base:
+        manager = DataManager(base)
+        for index in range(args.patients):
+            for chart in range(args.charts):
+                png = render_chart_png(header(index * args.charts + chart), LEGEND, args.dpi, renderer,
+                                       synthetic_drawings(rng, 50), synthetic_drawings(rng, 50))
+                manager.save_chart_image(f"P{index:04d}", png)
+        # The same chart saved for a second patient shares its derivatives
+        manager.save_chart_image("P9999", png)
+        images = [path for index in range(args.patients)
+                  for path in manager.list_chart_images(f"P{index:04d}")]
+
+        results, first = backfill(base, workers=args.workers)
+        print(f"backfill of {len(results)} images with {args.workers} worker(s): {first:.2f} s "
+              f"({first / len(results) * 1000:.0f} ms per image)")
+        results, again = backfill(base, workers=args.workers)
+        cached = sum(1 for _, status, _ in results if status == "cached")
+        print(f"second backfill: {again:.2f} s, {cached}/{len(results)} already cached")
+
+        store = PreviewStore(base)
+        objects = [os.path.join(root, name) for root, _, names in os.walk(store.objects_dir)
+                   for name in names]
+        expected = len(images) * len(store.sizes)
+        print(f"{len(objects)} derivative files for {len(images) + 1} images "
+              f"(duplicate chart shared: {len(objects) == expected})")
+
+        full_bytes = statistics.median(os.path.getsize(path) for path in images)
+        print(f"\nfull {args.dpi} dpi PNG: {full_bytes / 1024:9.1f} KiB, "
+              f"gallery decode {decode_ms(images, 160):7.2f} ms")
+        for name, edge in store.sizes.items():
+            paths = [store.preview_path(path, name) for path in images]
+            size = statistics.median(os.path.getsize(path) for path in paths)
+            print(f"{name:>8} ({edge:4d} px {store.image_format}): {size / 1024:9.1f} KiB "
+                  f"({full_bytes / size:5.0f}x smaller), decode {decode_ms(paths):7.2f} ms")
+
+        start = time.perf_counter()
+        for path in images:
+            store.preview_path(path, "thumb")
+        print(f"\npreview_path lookup for a built thumb: "
+              f"{(time.perf_counter() - start) / len(images) * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
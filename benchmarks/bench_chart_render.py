@@ -0,0 +1,80 @@
+"""Compare per-render latency of the full matplotlib chart against template compositing.
+
+Run from the repository root:
+
+    python benchmarks/bench_chart_render.py --repeat 20
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from chart_rendering import build_chart_figure, render_charts_parallel
+from chart_template import TemplateChartRenderer
+
+HEADER = {
+    "name": "Jane Doe", "pid": "P000123", "age": "64",
+    "diagnosis": "Diabetic Retinopathy", "diagnosis_other": "",
+    "left_eye": "", "right_eye": "", "va_left": "6/9", "va_right": "6/12",
+    "iop_left": "16", "iop_right": "18",
+}
+LEGEND = [
+    {"label": "Haemorrhage", "color": "red", "fill_type": "solid", "alpha": 0.7, "line_width": 2},
+    {"label": "Laser scar", "color": "black", "fill_type": "none", "alpha": 1.0, "line_width": 2},
+]
+
+
+def full_render(header, legend_data, dpi):
+    """Today's path: draw everything, tight layout, PNG encode and decode"""
+    fig = build_chart_figure(header, legend_data)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches='tight')
+    buf.seek(0)
+    image = Image.open(buf)
+    image.load()
+    return image
+
+
+def time_calls(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1,
+                        help="worker threads for the concurrent 300 dpi export run")
+    args = parser.parse_args()
+
+    renderer = TemplateChartRenderer()
+    print(f"{'dpi':>4} {'path':<10} {'median ms':>10} {'p95 ms':>8}")
+    for dpi in (100, 300):
+        renderer.template(dpi)  # one-off rasterization, excluded from the per-render cost
+        for label, func in (("full", lambda: full_render(HEADER, LEGEND, dpi)),
+                            ("template", lambda: renderer.render(HEADER, LEGEND, dpi))):
+            func()  # warm up fonts and caches
+            samples = sorted(time_calls(func, args.repeat))
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            print(f"{dpi:>4} {label:<10} {statistics.median(samples):>10.1f} {p95:>8.1f}")
+
+    jobs = [(dict(HEADER, pid=f"P{i:06d}"), LEGEND) for i in range(args.threads * 4)]
+    for workers in sorted({1, args.threads}):
+        start = time.perf_counter()
+        render_charts_parallel(jobs, dpi=300, max_workers=workers, renderer=renderer)
+        elapsed = time.perf_counter() - start
+        print(f"300 dpi png export, {workers} thread(s): {len(jobs) / elapsed:.1f} charts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Compare cohort queries on the columnar cache against scanning every record file.
+
+Saves synthetic patients with several record versions and drawings. It then
+times three things:
+- the first compile of the cache and an incremental refresh after a few
+  edits
+- IOP by diagnosis, both from a naive scan of the JSON files and from the
+  cache, checking that the two results agree
+- the cache queries again on a cohort tiled to --scale-patients
+
+Run from the repository root:
+
+    python benchmarks/bench_cohort_analytics.py --patients 300 --scale-patients 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cohort_analytics import CohortCache, parse_iop
+from data_manager import DataManager
+
+DIAGNOSES = ("Diabetic Retinopathy", "Glaucoma", "AMD", "Retinal Detachment", "Normal")
+LEGEND = [{"label": "Haemorrhage", "color": "#ff0000", "fill_type": "solid", "alpha": 0.7, "line_width": 2},
+          {"label": "Laser scar", "color": "#000000", "fill_type": "none", "alpha": 1.0, "line_width": 2}]
+
+
+def lesions(rng, count):
+    drawings = []
+    for _ in range(count):
+        color = rng.choice(("#ff0000", "#000000"))
+        x, y = rng.uniform(5, 270), rng.uniform(130, 300)  # over the two eye panels
+        if rng.random() < 0.5:
+            drawings.append({"type": "point", "color": color, "width": 2, "alpha": 1.0, "coords": [x, y]})
+        else:
+            path = [["M", x, y]] + [["Q", x + i, y + i, x + i + 1, y + i + 1] for i in range(5)]
+            drawings.append({"type": "freehand", "color": color, "width": 2, "alpha": 0.7, "points": path})
+    return drawings
+
+
+def patient_record(rng):
+    return {"name": "Cohort Patient", "age": str(rng.randint(30, 90)), "diagnosis": rng.choice(DIAGNOSES),
+            "va_left": rng.choice(("6/6", "6/9", "6/12", "6/18", "6/60", "CF")),
+            "va_right": rng.choice(("6/6", "6/9", "6/12", "6/24")),
+            "iop_left": str(rng.randint(10, 32)), "iop_right": str(rng.randint(10, 32)),
+            "left_drawings": lesions(rng, 10), "right_drawings": lesions(rng, 10), "legend_data": LEGEND}
+
+
+def spread_timestamps(base, rng):
+    """Give the saved medical records dates over two years, as a long-running clinic would have"""
+    start = datetime(2024, 1, 1)
+    patients_dir = os.path.join(base, "patients")
+    for patient_id in os.listdir(patients_dir):
+        records_dir = os.path.join(patients_dir, patient_id, "medical_records")
+        for name in os.listdir(records_dir):
+            if name.startswith("record_"):
+                path = os.path.join(records_dir, name)
+                with open(path, 'r') as f:
+                    record = json.load(f)
+                stamp = start + timedelta(days=rng.randint(0, 730))
+                record["timestamp"] = stamp.strftime("%Y-%m-%d %H:%M:%S")
+                with open(path, 'w') as f:
+                    json.dump(record, f)
+
+
+def naive_latest_iop(base):
+    """Today's approach: open every record file and aggregate in Python"""
+    latest = {}
+    patients_dir = os.path.join(base, "patients")
+    for patient_id in os.listdir(patients_dir):
+        records_dir = os.path.join(patients_dir, patient_id, "medical_records")
+        for name in os.listdir(records_dir):
+            if name.startswith("record_"):
+                with open(os.path.join(records_dir, name), 'r') as f:
+                    record = json.load(f)
+                if patient_id not in latest or record["timestamp"] >= latest[patient_id]["timestamp"]:
+                    latest[patient_id] = record
+    groups = {}
+    for record in latest.values():
+        for eye in ("iop_right", "iop_left"):
+            groups.setdefault(record["diagnosis"], []).append(parse_iop(record[eye]))
+    return {diagnosis: (len(values), float(np.mean(values))) for diagnosis, values in groups.items()}
+
+
+def tile(cache, copies):
+    """Repeat the cached cohort copies times, as distinct patients"""
+    patients = len(cache.patient_ids)
+    for table in (cache.records, cache.lesions):
+        offsets = np.repeat(np.arange(copies, dtype=np.int32) * patients, len(table["patient"]))
+        for name in list(table):
+            table[name] = np.tile(table[name], copies)
+        table["patient"] = table["patient"] + offsets
+    cache.patient_diagnosis = np.tile(cache.patient_diagnosis, copies)
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"  {label:38} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=300)
+    parser.add_argument("--versions", type=int, default=3, help="saved record versions per patient")
+    parser.add_argument("--scale-patients", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as base:
+        manager = DataManager(base)
+        start = time.perf_counter()
+        for index in range(args.patients):
+            for _ in range(args.versions):
+                manager.save_complete_patient_record(f"C{index:06d}", patient_record(rng), flush_audit=False)
+        manager.flush_audit_log()
+        spread_timestamps(base, rng)
+        print(f"saved {args.patients} patients x {args.versions} versions in "
+              f"{time.perf_counter() - start:.1f} s")
+
+        cache = CohortCache(base)
+        stats = cache.refresh(workers=args.workers, manager=manager)
+        print(f"first compile: {stats['ingested']} patients, {stats['records']} records, "
+              f"{stats['lesions']} lesions in {stats['seconds']:.2f} s")
+        stats = cache.refresh(workers=args.workers, manager=manager)
+        print(f"refresh with no changes: {stats['ingested']} read in {stats['seconds']:.3f} s")
+        for index in range(5):
+            manager.save_complete_patient_record(f"C{index:06d}", patient_record(rng))
+        stats = cache.refresh(workers=args.workers, manager=manager)
+        print(f"refresh after 5 saves: {stats['ingested']} read, {stats['unchanged']} unchanged "
+              f"in {stats['seconds']:.3f} s, {stats['records']} records")
+
+        print(f"\nIOP by diagnosis, {args.patients} patients:")
+        naive = timed("naive scan of every record file", lambda: naive_latest_iop(base))
+        rows = timed("columnar cache (load + query)",
+                     lambda: CohortCache(base).iop_by_diagnosis())
+        for row in rows:
+            count, mean = naive[row["diagnosis"]]
+            assert count == row["count"] and abs(mean - row["mean"]) < 1e-4, (row, naive[row["diagnosis"]])
+        print("  results match")
+
+        copies = max(1, args.scale_patients // args.patients)
+        tile(cache, copies)
+        print(f"\ntiled to {copies * args.patients} patients, {len(cache.records['patient'])} records, "
+              f"{len(cache.lesions['patient'])} lesions:")
+        timed("iop_by_diagnosis (latest per patient)", cache.iop_by_diagnosis)
+        timed("iop_by_diagnosis (every record)", lambda: cache.iop_by_diagnosis(latest_only=False))
+        timed("va_trend by month, Glaucoma", lambda: cache.va_trend("M", diagnosis="Glaucoma"))
+        grid = timed("clock_hours, left eye, Haemorrhage",
+                     lambda: cache.clock_hours("left", label="Haemorrhage"))
+        print(f"  {int(grid.sum())} haemorrhages binned; busiest cell {np.unravel_index(grid.argmax(), grid.shape)}")
+
+
+if __name__ == "__main__":
+    main()
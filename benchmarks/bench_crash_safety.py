@@ -0,0 +1,166 @@
+"""Fault injection for save_complete_patient_record: kill the saving process mid-commit.
+
+Two phases, both in forked child processes:
+
+1. Deterministic: for every rename in a transactional save, a child exits
+   with os._exit just before that rename, as if killed at that instant.
+2. Random: a child saves new patients in a loop and is SIGKILLed after a
+   random delay.
+
+After each crash a fresh DataManager must load every patient either as a
+complete old/new record or not at all, and the snapshot and the record set
+pointer must agree on which. Run from the repository root:
+
+    python benchmarks/bench_crash_safety.py --kills 20
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import atomic_io
+from atomic_io import resolve_pointer
+from bench_load_patient import synthetic_drawings
+from data_manager import DataManager
+
+
+def record(generation, rng):
+    """Patient data whose every component carries the generation number"""
+    return {
+        "name": f"gen {generation}", "age": "60", "diagnosis": f"gen {generation}",
+        "left_drawings": synthetic_drawings(rng, 50), "right_drawings": synthetic_drawings(rng, 50),
+        "legend_data": [{"label": f"gen {generation}"}],
+    }
+
+
+def generation_of(data):
+    """Return the generation a loaded record belongs to, or raise if components are mixed"""
+    generations = {data.get("name"), data.get("diagnosis"), data["legend_data"][0]["label"]}
+    if len(generations) != 1:
+        raise AssertionError(f"mixed record: {sorted(generations)}")
+    return generations.pop()
+
+
+def component_generation(dm, patient_id):
+    """Load through the component latest pointers only, as an older tree would be read"""
+    patient_dir = os.path.join(dm.base_directory, "patients", patient_id)
+    paths = [resolve_pointer(os.path.join(patient_dir, *parts)) for parts in (
+        ("demographics", "demographics_latest.json"),
+        ("medical_records", "latest_record.json"),
+        ("fundus_charts", "latest_drawing.json"))]
+    if not any(paths):
+        return None
+    data = {}
+    for path in paths[:2]:
+        with open(path, 'r') as f:
+            data.update(json.load(f))
+    data["legend_data"] = dm.read_drawing_file(paths[2])["legend_data"]
+    return generation_of(data)
+
+
+def check_patient(base_directory, patient_id, allowed):
+    dm = DataManager(base_directory)
+    seen = set()
+    paths = []
+    for use_snapshot in (True, False):
+        data = dm.load_patient(patient_id, use_snapshot=use_snapshot)
+        paths.append(generation_of(data) if data is not None else None)
+    if paths[0] != paths[1]:
+        raise AssertionError(f"{patient_id}: snapshot shows {paths[0]}, record set shows {paths[1]}")
+    seen.update(generation for generation in paths if generation is not None)
+    patient_dir = os.path.join(base_directory, "patients", patient_id)
+    if not os.path.exists(os.path.join(patient_dir, "latest_record_set.json")):
+        if os.path.exists(patient_dir):
+            generation = component_generation(dm, patient_id)
+            if generation is not None:
+                seen.add(generation)
+    dm.flush_audit_log()
+    unexpected = seen - allowed
+    if unexpected:
+        raise AssertionError(f"{patient_id}: unexpected generations {sorted(unexpected)}")
+    return seen
+
+
+def crash_before_rename(base_directory, crash_at, rng):
+    """Save generation 2 in a child that exits just before its crash_at-th rename"""
+    pid = os.fork()
+    if pid == 0:
+        calls = [0]
+        real_replace = os.replace
+
+        def replace(src, dst):
+            calls[0] += 1
+            if calls[0] == crash_at:
+                os._exit(17)
+            real_replace(src, dst)
+
+        atomic_io.os.replace = replace
+        DataManager(base_directory).save_complete_patient_record("P1", record(2, rng))
+        os._exit(0)
+    _, status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(status) == 17
+
+
+def deterministic_phase(rng):
+    crash_at = 1
+    crashed = True
+    while crashed:
+        with tempfile.TemporaryDirectory() as tmp:
+            base = os.path.join(tmp, "patient_data")
+            DataManager(base).save_complete_patient_record("P1", record(1, rng))
+            crashed = crash_before_rename(base, crash_at, rng)
+            seen = check_patient(base, "P1", {"gen 1", "gen 2"})
+            label = f"crash before rename {crash_at}" if crashed else "no crash"
+            print(f"  {label:28s} visible: {', '.join(sorted(seen))}")
+        crash_at += 1
+    return crash_at - 2
+
+
+def random_phase(rng, kills):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "patient_data")
+        DataManager(base)
+        saved = 0
+        for kill in range(kills):
+            pid = os.fork()
+            if pid == 0:
+                dm = DataManager(base)
+                for index in range(kill * 1000, kill * 1000 + 1000):
+                    dm.save_complete_patient_record(f"P{index:06d}", record(index, rng))
+                os._exit(0)
+            time.sleep(rng.uniform(0.05, 0.4))
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        for patient_id in sorted(os.listdir(os.path.join(base, "patients"))):
+            index = int(patient_id[1:])
+            if check_patient(base, patient_id, {f"gen {index}"}):
+                saved += 1
+        print(f"  {kills} SIGKILLs, {saved} complete patients, no partial records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kills", type=int, default=10)
+    args = parser.parse_args()
+    rng = random.Random(5)
+    print("deterministic crash points:")
+    renames = deterministic_phase(rng)
+    print(f"  all {renames} rename points leave a consistent record")
+    print("random kills:")
+    random_phase(rng, args.kills)
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        dm = DataManager(os.path.join(tmp, "patient_data"))
+        for index in range(50):
+            dm.save_complete_patient_record(f"P{index}", record(index, rng))
+    print(f"transactional save: {(time.perf_counter() - start) / 50 * 1000:.1f} ms per patient")
+
+
+if __name__ == "__main__":
+    main()
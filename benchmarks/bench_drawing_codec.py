@@ -0,0 +1,66 @@
+"""Compare size and encode/decode speed of the binary drawing codec against JSON.
+
+Run from the repository root:
+
+    python benchmarks/bench_drawing_codec.py --strokes 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_load_patient import synthetic_drawings
+from drawing_codec import decode_drawing_document, encode_drawing_document
+
+
+def best_ms(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strokes", type=int, default=1000, help="freehand strokes per eye")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    # Canvas coordinates arrive as floats with fabric.js precision; round a copy to the
+    # 1/8 px grid to show the int16 path as well
+    document = {
+        "left_eye_drawings": synthetic_drawings(rng, args.strokes),
+        "right_eye_drawings": synthetic_drawings(rng, args.strokes),
+        "legend_data": [], "timestamp": "2025-03-03 10:00:00",
+    }
+    document = json.loads(json.dumps(document))
+    gridded = json.loads(json.dumps(document), parse_float=lambda v: round(float(v) * 8) / 8)
+
+    print(f"{args.strokes} freehand strokes per eye")
+    print(f"  {'format':<26} {'bytes':>11} {'encode ms':>10} {'decode ms':>10}")
+    for label, doc in (("float coords", document), ("1/8 px grid coords", gridded)):
+        rows = [
+            ("json indent=4", lambda: json.dumps(doc, indent=4).encode(), json.loads),
+            ("json compact",
+             lambda: json.dumps(doc, separators=(",", ":")).encode(), json.loads),
+            ("binary", lambda: encode_drawing_document(doc, compress=False),
+             decode_drawing_document),
+            ("binary + zlib", lambda: encode_drawing_document(doc), decode_drawing_document),
+        ]
+        print(f" {label}")
+        for name, encode, decode in rows:
+            payload = encode()
+            assert decode(payload) == doc
+            print(f"  {name:<26} {len(payload):>11,} {best_ms(encode, args.repeat):>10.1f} "
+                  f"{best_ms(lambda: decode(payload), args.repeat):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compare one matplotlib artist per stroke with the batched drawing rasterizer.
+
+Run from the repository root:
+
+    python benchmarks/bench_drawing_raster.py --strokes 5000 --dpi 300
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.patches import PathPatch
+
+from bench_load_patient import synthetic_drawings
+from chart_template import FIGURE_SIZE, rasterize_figure
+from drawing_raster import CANVAS_SIZE, RASTER_DPI, drawing_paths, rasterize_drawings
+
+
+def mixed_drawings(rng, count):
+    """Mostly freehand strokes with lines, rectangles, circles and dots mixed in"""
+    drawings = []
+    for drawing in synthetic_drawings(rng, count):
+        kind = rng.random()
+        x, y = rng.uniform(0, 400), rng.uniform(0, 400)
+        if kind < 0.1:
+            drawing = {"type": "line", "color": "#0000ff", "width": 2, "alpha": 1,
+                       "coords": [[x, y], [x + rng.uniform(-40, 40), y + rng.uniform(-40, 40)]]}
+        elif kind < 0.15:
+            drawing = {"type": "rect", "color": "#00aa00", "width": 2, "alpha": 0.5, "fill": "solid",
+                       "coords": [[x, y], rng.uniform(5, 40), rng.uniform(5, 40)]}
+        elif kind < 0.2:
+            drawing = {"type": "circle", "color": "#aa00aa", "width": 2, "alpha": 1, "fill": "none",
+                       "coords": [[x, y], rng.uniform(3, 30)]}
+        elif kind < 0.25:
+            drawing = {"type": "point", "color": "black", "width": 1, "alpha": 1, "coords": [x, y]}
+        drawings.append(drawing)
+    return drawings
+
+
+def per_artist(drawings, size):
+    """Reference: the same geometry drawn as one PathPatch per stroke"""
+    width, height = size
+    fig = Figure(figsize=(width / RASTER_DPI, height / RASTER_DPI), facecolor=(0, 0, 0, 0))
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_xlim(0, CANVAS_SIZE[0])
+    ax.set_ylim(CANVAS_SIZE[1], 0)
+    ax.axis('off')
+    scale = math.sqrt(width / CANVAS_SIZE[0] * height / CANVAS_SIZE[1]) * 72 / RASTER_DPI
+    paths, edges, faces, widths = drawing_paths(drawings)
+    for path, edge, face, line_width in zip(paths, edges, faces, widths):
+        ax.add_patch(PathPatch(path, edgecolor=edge, facecolor=face, linewidth=line_width * scale,
+                               capstyle='round', joinstyle='round'))
+    return rasterize_figure(fig, RASTER_DPI)
+
+
+def timed(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strokes", type=int, default=2000)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    drawings = mixed_drawings(random.Random(6), args.strokes)
+    size = (int(FIGURE_SIZE[0] * args.dpi), int(FIGURE_SIZE[1] * args.dpi))
+    print(f"{args.strokes} strokes onto a {size[0]}x{size[1]} chart ({args.dpi} dpi)")
+    (_, paths_time) = timed(lambda: drawing_paths(drawings), args.repeat)
+    reference, artist_time = timed(lambda: per_artist(drawings, size), args.repeat)
+    batched, batch_time = timed(lambda: rasterize_drawings(drawings, size), args.repeat)
+    difference = np.abs(np.asarray(reference, dtype=np.int16) - np.asarray(batched, dtype=np.int16))
+    print(f"  build paths            {paths_time * 1000:8.1f} ms")
+    print(f"  one artist per stroke  {artist_time * 1000:8.1f} ms")
+    print(f"  batched collection     {batch_time * 1000:8.1f} ms  ({artist_time / batch_time:.1f}x)")
+    print(f"  pixels differing by >8 {np.mean(difference.max(axis=2) > 8) * 100:8.3f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare disk use and write volume of full-copy history against delta history.
+
+Run from the repository root:
+
+    python benchmarks/bench_history.py --saves 100 --strokes 300
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_load_patient import synthetic_drawings
+from data_manager import DataManager
+
+
+def tree_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--saves", type=int, default=60)
+    parser.add_argument("--strokes", type=int, default=200, help="initial strokes per eye")
+    args = parser.parse_args()
+
+    print(f"{args.saves} saves of one patient starting at {args.strokes} strokes per eye, "
+          f"one stroke added per save")
+    for mode in ("full", "delta"):
+        rng = random.Random(3)
+        left = synthetic_drawings(rng, args.strokes)
+        right = synthetic_drawings(rng, args.strokes)
+        with tempfile.TemporaryDirectory() as tmp:
+            dm = DataManager(os.path.join(tmp, "patient_data"), history_mode=mode)
+            start = time.perf_counter()
+            for save in range(args.saves):
+                left = left + synthetic_drawings(rng, 1)
+                dm.save_complete_patient_record("P1", {
+                    "name": "Jane", "age": "60", "va_left": f"6/{6 + save % 3}",
+                    "left_drawings": left, "right_drawings": right,
+                })
+            elapsed = time.perf_counter() - start
+            patient_dir = os.path.join(dm.base_directory, "patients", "P1")
+            rebuild_start = time.perf_counter()
+            first = dm.load_patient_version("P1", 1)
+            rebuild_ms = (time.perf_counter() - rebuild_start) * 1000
+            assert len(first["left_drawings"]) == args.strokes + 1
+            print(f"  {mode:<6} disk {tree_bytes(patient_dir) / 1e6:8.1f} MB   "
+                  f"{elapsed / args.saves * 1000:7.1f} ms/save   "
+                  f"rebuild v1 {rebuild_ms:6.1f} ms   versions {len(dm.list_history('P1'))}")
+
+
+if __name__ == "__main__":
+    main()
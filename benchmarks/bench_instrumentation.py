@@ -0,0 +1,74 @@
+"""Measure the cost of instrumentation when disabled and when enabled.
+
+Times a bare span, a decorated function and complete patient saves with
+instrumentation off and on. Run from the repository root:
+
+    python benchmarks/bench_instrumentation.py --calls 200000 --saves 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instrumentation
+from data_manager import DataManager
+
+
+def noop():
+    return None
+
+
+@instrumentation.timed("bench.noop")
+def timed_noop():
+    return None
+
+
+def per_call_ns(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def with_span():
+    with instrumentation.span("bench.span"):
+        pass
+
+
+def saves_ms(saves):
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DataManager(os.path.join(tmp, "patient_data"))
+        record = {"name": "Jane Doe", "age": "64", "diagnosis": "Glaucoma",
+                  "left_drawings": [{"type": "line", "color": "red", "width": 2,
+                                     "coords": [[10, 10], [20, 20]]}] * 50}
+        start = time.perf_counter()
+        for index in range(saves):
+            manager.save_complete_patient_record(f"P{index % 20:03d}", record, flush_audit=False)
+        elapsed = (time.perf_counter() - start) / saves * 1000
+        manager.flush_audit_log()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--saves", type=int, default=200)
+    args = parser.parse_args()
+
+    baseline = per_call_ns(noop, args.calls)
+    print(f"plain function call            {baseline:8.0f} ns")
+    for on in (False, True):
+        instrumentation.enable(on)
+        label = "on " if on else "off"
+        print(f"instrumentation {label}")
+        print(f"  span() block                 {per_call_ns(with_span, args.calls):8.0f} ns")
+        print(f"  @timed function call         {per_call_ns(timed_noop, args.calls):8.0f} ns")
+        print(f"  save_complete_patient_record {saves_ms(args.saves):8.2f} ms")
+    instrumentation.enable(False)
+
+
+if __name__ == "__main__":
+    main()
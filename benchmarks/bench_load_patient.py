@@ -0,0 +1,67 @@
+"""Compare load_patient latency from the snapshot file against the record-set layout.
+
+Run from the repository root:
+
+    python benchmarks/bench_load_patient.py --patients 50 --drawings 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_manager import DataManager
+
+
+def synthetic_drawings(rng, count, points_per_stroke=40):
+    drawings = []
+    for _ in range(count):
+        x, y = rng.uniform(0, 400), rng.uniform(0, 400)
+        path = [["M", x, y]]
+        for _ in range(points_per_stroke):
+            x, y = x + rng.uniform(-3, 3), y + rng.uniform(-3, 3)
+            path.append(["Q", x, y, x + 0.5, y + 0.5])
+        drawings.append({"type": "freehand", "color": "red", "width": 2, "alpha": 0.7,
+                         "points": path})
+    return drawings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--drawings", type=int, default=500,
+                        help="freehand strokes per eye")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        dm = DataManager(os.path.join(tmp, "patient_data"))
+        patient_ids = [f"P{i:05d}" for i in range(args.patients)]
+        for patient_id in patient_ids:
+            dm.save_complete_patient_record(patient_id, {
+                "name": f"Patient {patient_id}", "age": "60", "diagnosis": "Glaucoma",
+                "left_drawings": synthetic_drawings(rng, args.drawings),
+                "right_drawings": synthetic_drawings(rng, args.drawings),
+            })
+        snapshot_size = os.path.getsize(os.path.join(
+            dm.base_directory, "patients", patient_ids[0], "patient_snapshot.json"))
+        print(f"{args.patients} patients, {args.drawings} strokes per eye, "
+              f"snapshot {snapshot_size / 1e6:.1f} MB")
+        for label, kwargs in (("record set", {"use_snapshot": False}),
+                              ("snapshot", {})):
+            samples = []
+            for _ in range(args.repeat):
+                for patient_id in patient_ids:
+                    start = time.perf_counter()
+                    dm.load_patient(patient_id, **kwargs)
+                    samples.append((time.perf_counter() - start) * 1000)
+            print(f"  {label:<16} median {statistics.median(samples):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Measure patient registry lookups and searches at clinic-archive scale.
+
+Run from the repository root:
+
+    python benchmarks/bench_patient_registry.py --patients 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patient_registry import PatientRegistry
+
+DIAGNOSES = ["Diabetic Retinopathy", "Age-related Macular Degeneration", "Retinal Detachment",
+             "Glaucoma", "Retinitis Pigmentosa", "Other"]
+SURNAMES = ["Smith", "Patel", "Nguyen", "Garcia", "Okafor", "Kowalski", "Tanaka", "Brar"]
+
+
+def populate(registry, count):
+    rng = random.Random(42)
+    rows = []
+    for i in range(count):
+        name = f"{rng.choice(SURNAMES)} {i}"
+        rows.append((f"P{i:07d}", name, name.lower(), str(rng.randint(18, 95)),
+                     rng.choice(DIAGNOSES), "2025-03-03 10:00:00"))
+    with registry._connect() as conn:
+        conn.executemany(
+            "INSERT INTO patients (patient_id, name, name_lower, age, diagnosis, last_updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+def median_ms(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = PatientRegistry(os.path.join(tmp, "patient_registry.db"))
+        populate(registry, args.patients)
+        probe = f"P{args.patients // 2:07d}"
+        cases = [
+            ("exists", lambda: registry.exists(probe)),
+            ("get", lambda: registry.get(probe)),
+            ("id prefix (limit 20)", lambda: registry.search(id_prefix=probe[:6], limit=20)),
+            ("name prefix (limit 20)", lambda: registry.search(name_prefix="patel 123", limit=20)),
+            ("diagnosis + age (limit 20)",
+             lambda: registry.search(diagnosis="Glaucoma", age="64", limit=20)),
+            ("upsert", lambda: registry.upsert(probe, name="Patel Test", age="70")),
+        ]
+        print(f"{args.patients} patients")
+        for label, func in cases:
+            print(f"  {label:<28} {median_ms(func, args.repeat):8.3f} ms")
+        print(f"  {'list_ids':<28} {median_ms(registry.list_ids, 5):8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Stress record naming: many threads saving the same patients as fast as possible.
+
+Every save must produce its own files, so after the run each patient folder
+holds exactly one record set, demographics, medical record and drawing file
+per save. Run from the repository root:
+
+    python benchmarks/bench_record_ids.py --threads 8 --saves 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_manager import DataManager
+from record_ids import RecordIdGenerator
+
+
+def count_files(directory, prefix):
+    return sum(1 for name in os.listdir(directory) if name.startswith(prefix) and not name.endswith(".tmp"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--saves", type=int, default=250, help="saves per thread")
+    parser.add_argument("--patients", type=int, default=2)
+    args = parser.parse_args()
+
+    generator = RecordIdGenerator()
+    start = time.perf_counter()
+    ids = [generator.next_id() for _ in range(200000)]
+    elapsed = time.perf_counter() - start
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    print(f"id generation: {len(ids) / elapsed:,.0f} ids/s, strictly increasing")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dm = DataManager(os.path.join(tmp, "patient_data"))
+        errors = []
+
+        def worker(thread_index):
+            try:
+                for save in range(args.saves):
+                    patient_id = f"P{save % args.patients}"
+                    dm.save_complete_patient_record(patient_id, {
+                        "name": f"thread {thread_index}", "diagnosis": str(save),
+                        "left_drawings": [], "right_drawings": [],
+                    })
+                    dm.save_chart_image(patient_id, b"\x89PNG")
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        total = args.threads * args.saves
+        found = {"record sets": 0, "demographics": 0, "medical records": 0, "drawings": 0, "chart images": 0}
+        for index in range(args.patients):
+            patient_dir = os.path.join(dm.base_directory, "patients", f"P{index}")
+            found["record sets"] += count_files(patient_dir, "record_set_")
+            found["demographics"] += count_files(os.path.join(patient_dir, "demographics"), "demographics_2")
+            found["medical records"] += count_files(os.path.join(patient_dir, "medical_records"), "record_2")
+            found["drawings"] += count_files(os.path.join(patient_dir, "fundus_charts"), "fundus_drawing_")
+            found["chart images"] += count_files(os.path.join(patient_dir, "images"), "fundus_chart_")
+        print(f"{args.threads} threads x {args.saves} complete saves + chart images "
+              f"in {elapsed:.2f} s ({total / elapsed:,.0f} saves/s)")
+        for kind, count in found.items():
+            status = "ok" if count == total else f"LOST {total - count}"
+            print(f"  {kind:16s} {count:6d} / {total}  {status}")
+        assert all(count == total for count in found.values())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Measure the patient read cache and check per-patient write locking.
+
+Loads the same patient repeatedly with the cache bypassed and with it warm.
+It then checks three things:
+- A save from another process is seen by the next load.
+- Concurrent delta-history saves of one patient, from threads and from
+  processes, lose no versions.
+- Saves of different patients do not wait for each other.
+
+Run from the repository root:
+
+    python benchmarks/bench_shared_service.py --drawings 2000 --writers 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_load_patient import synthetic_drawings
+from data_manager import HISTORY_MODE_DELTA, DataManager
+
+
+def record(rng, drawings, name="Shared Patient"):
+    return {"name": name, "age": "70", "diagnosis": "Glaucoma", "provider": "Benchmark",
+            "left_drawings": synthetic_drawings(rng, drawings),
+            "right_drawings": synthetic_drawings(rng, drawings), "legend_data": []}
+
+
+def time_loads(manager, patient_id, repeat, clear):
+    samples = []
+    for _ in range(repeat):
+        if clear:
+            manager.record_cache.clear()
+        start = time.perf_counter()
+        manager.load_patient(patient_id)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def external_save(base_directory, patient_id, name):
+    manager = DataManager(base_directory)
+    manager.save_complete_patient_record(patient_id, dict(record(random.Random(9), 10), name=name))
+
+
+def delta_saves(base_directory, patient_id, saves, tag):
+    manager = DataManager(base_directory, history_mode=HISTORY_MODE_DELTA)
+    for index in range(saves):
+        manager.save_complete_patient_record(patient_id, {"name": f"{tag}-{index}", "age": "50",
+                                                          "left_drawings": [], "right_drawings": []})
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drawings", type=int, default=2000, help="freehand strokes per eye")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--writers", type=int, default=4, help="concurrent threads and processes")
+    parser.add_argument("--saves", type=int, default=10, help="saves per writer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as base:
+        manager = DataManager(base)
+        manager.save_complete_patient_record("P1", record(random.Random(1), args.drawings))
+        cold = time_loads(manager, "P1", args.repeat, clear=True)
+        warm = time_loads(manager, "P1", args.repeat, clear=False)
+        print(f"load_patient, {args.drawings} strokes per eye: uncached {cold:.2f} ms, "
+              f"cached {warm:.3f} ms ({cold / warm:.0f}x)")
+
+        loaded = manager.load_patient("P1")
+        loaded["left_drawings"].append({"type": "point", "coords": [1, 1]})
+        assert len(manager.load_patient("P1")["left_drawings"]) == args.drawings, "cache shared a list"
+
+        process = multiprocessing.Process(target=external_save, args=(base, "P1", "Renamed Elsewhere"))
+        process.start()
+        process.join()
+        assert manager.load_patient("P1")["name"] == "Renamed Elsewhere", "stale cache after external save"
+        print(f"external save seen by the next load; cache {manager.record_cache.stats()}")
+
+        total = args.writers * args.saves
+        delta = DataManager(base, history_mode=HISTORY_MODE_DELTA)
+        elapsed = run_threads(lambda index: delta_saves(base, "P2", args.saves, f"t{index}"),
+                              args.writers)
+        versions = [entry["version"] for entry in delta.list_history("P2")]
+        assert versions == list(range(1, total + 1)), f"threads lost versions: {versions}"
+        print(f"{args.writers} threads x {args.saves} delta saves of one patient: "
+              f"{len(versions)} versions in {elapsed:.2f} s")
+
+        processes = [multiprocessing.Process(target=delta_saves, args=(base, "P3", args.saves, f"p{index}"))
+                     for index in range(args.writers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        versions = [entry["version"] for entry in delta.list_history("P3")]
+        assert versions == list(range(1, total + 1)), f"processes lost versions: {versions}"
+        print(f"{args.writers} processes x {args.saves} delta saves of one patient: "
+              f"{len(versions)} versions")
+
+        data = record(random.Random(2), args.drawings // 4)
+        same = run_threads(lambda index: [manager.save_complete_patient_record("P4", data)
+                                          for _ in range(args.saves)], args.writers)
+        different = run_threads(lambda index: [manager.save_complete_patient_record(f"Q{index}", data)
+                                               for _ in range(args.saves)], args.writers)
+        print(f"{total} saves from {args.writers} threads: same patient {same:.2f} s, "
+              f"different patients {different:.2f} s "
+              f"(lock contended {manager.patient_locks.contended} times)")
+
+
+if __name__ == "__main__":
+    main()
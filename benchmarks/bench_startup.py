@@ -0,0 +1,101 @@
+"""Measure cold start and per-rerun overhead of streamlit_app.py.
+
+Each sample runs the app in a fresh interpreter under python -X importtime
+using Streamlit's AppTest harness, from an empty temp working directory.
+It times the script thread of the first run (time-to-first-render)
+separately from the reruns that follow, and lists the slowest top-level imports made during the
+first run. Run from the repository root:
+
+    python benchmarks/bench_startup.py --samples 5 --reruns 20
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "streamlit_app.py")
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+from streamlit.runtime.scriptrunner import script_runner
+harness = time.perf_counter()
+sys.stderr.write("import time: FIRST_RUN_MARKER\\n")
+
+# Time the script thread itself rather than AppTest's polling loop
+runs = []
+run_script = script_runner.ScriptRunner._run_script
+def timed_run_script(self, *args, **kwargs):
+    t = time.perf_counter()
+    try:
+        return run_script(self, *args, **kwargs)
+    finally:
+        runs.append(time.perf_counter() - t)
+script_runner.ScriptRunner._run_script = timed_run_script
+
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+assert not at.exception, at.exception
+for _ in range(int(sys.argv[2])):
+    at.run()
+print(json.dumps({"harness": harness - start, "first_run": runs[0], "reruns": runs[1:]}))
+"""
+
+
+def first_run_imports(stderr):
+    """Return {module: cumulative ms} for top-level imports made during the first script run"""
+    imports = {}
+    seen_marker = False
+    for line in stderr.splitlines():
+        if "FIRST_RUN_MARKER" in line:
+            seen_marker = True
+            continue
+        match = IMPORT_LINE.match(line)
+        if seen_marker and match and not match.group(3):
+            imports[match.group(4)] = int(match.group(2)) / 1000
+    return imports
+
+
+def sample(reruns):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD, APP, str(reruns)],
+                              cwd=tmp, env=env, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1]), first_run_imports(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=3, help="fresh interpreters to start")
+    parser.add_argument("--reruns", type=int, default=10, help="reruns timed in each interpreter")
+    parser.add_argument("--top", type=int, default=12, help="slowest imports to list")
+    args = parser.parse_args()
+
+    first_runs, reruns, imports = [], [], {}
+    for _ in range(args.samples):
+        timings, sample_imports = sample(args.reruns)
+        first_runs.append(timings["first_run"])
+        reruns.extend(timings["reruns"])
+        for module, ms in sample_imports.items():
+            imports.setdefault(module, []).append(ms)
+
+    print(f"{args.samples} cold starts, {args.reruns} reruns each")
+    print(f"  first run (time-to-first-render)  median {statistics.median(first_runs) * 1000:8.1f} ms")
+    if reruns:
+        print(f"  rerun overhead                    median {statistics.median(reruns) * 1000:8.1f} ms"
+              f"  p95 {sorted(reruns)[int(len(reruns) * 0.95) - 1] * 1000:.1f} ms")
+    print("  slowest top-level imports during the first run (cumulative, median):")
+    ranked = sorted(((statistics.median(v), k) for k, v in imports.items()), reverse=True)
+    for ms, module in ranked[:args.top]:
+        print(f"    {ms:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Compare the memory and undo latency of delta history against full snapshots.
+
+A chart starts with --objects freehand strokes; --edits canvas updates then
+add, move or delete single strokes. Each update goes through CanvasDiffer
+and its DrawingEdit is kept in a DrawingHistory. The alternatives keep a
+shallow copy (shared objects) or a deep copy of the drawing list per step;
+the deep copies are extrapolated from one, as they do not fit in memory.
+Undo is timed against rebuilding the drawings by diffing the previous
+canvas JSON again. Run from the repository root:
+
+    python benchmarks/bench_undo_history.py --objects 2000 --edits 200
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_canvas_diff import fabric_path
+from canvas_diff import CanvasDiffer
+from drawing_history import DrawingHistory
+
+
+def canvas_updates(rng, objects, edits):
+    """Yield successive canvas object lists, each one edit away from the last"""
+    for _ in range(edits):
+        objects = list(objects)
+        kind = rng.random()
+        if kind < 0.6 or len(objects) < 2:
+            objects.append(fabric_path(rng))
+        elif kind < 0.85:
+            index = rng.randrange(len(objects))
+            moved = dict(objects[index], left=objects[index]["left"] + rng.uniform(-20, 20))
+            objects[index] = moved
+        else:
+            del objects[rng.randrange(len(objects))]
+        yield objects
+
+
+def retained(build):
+    """Bytes still allocated by whatever build() returns, measured with tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=2000)
+    parser.add_argument("--edits", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    initial = [fabric_path(rng) for _ in range(args.objects)]
+    updates = list(canvas_updates(rng, initial, args.edits))
+    print(f"{args.objects} strokes, {args.edits} single-stroke edits")
+
+    def delta_history():
+        differ, drawings = CanvasDiffer("left"), []
+        differ.apply(initial, drawings, 0.7)
+        history = DrawingHistory(max_entries=args.edits + 1, max_bytes=1 << 40)
+        for objects in updates:
+            history.record(differ.apply(objects, drawings, 0.7).edit)
+        return differ, drawings, history
+
+    def shallow_snapshots():
+        differ, drawings = CanvasDiffer("left"), []
+        differ.apply(initial, drawings, 0.7)
+        steps = []
+        for objects in updates:
+            differ.apply(objects, drawings, 0.7)
+            steps.append(list(drawings))
+        return steps
+
+    # Every approach also holds the live drawings; a deep snapshot per step would hold one
+    # more copy of the chart per edit, so that figure is extrapolated rather than allocated
+    (differ, drawings, history), delta_bytes = retained(delta_history)
+    _, shallow_bytes = retained(shallow_snapshots)
+    _, chart_bytes = retained(lambda: copy.deepcopy(updates[-1]))
+    print(f"  one deep copy of the chart {chart_bytes / 1e6:8.2f} MB")
+    print(f"  delta history              {delta_bytes / 1e6:8.2f} MB  (cap estimate {history.bytes_held / 1e6:.2f} MB)")
+    print(f"  shallow snapshot per edit  {shallow_bytes / 1e6:8.2f} MB")
+    print(f"  deep snapshot per edit     {chart_bytes * args.edits / 1e6:8.2f} MB  (extrapolated)")
+
+    expected = [list(drawings)]
+    start = time.perf_counter()
+    steps = 0
+    while history.undo(differ):
+        steps += 1
+    undo_us = (time.perf_counter() - start) / max(steps, 1) * 1e6
+    start = time.perf_counter()
+    while history.redo(differ):
+        pass
+    redo_us = (time.perf_counter() - start) / max(steps, 1) * 1e6
+    assert drawings == expected[0], "undo/redo did not round-trip"
+
+    # The alternative without history: re-parse the previous canvas JSON and diff it
+    payloads = [json.dumps(objects) for objects in updates[-20:]]
+    reparse_differ, reparse_drawings = CanvasDiffer("left"), []
+    reparse_differ.apply(json.loads(payloads[-1]), reparse_drawings, 0.7)
+    start = time.perf_counter()
+    for payload in reversed(payloads[:-1]):
+        reparse_differ.apply(json.loads(payload), reparse_drawings, 0.7)
+    reparse_us = (time.perf_counter() - start) / (len(payloads) - 1) * 1e6
+    print(f"  undo {undo_us:8.1f} us  redo {redo_us:8.1f} us  per step   "
+          f"(re-parse + diff the previous canvas JSON: {reparse_us:,.0f} us)")
+
+
+if __name__ == "__main__":
+    main()
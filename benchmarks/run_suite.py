@@ -0,0 +1,293 @@
+"""Reproducible benchmark suite for the chart, canvas, storage and audit paths.
+
+Every case runs headless on synthetic patients and drawings generated from
+fixed seeds, so two runs at the same scale do the same work. Results are
+written as JSON (environment plus median, min, p95 and throughput per case)
+and can be compared against a stored baseline; the exit status is 1 when a
+case got slower than the baseline by more than the tolerance.
+
+Run from the repository root:
+
+    python benchmarks/run_suite.py --scale quick --output results.json
+    python benchmarks/run_suite.py --save-baseline baseline.json
+    python benchmarks/run_suite.py --baseline baseline.json --tolerance 25
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_canvas_diff import fabric_path
+from bench_load_patient import synthetic_drawings
+from canvas_diff import CanvasDiffer
+from chart_rendering import render_chart
+from chart_template import TemplateChartRenderer
+from data_manager import DataManager
+
+SCALES = {
+    "quick": {"repeat": 5, "canvas_objects": 2000, "drawings": 300, "round_trips": 10,
+              "registry_sizes": (10000,), "backup_patients": 40, "audit_entries": 20000},
+    "full": {"repeat": 10, "canvas_objects": 10000, "drawings": 2000, "round_trips": 20,
+             "registry_sizes": (10000, 100000), "backup_patients": 200, "audit_entries": 100000},
+}
+
+LEGEND = [
+    {"label": "Haemorrhage", "color": "red", "fill_type": "solid", "alpha": 0.7, "line_width": 2},
+    {"label": "Laser scar", "color": "black", "fill_type": "none", "alpha": 1.0, "line_width": 2},
+]
+DIAGNOSES = ("Diabetic Retinopathy", "Glaucoma", "AMD", "Retinal Detachment", "Normal")
+
+
+def synthetic_patient(rng, index, drawings):
+    """Return a complete patient record dict with drawings strokes per eye"""
+    return {
+        "name": f"Patient {index:06d}", "age": str(rng.randint(18, 95)),
+        "diagnosis": rng.choice(DIAGNOSES), "diagnosis_other": "",
+        "left_eye": "", "right_eye": "", "va_left": "6/9", "va_right": "6/12",
+        "iop_left": str(rng.randint(10, 30)), "iop_right": str(rng.randint(10, 30)),
+        "provider": "Benchmark",
+        "left_drawings": synthetic_drawings(rng, drawings),
+        "right_drawings": synthetic_drawings(rng, drawings),
+        "legend_data": LEGEND,
+    }
+
+
+def chart_header(rng, index):
+    return {"name": f"Patient {index:06d}", "pid": f"P{index:06d}", "age": str(rng.randint(18, 95)),
+            "diagnosis": rng.choice(DIAGNOSES), "diagnosis_other": "", "left_eye": "",
+            "right_eye": "", "va_left": "6/9", "va_right": "6/12", "iop_left": "16",
+            "iop_right": "18"}
+
+
+def measure(func, repeat, setup=None):
+    """Call func repeat times (after setup, untimed) and return the durations in seconds"""
+    samples = []
+    for index in range(repeat):
+        state = setup(index) if setup else None
+        start = time.perf_counter()
+        func(state) if setup else func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples, ops=1, **params):
+    """Return the JSON result of one case: ms statistics and operations per second"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    median = statistics.median(ordered)
+    return {"samples": len(ordered), "median_ms": median * 1000, "min_ms": ordered[0] * 1000,
+            "p95_ms": p95 * 1000, "ops_per_sec": ops / median if median else 0.0,
+            "params": params}
+
+
+def bench_chart(config, workdir):
+    renderer = TemplateChartRenderer()
+    rng = random.Random(1)
+    results = {}
+    for dpi in (100, 300):
+        render_chart(chart_header(rng, 0), LEGEND, dpi, renderer)  # build the dpi's template
+        headers = [chart_header(rng, index) for index in range(config["repeat"])]
+        samples = measure(lambda header: render_chart(header, LEGEND, dpi, renderer),
+                          config["repeat"], setup=lambda index: headers[index])
+        results[f"chart.render_{dpi}dpi"] = summarize(samples, dpi=dpi)
+    return results
+
+
+def bench_canvas(config, workdir):
+    rng = random.Random(2)
+    count = config["canvas_objects"]
+    payload = json.dumps({"objects": [fabric_path(rng) for _ in range(count)]})
+    added = json.loads(payload)
+    added["objects"].append(fabric_path(rng))
+    added = json.dumps(added)
+
+    def fresh(index):
+        return CanvasDiffer("left"), []
+
+    def primed(index):
+        differ, drawings = CanvasDiffer("left"), []
+        differ.apply(json.loads(payload)["objects"], drawings, 0.7)
+        return differ, drawings
+
+    def apply(state, data):
+        differ, drawings = state
+        differ.apply(json.loads(data)["objects"], drawings, 0.7)
+
+    return {
+        "canvas.full_rebuild": summarize(
+            measure(lambda state: apply(state, payload), config["repeat"], setup=fresh),
+            objects=count, payload_bytes=len(payload)),
+        "canvas.one_added": summarize(
+            measure(lambda state: apply(state, added), config["repeat"], setup=primed),
+            objects=count + 1, payload_bytes=len(added)),
+    }
+
+
+def bench_round_trip(config, workdir):
+    rng = random.Random(3)
+    manager = DataManager(os.path.join(workdir, "round_trip"))
+    count = config["round_trips"]
+    patients = [synthetic_patient(rng, index, config["drawings"]) for index in range(count)]
+    ids = [f"P{index:06d}" for index in range(count)]
+    save = measure(lambda index: manager.save_complete_patient_record(ids[index], patients[index]),
+                   count, setup=lambda index: index)
+    load = measure(lambda index: manager.load_patient(ids[index]), count, setup=lambda index: index)
+    load_record_set = measure(lambda index: manager.load_patient(ids[index], use_snapshot=False),
+                              count, setup=lambda index: index)
+    return {
+        "storage.save_complete_patient_record": summarize(save, drawings=config["drawings"]),
+        "storage.load_patient": summarize(load, drawings=config["drawings"]),
+        "storage.load_patient_record_set": summarize(load_record_set, drawings=config["drawings"]),
+    }
+
+
+def populate_registry(manager, count, rng):
+    """Register count synthetic patients directly, without writing their files"""
+    rows = []
+    for index in range(count):
+        name = f"Patient {index:06d}"
+        rows.append((f"P{index:06d}", name, name.lower(), str(rng.randint(18, 95)),
+                     rng.choice(DIAGNOSES), "2025-01-01 00:00:00"))
+    with manager.registry._connect() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO patients (patient_id, name, name_lower, age, diagnosis, "
+            "last_updated) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+def bench_list_patients(config, workdir):
+    rng = random.Random(4)
+    results = {}
+    for size in config["registry_sizes"]:
+        manager = DataManager(os.path.join(workdir, f"registry_{size}"))
+        populate_registry(manager, size, rng)
+        assert len(manager.list_patients()) == size
+        results[f"registry.list_patients_{size}"] = summarize(
+            measure(manager.list_patients, config["repeat"]), patients=size)
+    return results
+
+
+def bench_backup(config, workdir):
+    rng = random.Random(5)
+    manager = DataManager(os.path.join(workdir, "backup"))
+    count = config["backup_patients"]
+    for index in range(count):
+        manager.save_complete_patient_record(f"P{index:06d}",
+                                             synthetic_patient(rng, index, config["drawings"] // 10))
+    repeat = max(3, config["repeat"] // 2)
+    full = measure(lambda: manager.create_backup(), repeat)
+    first = measure(lambda: manager.create_backup(incremental=True), 1)
+    unchanged = measure(lambda: manager.create_backup(incremental=True), repeat)
+    return {
+        "backup.full": summarize(full, patients=count),
+        "backup.incremental_first": summarize(first, patients=count),
+        "backup.incremental_unchanged": summarize(unchanged, patients=count),
+    }
+
+
+def bench_audit(config, workdir):
+    manager = DataManager(os.path.join(workdir, "audit"))
+    entries = config["audit_entries"]
+
+    def burst():
+        for index in range(entries):
+            manager.log_change(f"P{index % 500:06d}", "record_saved", "Benchmark entry")
+        manager.flush_audit_log()
+
+    return {"audit.log_change": summarize(measure(burst, max(3, config["repeat"] // 2)),
+                                          ops=entries, entries=entries)}
+
+
+CASES = (("chart", bench_chart), ("canvas", bench_canvas), ("storage", bench_round_trip),
+         ("registry", bench_list_patients), ("backup", bench_backup), ("audit", bench_audit))
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "platform": platform.platform(), "machine": platform.machine(),
+            "cpu_count": os.cpu_count(), "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def compare(results, baseline, tolerance):
+    """Print current vs baseline medians and return the names of regressed cases"""
+    regressions = []
+    print(f"\n{'case':40} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for name, result in results["cases"].items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None:
+            print(f"{name:40} {'-':>12} {result['median_ms']:12.2f} {'new':>8}")
+            continue
+        change = (result["median_ms"] / reference["median_ms"] - 1) * 100 if reference["median_ms"] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:40} {reference['median_ms']:12.2f} {result['median_ms']:12.2f} "
+              f"{change:+7.1f}%{flag}")
+    if baseline.get("scale") != results["scale"]:
+        print(f"warning: baseline scale {baseline.get('scale')!r} differs from {results['scale']!r}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="quick")
+    parser.add_argument("--repeat", type=int, help="override the scale's repeat count")
+    parser.add_argument("--only", action="append", choices=[name for name, _ in CASES],
+                        help="run only this group (may be repeated)")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="also write the results JSON here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=20.0,
+                        help="allowed median slowdown against the baseline, in percent")
+    args = parser.parse_args(argv)
+
+    config = dict(SCALES[args.scale])
+    if args.repeat:
+        config["repeat"] = args.repeat
+    results = {"scale": args.scale, "config": config, "environment": environment(), "cases": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, case in CASES:
+            if args.only and name not in args.only:
+                continue
+            start = time.perf_counter()
+            cases = case(config, workdir)
+            for case_name, result in cases.items():
+                print(f"{case_name:40} median {result['median_ms']:10.2f} ms  "
+                      f"p95 {result['p95_ms']:10.2f} ms  {result['ops_per_sec']:12.1f} ops/s")
+            print(f"  ({name} group took {time.perf_counter() - start:.1f} s)")
+            results["cases"].update(cases)
+
+    encoded = json.dumps(results, indent=2, sort_keys=True) + "\n"
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                f.write(encoded)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline by more than "
+                  f"{args.tolerance:g}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
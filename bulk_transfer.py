@@ -0,0 +1,356 @@
+"""Bulk import and export of patient records through DataManager.
+
+Import streams records from a JSONL or CSV file in fixed-size batches and
+saves each batch in a worker process with save_complete_patient_record. The
+audit log is fsynced once per batch instead of once per record. Rows are
+split into PARTITIONS by a hash of their patient ID, and batches of one
+partition run one at a time in file order, so a patient's rows are always
+saved in order and the last row in the file becomes their latest record.
+
+Finished batches are appended to a progress file next to the source, so an
+interrupted import started again skips them. The progress file records the
+batch size, and resuming with a different one is refused because batch
+numbers would then name different rows. A batch that was cut off part way
+is saved again in full: the latest record is the same, but that patient
+gets an extra history entry.
+
+Export writes the latest record of every registered patient (optionally
+filtered by ID prefix) to JSONL or CSV, loading patients in worker
+processes. The export is logged as one SYSTEM audit entry rather than a
+data_access entry per patient.
+
+    python bulk_transfer.py import archive.jsonl --workers 4
+    python bulk_transfer.py export patients.csv --id-prefix P0
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from data_manager import DataManager, check_patient_id
+
+# Columns holding JSON documents when records travel through CSV
+JSON_COLUMNS = ("left_drawings", "right_drawings", "legend_data")
+CSV_COLUMNS = ("patient_id", "name", "age", "diagnosis", "diagnosis_other", "left_eye", "right_eye",
+               "va_left", "va_right", "iop_left", "iop_right", "provider") + JSON_COLUMNS
+# Import partitions; fixed, so a resumed import forms the same batches with any worker count
+PARTITIONS = 16
+
+_worker_manager = None
+
+
+def detect_format(path, fmt=None):
+    """Return "csv" or "jsonl" from an explicit format or the file extension"""
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _parse_csv_row(row):
+    for column in JSON_COLUMNS:
+        value = (row.get(column) or "").strip()
+        if value:
+            row[column] = json.loads(value)
+        elif column in row:
+            # An empty cell means none, not the string ''
+            row[column] = []
+    return row
+
+
+def read_records(path, fmt=None, errors=None):
+    """Yield (line number, record) from a JSONL or CSV file
+
+    A row holding invalid JSON raises ValueError, or when an errors list is
+    given is appended to it as (line number, message) and skipped.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        if detect_format(path, fmt) == "csv":
+            rows = enumerate(csv.DictReader(f), start=1)
+            parse = _parse_csv_row
+        else:
+            rows = ((number, line) for number, line in enumerate(f, start=1) if line.strip())
+            parse = json.loads
+        for number, row in rows:
+            try:
+                record = parse(row)
+            except json.JSONDecodeError as exc:
+                if errors is None:
+                    raise
+                errors.append((number, f"invalid JSON: {exc}"))
+                continue
+            yield number, record
+
+
+def record_patient_id(record):
+    """Return the patient ID a row names, or "" if it names none"""
+    if not isinstance(record, dict):
+        return ""
+    return str(record.get("patient_id") or record.get("id") or "").strip()
+
+
+def partitioned_batches(records, batch_size, partitions=PARTITIONS):
+    """Group (line, record) pairs into (partition, batch); a patient's rows share a partition
+
+    Batches come out in the order they fill up, then the partly filled ones
+    by partition, so the same input always gives the same batches.
+    """
+    pending = {}
+    for item in records:
+        partition = zlib.crc32(record_patient_id(item[1]).encode("utf-8")) % partitions
+        batch = pending.setdefault(partition, [])
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield partition, pending.pop(partition)
+    for partition in sorted(pending):
+        yield partition, pending[partition]
+
+
+def batched(records, batch_size):
+    """Group records into lists of batch_size"""
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker(base_directory, manager_options):
+    global _worker_manager
+    _worker_manager = DataManager(base_directory, **manager_options)
+
+
+def _import_batch(batch):
+    """Save one batch in a worker; return (saved, [(line, error), ...])"""
+    saved = 0
+    errors = []
+    for number, record in batch:
+        if not isinstance(record, dict):
+            errors.append((number, f"expected a JSON object, got {type(record).__name__}"))
+            continue
+        patient_id = record_patient_id(record)
+        if not patient_id:
+            errors.append((number, "missing patient_id"))
+            continue
+        try:
+            check_patient_id(patient_id)
+        except ValueError as exc:
+            errors.append((number, str(exc)))
+            continue
+        try:
+            _worker_manager.save_complete_patient_record(patient_id, record, flush_audit=False)
+            saved += 1
+        except (OSError, ValueError, TypeError) as exc:
+            errors.append((number, str(exc)))
+    _worker_manager.flush_audit_log()
+    return saved, errors
+
+
+def _export_batch(patient_ids):
+    results = []
+    for patient_id in patient_ids:
+        data = _worker_manager.load_patient(patient_id, audit=False)
+        if data is not None:
+            data = dict(data, patient_id=patient_id)
+            data.pop("id", None)
+            results.append(data)
+    return results
+
+
+def _load_progress(progress_path, batch_size):
+    """Return the finished batch numbers, starting the progress file if there is none
+
+    Raises ValueError if the file was written with another batch size.
+    """
+    if not os.path.exists(progress_path):
+        with open(progress_path, 'w') as f:
+            f.write(json.dumps({"batch_size": batch_size, "partitions": PARTITIONS}) + "\n")
+        return set()
+    with open(progress_path, 'r') as f:
+        lines = [line for line in f if line.strip()]
+    header = json.loads(lines[0]) if lines and lines[0].startswith("{") else {}
+    if header != {"batch_size": batch_size, "partitions": PARTITIONS}:
+        raise ValueError(f"{progress_path} was written by an import with {header or 'another layout'}; "
+                         f"resume with the same --batch-size or remove the file to start over")
+    return {int(line) for line in lines[1:]}
+
+
+def _run_pool(workers, base_directory, manager_options, tasks, handle, lane=None):
+    """Run (key, function, argument) tasks with a bounded number in flight, calling handle(key, result)
+
+    Tasks whose keys give the same lane(key) run one at a time, in order.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(base_directory, manager_options)) as pool:
+        running = {}
+        busy = set()
+        waiting = {}
+
+        def start(task):
+            key, function, argument = task
+            running[pool.submit(function, argument)] = key
+            if lane is not None:
+                busy.add(lane(key))
+
+        def finish(future):
+            key = running.pop(future)
+            handle(key, future.result())
+            if lane is not None:
+                busy.discard(lane(key))
+                queued = waiting.get(lane(key))
+                if queued:
+                    start(queued.popleft())
+                    if not queued:
+                        del waiting[lane(key)]
+
+        for task in tasks:
+            if lane is not None and lane(task[0]) in busy:
+                waiting.setdefault(lane(task[0]), deque()).append(task)
+            else:
+                start(task)
+            while len(running) + sum(map(len, waiting.values())) >= workers * 2:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(future)
+
+
+def import_records(source, base_directory="patient_data", fmt=None, workers=None, batch_size=200,
+                   progress_path=None, manager_options=None):
+    """Import records from source and return throughput stats"""
+    workers = workers or os.cpu_count() or 1
+    manager_options = manager_options or {}
+    progress_path = progress_path or f"{source}.progress"
+    # Build the registry once here rather than racing in every worker
+    DataManager(base_directory, **manager_options)
+    done = _load_progress(progress_path, batch_size)
+    stats = {"saved": 0, "failed": 0, "skipped_batches": 0, "batches": 0}
+    errors = []
+    unreadable = []
+    start = time.perf_counter()
+
+    def tasks():
+        batches = partitioned_batches(read_records(source, fmt, unreadable), batch_size)
+        for index, (partition, batch) in enumerate(batches):
+            if index in done:
+                stats["skipped_batches"] += 1
+                continue
+            yield (partition, index), _import_batch, batch
+
+    with open(progress_path, 'a') as progress:
+        def handle(key, result):
+            _, index = key
+            saved, batch_errors = result
+            stats["saved"] += saved
+            stats["failed"] += len(batch_errors)
+            stats["batches"] += 1
+            errors.extend(batch_errors)
+            progress.write(f"{index}\n")
+            progress.flush()
+            os.fsync(progress.fileno())
+
+        _run_pool(workers, base_directory, manager_options, tasks(), handle, lane=lambda key: key[0])
+    stats["failed"] += len(unreadable)
+    errors.extend(unreadable)
+    stats["seconds"] = time.perf_counter() - start
+    stats["errors"] = sorted(errors)
+    return stats
+
+
+def export_records(target, base_directory="patient_data", fmt=None, workers=None, batch_size=200,
+                   id_prefix=None):
+    """Export the latest record of every matching patient to target and return stats"""
+    workers = workers or os.cpu_count() or 1
+    manager = DataManager(base_directory)
+    patient_ids = [row["patient_id"] for row in manager.search_patients(id_prefix=id_prefix)]
+    fmt = detect_format(target, fmt)
+    start = time.perf_counter()
+    pending = {}
+    next_index = [0]
+    exported = [0]
+    with open(target, 'w', newline='', encoding='utf-8') as f:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+
+        def handle(index, records):
+            # Write batches in registry order even though workers finish out of order
+            pending[index] = records
+            while next_index[0] in pending:
+                for record in pending.pop(next_index[0]):
+                    if writer is not None:
+                        writer.writerow({key: json.dumps(value) if key in JSON_COLUMNS else value
+                                         for key, value in record.items()})
+                    else:
+                        f.write(json.dumps(record) + "\n")
+                    exported[0] += 1
+                next_index[0] += 1
+
+        tasks = ((index, _export_batch, batch)
+                 for index, batch in enumerate(batched(patient_ids, batch_size)))
+        _run_pool(workers, base_directory, {}, tasks, handle)
+    manager.log_change("SYSTEM", "bulk_export", f"Exported {exported[0]} patient records to {target}")
+    manager.flush_audit_log()
+    return {"exported": exported[0], "seconds": time.perf_counter() - start}
+
+
+def _print_stats(label, count, stats):
+    seconds = stats["seconds"]
+    rate = count / seconds if seconds else 0.0
+    print(f"{label} {count} records in {seconds:.2f} s ({rate:,.0f} records/s)")
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--base-directory", default="patient_data")
+    common.add_argument("--workers", type=int, default=None)
+    common.add_argument("--batch-size", type=int, default=200)
+    common.add_argument("--format", choices=("jsonl", "csv"), default=None)
+    parser = argparse.ArgumentParser(description="Bulk import and export of patient records")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", parents=[common], help="save records from a JSONL/CSV file")
+    importer.add_argument("source")
+    importer.add_argument("--progress", default=None, help="progress file (default: <source>.progress)")
+    importer.add_argument("--drawing-format", choices=("json", "binary"), default="json")
+    importer.add_argument("--history-mode", choices=("full", "delta"), default="full")
+    exporter = commands.add_parser("export", parents=[common], help="write the latest records to a JSONL/CSV file")
+    exporter.add_argument("target")
+    exporter.add_argument("--id-prefix", default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        try:
+            stats = import_records(args.source, args.base_directory, args.format, args.workers,
+                                   args.batch_size, args.progress,
+                                   {"drawing_format": args.drawing_format, "history_mode": args.history_mode})
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            return 2
+        _print_stats("Imported", stats["saved"], stats)
+        if stats["skipped_batches"]:
+            print(f"  skipped {stats['skipped_batches']} batches finished by an earlier run")
+        for number, error in stats["errors"][:20]:
+            print(f"  line {number}: {error}", file=sys.stderr)
+        if stats["failed"]:
+            print(f"  {stats['failed']} records failed", file=sys.stderr)
+            return 1
+    else:
+        stats = export_records(args.target, args.base_directory, args.format, args.workers,
+                               args.batch_size, args.id_prefix)
+        _print_stats("Exported", stats["exported"], stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
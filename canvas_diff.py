@@ -0,0 +1,283 @@
+import json
+
+# fabric.js object types that become stored drawings
+DRAWABLE_TYPES = ("path", "rect", "line", "circle", "point")
+# Coordinates of stored drawings: 1 kept fabric.js's centre-relative line ends and put
+# circle centres half a stroke off; 2 is canvas coordinates throughout
+DRAWING_COORDS_FORMAT = 2
+
+
+def _center(obj):
+    """Return the canvas centre of a fabric.js object positioned by its top-left corner"""
+    stroke = obj.get("strokeWidth", 0) or 0
+    width = obj.get("width", 0) + stroke
+    height = obj.get("height", 0) + stroke
+    return (obj["left"] + width * obj.get("scaleX", 1) / 2,
+            obj["top"] + height * obj.get("scaleY", 1) / 2)
+
+
+def canvas_object_to_drawing(obj, default_alpha):
+    """Convert one fabric.js canvas object into a stored drawing dict, or None"""
+    if obj.get("type") not in DRAWABLE_TYPES:
+        return None
+    color = f"#{obj['stroke'][1:]}" if obj['stroke'].startswith('#') else obj['stroke']
+    drawing_data = {
+        "type": obj["type"],
+        "color": color,
+        "width": obj["strokeWidth"],
+        "alpha": obj.get("opacity", default_alpha)
+    }
+    if obj["type"] == "path":
+        drawing_data["points"] = obj["path"]
+        drawing_data["type"] = "freehand"
+    elif obj["type"] == "rect":
+        drawing_data["coords"] = ((obj["left"], obj["top"]), obj["width"] * obj.get("scaleX", 1),
+                                  obj["height"] * obj.get("scaleY", 1))
+        drawing_data["fill"] = "solid" if obj["fill"] != "transparent" else "none"
+    elif obj["type"] == "line":
+        # fabric.js stores line ends relative to the object's centre; keep canvas coordinates
+        cx, cy = _center(obj)
+        sx, sy = obj.get("scaleX", 1), obj.get("scaleY", 1)
+        drawing_data["coords"] = ((cx + obj["x1"] * sx, cy + obj["y1"] * sy),
+                                  (cx + obj["x2"] * sx, cy + obj["y2"] * sy))
+    elif obj["type"] == "circle":
+        drawing_data["coords"] = (_center(obj), obj["radius"] * obj.get("scaleX", 1))
+        drawing_data["fill"] = "solid" if obj["fill"] != "transparent" else "none"
+    elif obj["type"] == "point":
+        drawing_data["coords"] = (obj["left"], obj["top"])
+        drawing_data["radius"] = 5  # Fixed size for dot
+    return drawing_data
+
+
+def upgrade_drawings(drawings, coords_format=1):
+    """Return drawings saved in an older coords_format in today's canvas coordinates
+
+    Format 1 circles move by half a stroke. A format 1 line only kept its
+    ends relative to its centre, which was never stored, so it cannot be
+    placed: its ends move to relative_coords and coords becomes None, which
+    keeps it in the record without drawing it in the wrong place.
+    """
+    if coords_format >= DRAWING_COORDS_FORMAT:
+        return drawings
+    upgraded = []
+    for drawing in drawings:
+        kind = drawing.get("type")
+        if kind == "circle" and drawing.get("coords") is not None:
+            (cx, cy), radius = drawing["coords"]
+            half = (drawing.get("width") or 0) / 2
+            drawing = dict(drawing, coords=[[cx + half, cy + half], radius])
+        elif kind == "line" and drawing.get("coords") is not None:
+            drawing = dict(drawing, coords=None, relative_coords=drawing["coords"])
+        upgraded.append(drawing)
+    return upgraded
+
+
+def drawing_to_canvas_object(drawing):
+    """Convert a stored drawing dict back into a fabric.js object to reload the canvas with, or None"""
+    kind = drawing.get("type")
+    obj = {
+        "stroke": drawing.get("color", "black"),
+        "strokeWidth": drawing.get("width", 2),
+        "opacity": drawing.get("alpha", 1.0),
+        "fill": "transparent",
+    }
+    solid = drawing.get("fill") == "solid"
+    if kind != "freehand" and drawing.get("coords") is None:
+        return None
+    if kind == "freehand":
+        # Without left/top fabric.js places a path by its own absolute coordinates
+        obj.update(type="path", path=drawing["points"], fill=None,
+                   strokeLineCap="round", strokeLineJoin="round")
+    elif kind == "rect":
+        (left, top), width, height = drawing["coords"]
+        obj.update(type="rect", left=left, top=top, width=width, height=height)
+    elif kind == "line":
+        # Absolute end points and no left/top: fabric.js works out the position itself
+        (x1, y1), (x2, y2) = drawing["coords"]
+        obj.update(type="line", x1=x1, y1=y1, x2=x2, y2=y2)
+    elif kind in ("circle", "point"):
+        if kind == "circle":
+            (cx, cy), radius = drawing["coords"]
+        else:
+            (cx, cy), radius = drawing["coords"], drawing.get("radius", 5)
+            solid = True
+        offset = radius + obj["strokeWidth"] / 2
+        obj.update(type="circle", left=cx - offset, top=cy - offset, radius=radius,
+                   width=2 * radius, height=2 * radius)
+    else:
+        return None
+    if solid:
+        obj["fill"] = obj["stroke"]
+    return obj
+
+
+def _content_key(obj):
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class DrawingEdit:
+    """One canvas update as a splice: objects[start:start + len(old)] became new
+
+    The canvas objects and their drawings are kept side by side. Unchanged
+    objects are never copied, so an edit holds only what it touched.
+    """
+
+    __slots__ = ("start", "old_objects", "old_drawings", "new_objects", "new_drawings")
+
+    def __init__(self, start, old_objects, old_drawings, new_objects, new_drawings):
+        """Record the replaced and replacing slices"""
+        self.start = start
+        self.old_objects = old_objects
+        self.old_drawings = old_drawings
+        self.new_objects = new_objects
+        self.new_drawings = new_drawings
+
+    def undo(self, differ):
+        """Put the replaced objects back"""
+        differ.splice(self.start, self.start + len(self.new_objects), self.old_objects, self.old_drawings)
+
+    def redo(self, differ):
+        """Apply the edit again"""
+        differ.splice(self.start, self.start + len(self.old_objects), self.new_objects, self.new_drawings)
+
+
+class ChangeSet:
+    """Drawings added, modified and removed by one canvas update"""
+
+    def __init__(self, eye):
+        """Initialize an empty change set for eye"""
+        self.eye = eye
+        self.added = []
+        self.modified = []
+        self.removed = []
+        self.unchanged = 0
+        self.full_rebuild = False
+        self.edit = None
+
+    @property
+    def empty(self):
+        """True if nothing changed"""
+        return not (self.added or self.modified or self.removed or self.full_rebuild)
+
+    def __repr__(self):
+        return (f"ChangeSet({self.eye}: +{len(self.added)} ~{len(self.modified)} "
+                f"-{len(self.removed)} ={self.unchanged})")
+
+
+class CanvasDiffer:
+    """Track one canvas and apply only the objects that changed to its drawings list
+
+    Objects are matched first by position over the unchanged prefix and
+    suffix, then by content hash in the edited middle, so only new or
+    edited objects are converted. added and removed hold drawing dicts,
+    modified holds (old, new) drawing pairs, and edit holds the DrawingEdit
+    that undoes the update (None for a full rebuild or no change).
+    """
+
+    def __init__(self, eye):
+        """Initialize with no known canvas state"""
+        self.eye = eye
+        self._objects = []
+        self._drawings = []
+        self._hidden = []
+        self._target = None
+
+    def reset(self):
+        """Forget the known canvas state so the next update rebuilds everything"""
+        self._objects = []
+        self._drawings = []
+        self._hidden = []
+        self._target = None
+
+    def load(self, drawings):
+        """Track drawings (e.g. a loaded patient's) as the canvas state; return the objects to show
+
+        Afterwards drawings is the tracked list, so the canvas echoing these
+        objects back is not a change and nothing is rebuilt. Drawings the
+        canvas cannot show are moved to the end of drawings and kept there.
+        """
+        pairs = [(drawing_to_canvas_object(drawing), drawing) for drawing in drawings]
+        self._objects = [obj for obj, _ in pairs if obj is not None]
+        self._drawings = [drawing for obj, drawing in pairs if obj is not None]
+        self._hidden = [drawing for obj, drawing in pairs if obj is None]
+        drawings[:] = self._drawings + self._hidden
+        self._target = drawings
+        return self.objects()
+
+    def adopt(self, canvas_objects):
+        """Take the canvas's own serialization of the tracked objects, keeping their drawings
+
+        Returns False, changing nothing, if the canvas holds a different
+        number of drawable objects.
+        """
+        objects = [obj for obj in canvas_objects if obj.get("type") in DRAWABLE_TYPES]
+        if len(objects) != len(self._objects):
+            return False
+        self._objects = objects
+        return True
+
+    def apply(self, canvas_objects, drawings, default_alpha):
+        """Update drawings in place from the canvas objects and return a ChangeSet"""
+        changes = ChangeSet(self.eye)
+        objects = [obj for obj in canvas_objects if obj.get("type") in DRAWABLE_TYPES]
+        if drawings is not self._target:
+            # The drawings list was replaced (new or loaded patient): rebuild from the canvas
+            self._objects, self._drawings, self._hidden = [], [], []
+            self._target = drawings
+            changes.full_rebuild = True
+        old_objects, old_drawings = self._objects, self._drawings
+
+        start = 0
+        limit = min(len(objects), len(old_objects))
+        while start < limit and objects[start] == old_objects[start]:
+            start += 1
+        end_new, end_old = len(objects), len(old_objects)
+        while end_new > start and end_old > start and objects[end_new - 1] == old_objects[end_old - 1]:
+            end_new -= 1
+            end_old -= 1
+
+        old_middle = {}
+        for index in range(start, end_old):
+            old_middle.setdefault(_content_key(old_objects[index]), []).append(index)
+        matched_old = set()
+        middle = []
+        fresh = []
+        for obj in objects[start:end_new]:
+            candidates = old_middle.get(_content_key(obj))
+            if candidates:
+                index = candidates.pop(0)
+                matched_old.add(index)
+                middle.append(old_drawings[index])
+            else:
+                drawing = canvas_object_to_drawing(obj, default_alpha)
+                middle.append(drawing)
+                fresh.append(drawing)
+        gone = [old_drawings[index] for index in range(start, end_old) if index not in matched_old]
+        # Pair edited objects with the ones they replaced; the rest were added or removed
+        paired = min(len(fresh), len(gone))
+        changes.modified = list(zip(gone[:paired], fresh[:paired]))
+        changes.added = fresh[paired:]
+        changes.removed = gone[paired:]
+        changes.unchanged = len(objects) - len(fresh)
+
+        new_drawings = old_drawings[:start] + middle + old_drawings[end_old:]
+        if not changes.full_rebuild and not changes.empty:
+            changes.edit = DrawingEdit(start, old_objects[start:end_old], old_drawings[start:end_old],
+                                       objects[start:end_new], middle)
+        self._objects = objects
+        self._drawings = new_drawings
+        if changes.full_rebuild or not changes.empty:
+            drawings[:] = new_drawings + self._hidden
+        return changes
+
+    def objects(self):
+        """Return the canvas objects the drawings were made from, e.g. to reload the canvas"""
+        return list(self._objects)
+
+    def splice(self, start, stop, objects, drawings):
+        """Replace objects[start:stop] and the matching drawings, in the tracked list too"""
+        self._objects[start:stop] = objects
+        self._drawings[start:stop] = drawings
+        if self._target is not None:
+            self._target[start:stop] = drawings
+
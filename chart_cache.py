@@ -0,0 +1,98 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Header fields that change the rendered background chart
+CHART_HEADER_FIELDS = (
+    "name", "pid", "age", "diagnosis", "diagnosis_other",
+    "left_eye", "right_eye", "va_left", "va_right", "iop_left", "iop_right",
+)
+
+
+def chart_cache_key(header, legend_data, dpi, drawings=None):
+    """Return a content hash of exactly the inputs that affect the chart image
+
+    drawings is an optional (left, right) pair of drawing lists for charts
+    that include the strokes; it is left out of the key when not given.
+    """
+    payload = {
+        "header": [str(header.get(field, "") or "") for field in CHART_HEADER_FIELDS],
+        "legend": legend_data or [],
+        "dpi": dpi,
+    }
+    if drawings is not None:
+        payload["drawings"] = drawings
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ChartCache:
+    """Bounded LRU cache of rendered chart images keyed by content hash"""
+
+    def __init__(self, max_entries=32, max_bytes=64 * 1024 * 1024):
+        """Initialize an empty cache bounded by entry count and total bytes"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_held = 0
+
+    def get(self, key):
+        """Return the cached entry for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        """Store value under key and evict least recently used entries"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes_held -= old[1]
+            self._entries[key] = (value, nbytes)
+            self.bytes_held += nbytes
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self.bytes_held > self.max_bytes):
+                if len(self._entries) == 1:
+                    break
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.bytes_held -= evicted_bytes
+                self.evictions += 1
+
+    def get_or_render(self, header, legend_data, dpi, render):
+        """Return the cached value for the inputs, calling render() on a miss
+
+        render must return a (value, nbytes) tuple.
+        """
+        key = chart_cache_key(header, legend_data, dpi)
+        value = self.get(key)
+        if value is None:
+            value, nbytes = render()
+            self.put(key, value, nbytes)
+        return value
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes_held = 0
+
+    def stats(self):
+        """Return cache counters as a dict"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes_held": self.bytes_held,
+            }
@@ -0,0 +1,164 @@
+import queue
+import threading
+import time
+import uuid
+
+from chart_cache import chart_cache_key
+from chart_rendering import render_chart_png
+from chart_template import TemplateChartRenderer
+
+JOB_QUEUED = "queued"
+JOB_RENDERING = "rendering"
+JOB_WRITING = "writing"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class ExportJob:
+    """A single chart export request and its progress"""
+
+    def __init__(self, patient_id, header, legend_data, dpi, content_key,
+                 left_drawings=None, right_drawings=None):
+        """Initialize a queued job"""
+        self.job_id = uuid.uuid4().hex
+        self.patient_id = patient_id
+        self.header = dict(header)
+        self.legend_data = [dict(item) for item in legend_data or []]
+        self.left_drawings = list(left_drawings or [])
+        self.right_drawings = list(right_drawings or [])
+        self.dpi = dpi
+        self.content_key = content_key
+        self.status = JOB_QUEUED
+        self.progress = 0.0
+        self.filename = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        """True once the job has completed or failed"""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    def _finish(self, status, filename=None, error=None):
+        self.status = status
+        self.filename = filename
+        self.error = error
+        self.progress = 1.0
+        self.finished_at = time.time()
+        self._done.set()
+
+
+class ChartExportQueue:
+    """Bounded background queue that renders and writes chart images off the script thread"""
+
+    def __init__(self, data_manager, max_pending=8, workers=1, renderer=None, max_history=256,
+                 previews=None):
+        """Start worker threads writing through data_manager
+
+        previews is an optional chart_previews.PreviewWorker that is handed
+        each written image to build its thumbnails.
+        """
+        self.data_manager = data_manager
+        self.previews = previews
+        self.max_history = max_history
+        self.renderer = renderer or TemplateChartRenderer()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_content = {}
+        self.deduplicated = 0
+        self._workers = []
+        for index in range(workers):
+            worker = threading.Thread(target=self._run, name=f"chart-export-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, patient_id, header, legend_data, dpi=300, block=False, timeout=None,
+               left_drawings=None, right_drawings=None):
+        """Queue a chart export and return its ExportJob
+
+        An identical chart for the same patient that is still queued, rendering
+        or writing is returned instead of queueing a duplicate; once a job has
+        finished, the same chart is exported again as a new file. When the
+        queue is full, queue.Full is raised (after timeout if block is True).
+        """
+        drawings = (left_drawings or [], right_drawings or [])
+        content_key = f"{patient_id}:{chart_cache_key(header, legend_data, dpi, drawings)}"
+        with self._lock:
+            existing = self._by_content.get(content_key)
+            if existing is not None and not existing.finished:
+                self.deduplicated += 1
+                return existing
+            job = ExportJob(patient_id, header, legend_data, dpi, content_key,
+                            left_drawings, right_drawings)
+            self._jobs[job.job_id] = job
+            self._by_content[content_key] = job
+        try:
+            self._queue.put(job, block=block, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+                if self._by_content.get(content_key) is job:
+                    del self._by_content[content_key]
+            raise
+        with self._lock:
+            self._prune()
+        return job
+
+    def get_job(self, job_id):
+        """Return the job with job_id, or None if unknown"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        """Number of jobs waiting for a worker"""
+        return self._queue.qsize()
+
+    def forget(self, job_id):
+        """Drop a finished job from the registry"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return False
+            del self._jobs[job_id]
+            if self._by_content.get(job.content_key) is job:
+                del self._by_content[job.content_key]
+            return True
+
+    def _prune(self):
+        excess = len(self._jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:excess]:
+            job = self._jobs.pop(job_id)
+            if self._by_content.get(job.content_key) is job:
+                del self._by_content[job.content_key]
+
+    def join(self):
+        """Block until every queued job has been processed"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.status = JOB_RENDERING
+                job.progress = 0.1
+                image_bytes = render_chart_png(job.header, job.legend_data, job.dpi, self.renderer,
+                                               job.left_drawings, job.right_drawings)
+                job.status = JOB_WRITING
+                job.progress = 0.8
+                filename = self.data_manager.save_chart_image(job.patient_id, image_bytes)
+                if self.previews is not None:
+                    self.previews.submit(filename)
+                job._finish(JOB_DONE, filename=filename)
+            except Exception as exc:
+                job._finish(JOB_FAILED, error=str(exc))
+            finally:
+                self._queue.task_done()
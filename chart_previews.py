@@ -0,0 +1,307 @@
+"""Thumbnails and web previews of saved chart images.
+
+save_chart_image stores full-resolution PNGs, several megabytes each at
+300 dpi. Browsing a patient's chart history only needs small images, so
+every chart gets a pyramid of derivatives (PREVIEW_SIZES, longest edge in
+pixels). They are encoded as WebP, or as JPEG where Pillow lacks WebP. The
+source is decoded once, and each level is downscaled from the level above
+it.
+
+Derivatives are content addressed: previews/objects/<hh>/<hash>_<size>.<ext>,
+where hash is the SHA-256 of the source file. Identical charts share them,
+and a replaced source never serves an old preview. previews/index.db maps
+each source's path, size and mtime to its hash, so serving a preview hashes
+nothing. The previews tree sits outside the patient tree, so backups skip
+it; it can always be rebuilt.
+
+PreviewWorker builds pyramids on a background thread as charts are saved,
+and preview_path builds a missing one on first request. cached_path only
+looks up what is built, for callers such as the app's gallery that queue
+missing ones on the worker instead of waiting. The command line
+backfills existing images across a process pool:
+
+    python chart_previews.py --workers 4
+    python chart_previews.py P001 P002 --base-directory patient_data
+"""
+import argparse
+import hashlib
+import io
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, features
+
+from atomic_io import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels of each derivative
+PREVIEW_SIZES = {"thumb": 160, "small": 480, "preview": 1200}
+PREVIEW_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+PREVIEW_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+PREVIEW_QUALITY = 80
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+STATUS_BUILT = "built"
+STATUS_CACHED = "cached"
+STATUS_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 of a file, read in 1 MiB chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _downscale(image, edge):
+    scale = edge / max(image.size)
+    if scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+class PreviewStore:
+    """Content-addressed store of preview pyramids for the chart images under base_directory"""
+
+    def __init__(self, base_directory, sizes=None, image_format=PREVIEW_FORMAT, quality=PREVIEW_QUALITY):
+        """Open (or create) the previews tree and its source index"""
+        if image_format not in PREVIEW_EXTENSIONS:
+            raise ValueError(f"Unknown preview format: {image_format}")
+        self.base_directory = base_directory
+        self.sizes = dict(sizes or PREVIEW_SIZES)
+        self.image_format = image_format
+        self.quality = quality
+        self.root = os.path.join(base_directory, "previews")
+        self.objects_dir = os.path.join(self.root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.index_path = os.path.join(self.root, "index.db")
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def source_hash(self, path):
+        """Return the SHA-256 of a source image, hashing it only if it changed since last seen"""
+        stat = os.stat(path)
+        key = os.path.relpath(path, self.base_directory)
+        conn = self._connect()
+        row = conn.execute("SELECT size, mtime_ns, sha256 FROM sources WHERE path = ?", (key,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        digest = file_sha256(path)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO sources (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                         (key, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    def derivative_path(self, digest, name):
+        """Return where the derivative name of the source with digest is stored"""
+        extension = PREVIEW_EXTENSIONS[self.image_format]
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}_{name}.{extension}")
+
+    def cached_path(self, path, name="thumb"):
+        """Return the file of a derivative that is already built, or None; never hashes or builds"""
+        stat = os.stat(path)
+        row = self._connect().execute("SELECT size, mtime_ns, sha256 FROM sources WHERE path = ?",
+                                      (os.path.relpath(path, self.base_directory),)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        target = self.derivative_path(row[2], name)
+        return target if os.path.exists(target) else None
+
+    def missing(self, path):
+        """Return the names of a source image's derivatives that are not built yet"""
+        digest = self.source_hash(path)
+        return [name for name in self.sizes if not os.path.exists(self.derivative_path(digest, name))]
+
+    def _encode(self, image):
+        buf = io.BytesIO()
+        if self.image_format == "WEBP":
+            image.save(buf, format="WEBP", quality=self.quality, method=4)
+        else:
+            image.save(buf, format="JPEG", quality=self.quality, optimize=True, progressive=True)
+        return buf.getvalue()
+
+    def build(self, path):
+        """Build any missing derivatives of a source image and return {name: derivative path}"""
+        digest = self.source_hash(path)
+        paths = {name: self.derivative_path(digest, name) for name in self.sizes}
+        missing = {name for name, target in paths.items() if not os.path.exists(target)}
+        if not missing:
+            return paths
+        os.makedirs(os.path.dirname(paths[next(iter(missing))]), exist_ok=True)
+        with Image.open(path) as source:
+            image = source.convert("RGB")
+        # Largest first, each level downscaled from the previous one
+        for name, edge in sorted(self.sizes.items(), key=lambda item: -item[1]):
+            image = _downscale(image, edge)
+            if name in missing:
+                # Derivatives can be rebuilt, so a rename without fsync is enough
+                atomic_write(paths[name], self._encode(image), sync=False)
+        return paths
+
+    def preview_path(self, path, name="thumb"):
+        """Return the file of a source image's derivative, building the pyramid on first request"""
+        if name not in self.sizes:
+            raise ValueError(f"Unknown preview size: {name}")
+        target = self.derivative_path(self.source_hash(path), name)
+        if not os.path.exists(target):
+            target = self.build(path)[name]
+        return target
+
+
+class PreviewWorker:
+    """Background thread building preview pyramids for newly saved chart images"""
+
+    def __init__(self, store, max_pending=64):
+        """Start the worker thread building into store"""
+        self.store = store
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._queued = set()
+        self.built = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="chart-previews", daemon=True)
+        self._thread.start()
+
+    def submit(self, path):
+        """Queue a saved image unless already queued; returns False when the queue is full"""
+        with self._lock:
+            if path in self._queued:
+                return True
+            try:
+                self._queue.put_nowait(path)
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._queued.add(path)
+        return True
+
+    def join(self):
+        """Block until every queued image has been processed"""
+        self._queue.join()
+
+    def stats(self):
+        """Return the worker counters as a dict"""
+        with self._lock:
+            return {"built": self.built, "failed": self.failed, "dropped": self.dropped,
+                    "pending": self._queue.qsize()}
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            try:
+                self.store.build(path)
+                with self._lock:
+                    self.built += 1
+            except Exception as exc:
+                # Anything (a locked index, a decompression bomb), so one image never stops the thread
+                logger.exception("Building previews of %s failed", path)
+                with self._lock:
+                    self.failed += 1
+                    self.last_error = f"{path}: {exc}"
+            finally:
+                with self._lock:
+                    self._queued.discard(path)
+                self._queue.task_done()
+
+
+def list_source_images(base_directory, patient_ids=None):
+    """Return every saved chart image of the given patients (default: all), sorted by path"""
+    patients_dir = os.path.join(base_directory, "patients")
+    if patient_ids is None:
+        patient_ids = os.listdir(patients_dir) if os.path.isdir(patients_dir) else []
+    paths = []
+    for patient_id in patient_ids:
+        images_dir = os.path.join(patients_dir, patient_id, "images")
+        if not os.path.isdir(images_dir):
+            continue
+        paths.extend(os.path.join(images_dir, name) for name in os.listdir(images_dir)
+                     if name.lower().endswith(SOURCE_EXTENSIONS))
+    return sorted(paths)
+
+
+_worker = {}
+
+
+def _init_worker(base_directory):
+    _worker["store"] = PreviewStore(base_directory)
+
+
+def backfill_image(path):
+    """Build one image's missing derivatives in a worker and return (path, status, detail)"""
+    store = _worker["store"]
+    try:
+        if not store.missing(path):
+            return path, STATUS_CACHED, ""
+        store.build(path)
+        return path, STATUS_BUILT, ""
+    except Exception as exc:
+        # Reported per image instead of failing the whole backfill
+        return path, STATUS_FAILED, f"{type(exc).__name__}: {exc}"
+
+
+def backfill(base_directory="patient_data", patient_ids=None, workers=None):
+    """Build missing previews for existing images; return (results, seconds)"""
+    PreviewStore(base_directory)  # create the tree and index once before the workers race for it
+    paths = list_source_images(base_directory, patient_ids)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(base_directory,)) as pool:
+        chunksize = max(1, min(16, len(paths) // (workers * 4) or 1))
+        results = list(pool.map(backfill_image, paths, chunksize=chunksize))
+    return results, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build thumbnails and previews of saved chart images")
+    parser.add_argument("patient_ids", nargs="*", help="patients to backfill (default: all)")
+    parser.add_argument("--base-directory", default="patient_data")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    results, seconds = backfill(args.base_directory, args.patient_ids or None, args.workers)
+    counts = {}
+    for path, status, detail in results:
+        counts[status] = counts.get(status, 0) + 1
+        if status == STATUS_FAILED:
+            print(f"  {path}: {detail}", file=sys.stderr)
+    built = counts.get(STATUS_BUILT, 0)
+    print(f"{len(results)} images in {seconds:.2f} s: {built} built "
+          f"({built / seconds if seconds else 0:.1f}/s), {counts.get(STATUS_CACHED, 0)} already cached, "
+          f"{counts.get(STATUS_FAILED, 0)} failed")
+    return 1 if counts.get(STATUS_FAILED) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Pure chart rendering on the object-oriented matplotlib API.
+
+Nothing here touches pyplot or Streamlit session state: every function takes its
+inputs as arguments and builds its own Figure, so calls can run concurrently from
+a thread pool and figures are released as soon as they go out of scope.
+"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL.PngImagePlugin import PngInfo
+
+from chart_template import (AXIS_LIMIT, FIGURE_SIZE, TemplateChartRenderer, chart_title,
+                            draw_eye_overlay, draw_eye_template, draw_legend_items)
+from chart_cache import CHART_HEADER_FIELDS
+from drawing_raster import render_drawings
+from instrumentation import span, timed
+
+
+def build_chart_figure(header, legend_data):
+    """Build the complete chart as a standalone Figure with a tight layout"""
+    fig = Figure(figsize=FIGURE_SIZE)
+    FigureCanvasAgg(fig)
+    gs = fig.add_gridspec(1, 3)
+    right_ax = fig.add_subplot(gs[0, 0], aspect='equal')
+    left_ax = fig.add_subplot(gs[0, 1], aspect='equal')
+    legend_ax = fig.add_subplot(gs[0, 2])
+    legend_ax.axis('off')
+    draw_eye_chart(right_ax, "Right Eye", header.get("va_right", ""), header.get("iop_right", ""),
+                   header.get("pid", ""), header.get("name", ""))
+    draw_eye_chart(left_ax, "Left Eye", header.get("va_left", ""), header.get("iop_left", ""),
+                   header.get("pid", ""), header.get("name", ""))
+    fig.suptitle(chart_title(header), fontsize=9)
+    legend_ax.set_xlim(0, 1)
+    legend_ax.set_ylim(0, 1)
+    draw_legend_items(legend_ax, legend_data)
+    fig.tight_layout()
+    return fig
+
+
+def draw_eye_chart(ax, title, va, iop, pid, name):
+    """Draw one eye's geometry and patient text onto ax"""
+    ax.clear()
+    draw_eye_template(ax)
+    draw_eye_overlay(ax, title, va, iop, pid, name)
+    ax.set_xlim(-AXIS_LIMIT, AXIS_LIMIT)
+    ax.set_ylim(-AXIS_LIMIT, AXIS_LIMIT)
+    ax.axis('off')
+
+
+def patient_chart_header(patient_id, patient_data):
+    """Build the chart header from a record returned by DataManager.load_patient"""
+    header = {field: patient_data.get(field, "") for field in CHART_HEADER_FIELDS}
+    header["pid"] = patient_id
+    return header
+
+
+@timed("chart.render")
+def render_chart(header, legend_data, dpi=100, renderer=None, left_drawings=None, right_drawings=None):
+    """Render the chart as an RGB PIL image
+
+    renderer is a TemplateChartRenderer whose templates are reused across calls;
+    a private one is created when omitted. Stored drawings, when given, are
+    rasterized on top by drawing_raster.
+    """
+    renderer = renderer or TemplateChartRenderer()
+    image = renderer.render(header, legend_data, dpi)
+    if left_drawings or right_drawings:
+        image = render_drawings(image, left_drawings, right_drawings)
+    return image
+
+
+def encode_png(image, dpi, metadata=None):
+    """Encode a rendered chart image as PNG bytes, with optional text metadata"""
+    buf = io.BytesIO()
+    pnginfo = None
+    if metadata:
+        pnginfo = PngInfo()
+        for key, value in metadata.items():
+            pnginfo.add_text(key, value)
+    with span("chart.png_encode"):
+        image.save(buf, format="PNG", dpi=(dpi, dpi), pnginfo=pnginfo)
+    return buf.getvalue()
+
+
+def render_chart_png(header, legend_data, dpi=300, renderer=None, left_drawings=None, right_drawings=None):
+    """Render the chart and return PNG bytes"""
+    image = render_chart(header, legend_data, dpi, renderer, left_drawings, right_drawings)
+    return encode_png(image, dpi)
+
+
+def render_charts_parallel(jobs, dpi=300, max_workers=None, renderer=None):
+    """Render (header, legend_data) jobs on a thread pool and return PNG bytes in order"""
+    renderer = renderer or TemplateChartRenderer()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(render_chart_png, header, legend_data, dpi, renderer)
+                   for header, legend_data in jobs]
+        return [future.result() for future in futures]
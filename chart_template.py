@@ -0,0 +1,125 @@
+import threading
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.patches import Circle, Rectangle
+from PIL import Image
+
+from instrumentation import span
+
+# Fixed layout shared by the template and overlay layers so they line up pixel for pixel
+FIGURE_SIZE = (10, 5)
+RIGHT_EYE_RECT = (0.01, 0.08, 0.34, 0.68)
+LEFT_EYE_RECT = (0.35, 0.08, 0.34, 0.68)
+LEGEND_RECT = (0.70, 0.08, 0.28, 0.68)
+AXIS_LIMIT = 1.5
+CHART_DATE = "2025-03-03"  # Fixed date as per image
+
+
+def _eye_axes(fig, rect):
+    ax = fig.add_axes(rect)
+    ax.set_xlim(-AXIS_LIMIT, AXIS_LIMIT)
+    ax.set_ylim(-AXIS_LIMIT, AXIS_LIMIT)
+    ax.axis('off')
+    return ax
+
+
+def _legend_axes(fig):
+    ax = fig.add_axes(LEGEND_RECT)
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    ax.axis('off')
+    return ax
+
+
+def draw_eye_template(ax):
+    """Draw the patient-independent geometry: circles, radial lines and hour labels"""
+    for radius in (1.0, 0.8, 0.6):
+        ax.add_patch(Circle((0, 0), radius, fill=False, color='black'))
+    for hour in range(1, 13):
+        angle = np.radians(90 - hour * 30)  # Start from top (12 o'clock)
+        ax.text(1.1 * np.cos(angle), 1.1 * np.sin(angle), f"{hour}",
+                ha='center', va='center', fontsize=8)
+        x1, y1 = 0.4 * np.cos(angle), 0.4 * np.sin(angle)
+        x2, y2 = 1.0 * np.cos(angle), 1.0 * np.sin(angle)
+        ax.plot([x1, x2], [y1, y2], 'k-', linewidth=0.5)
+
+
+def draw_eye_overlay(ax, title, va, iop, pid, name):
+    """Draw the patient-specific text for one eye"""
+    eye_abbr = "O.D." if title == "Right Eye" else "O.S."
+    ax.set_title(f"{eye_abbr}\nVA: {va} | IOP: {iop} mmHg", fontsize=8, pad=10)
+    ax.text(0, -1.3, f"Date: {CHART_DATE}", fontsize=6, ha='center')
+    ax.text(0, -1.45, f"Number: {pid or ''}", fontsize=6, ha='center')
+    ax.text(0, -1.6, f"Name: {name or ''}", fontsize=6, ha='center')
+
+
+def draw_legend_items(ax, legend_data):
+    """Draw legend swatches and labels"""
+    y_pos = 0.9
+    for item in legend_data or []:
+        if item["fill_type"] == "none":
+            ax.plot([0.1, 0.3], [y_pos, y_pos], color=item["color"], linewidth=item["line_width"])
+        else:
+            ax.add_patch(Rectangle((0.1, y_pos - 0.03), 0.2, 0.06, color=item["color"],
+                                   alpha=item["alpha"], linewidth=item["line_width"]))
+        ax.text(0.35, y_pos, item["label"], va='center', fontsize=9)
+        y_pos -= 0.1
+
+
+def chart_title(header):
+    """Return the suptitle line for a chart header"""
+    diagnosis = header.get("diagnosis", "")
+    diag_text = diagnosis if diagnosis != "Other" else f"Other: {header.get('diagnosis_other', '')}"
+    return (f"Patient: {header.get('name', '')} | ID: {header.get('pid', '')} | "
+            f"Age: {header.get('age', '')} | Diagnosis: {diag_text}")
+
+
+def rasterize_figure(fig, dpi):
+    """Draw fig at dpi and return it as an RGBA PIL image"""
+    with span("chart.rasterize"):
+        fig.set_dpi(dpi)
+        canvas = FigureCanvasAgg(fig)
+        canvas.draw()
+        rgba = np.asarray(canvas.buffer_rgba())
+        return Image.fromarray(rgba.copy(), "RGBA")
+
+
+class TemplateChartRenderer:
+    """Render charts as a cached static template plus a per-patient overlay"""
+
+    def __init__(self):
+        """Initialize with an empty per-DPI template cache"""
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def template(self, dpi):
+        """Return the static geometry layer for dpi, rasterizing it on first use"""
+        with self._lock:
+            image = self._templates.get(dpi)
+            if image is None:
+                fig = Figure(figsize=FIGURE_SIZE, facecolor='white')
+                draw_eye_template(_eye_axes(fig, RIGHT_EYE_RECT))
+                draw_eye_template(_eye_axes(fig, LEFT_EYE_RECT))
+                image = rasterize_figure(fig, dpi)
+                self._templates[dpi] = image
+            return image
+
+    def overlay(self, header, legend_data, dpi):
+        """Rasterize the patient-specific text and legend on a transparent layer"""
+        fig = Figure(figsize=FIGURE_SIZE, facecolor=(0, 0, 0, 0))
+        draw_eye_overlay(_eye_axes(fig, RIGHT_EYE_RECT), "Right Eye",
+                         header.get("va_right", ""), header.get("iop_right", ""),
+                         header.get("pid", ""), header.get("name", ""))
+        draw_eye_overlay(_eye_axes(fig, LEFT_EYE_RECT), "Left Eye",
+                         header.get("va_left", ""), header.get("iop_left", ""),
+                         header.get("pid", ""), header.get("name", ""))
+        draw_legend_items(_legend_axes(fig), legend_data)
+        fig.suptitle(chart_title(header), fontsize=9)
+        return rasterize_figure(fig, dpi)
+
+    def render(self, header, legend_data, dpi=100):
+        """Return the composited chart as an RGB PIL image"""
+        composed = Image.alpha_composite(self.template(dpi), self.overlay(header, legend_data, dpi))
+        return composed.convert("RGB")
@@ -0,0 +1,538 @@
+"""Cohort analytics over every stored patient, from a columnar cache.
+
+refresh() compiles the patient tree into NumPy columns saved in
+analytics/cohort.npz. The file has three tables:
+- records: one row per saved medical record version, with timestamp,
+  diagnosis, IOP and visual acuity as logMAR.
+- lesions: one row per drawing in each patient's latest record, placed on
+  the clock-hour/ring grid of the eye chart.
+- patients: one row per patient with their latest diagnosis.
+Strings are stored as integer codes into per-column dictionaries.
+
+Each patient is fingerprinted by the modification times of their folder
+and of the record, drawing and history folders, which change with every
+save. A refresh re-reads only new and changed patients. Other patients keep
+their rows, and deleted patients lose theirs. Queries are vectorized NumPy
+masks, bincounts and sorts over the whole cohort.
+
+Canvas drawings are located through the fixed chart layout. A canvas point
+is a fraction of the chart image, and it falls in the right eye panel, the
+left eye panel, or neither. Inside a panel it is placed on the chart's
+grid. Hours are 30 degree sectors centred on the hour labels (12 at the
+top, 3 towards the right of the panel). Rings are inside the 0.6 circle,
+0.6 to 0.8, 0.8 to 1.0, and outside the chart.
+
+    python cohort_analytics.py refresh --workers 4
+    python cohort_analytics.py iop
+    python cohort_analytics.py va-trend --diagnosis Glaucoma
+    python cohort_analytics.py clock-hours --eye left --label Haemorrhage
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from atomic_io import atomic_write
+from chart_template import AXIS_LIMIT, LEFT_EYE_RECT, RIGHT_EYE_RECT
+from data_manager import DataManager
+from drawing_raster import CANVAS_SIZE
+from version_store import PatientVersionStore
+
+CACHE_FORMAT_VERSION = 1
+CACHE_FILENAME = "cohort.npz"
+
+EYE_RIGHT = 0
+EYE_LEFT = 1
+EYE_OUTSIDE = -1
+EYE_NAMES = {EYE_RIGHT: "right", EYE_LEFT: "left"}
+
+# Ring bounds in chart units, matching the circles drawn by draw_eye_template
+RING_EDGES = (0.6, 0.8, 1.0)
+RING_NAMES = ("< 0.6", "0.6-0.8", "0.8-1.0", "outside")
+
+# Folders whose modification times change whenever a patient is saved
+FINGERPRINT_PATHS = ("", "medical_records", "fundus_charts", "history")
+
+RECORD_COLUMNS = ("patient", "timestamp", "diagnosis", "iop_left", "iop_right", "va_left", "va_right")
+LESION_COLUMNS = ("patient", "source_eye", "kind", "label", "x", "y", "eye", "hour", "ring")
+DICTIONARIES = ("diagnosis", "kind", "label")
+
+
+def parse_iop(value):
+    """Return an IOP reading in mmHg as a float, or NaN"""
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return float("nan")
+
+
+def parse_va(value):
+    """Return a visual acuity as logMAR from Snellen ("6/9", "20/40") or decimal ("0.5"), or NaN"""
+    text = str(value or "").strip()
+    try:
+        if "/" in text:
+            numerator, denominator = text.split("/", 1)
+            decimal = float(numerator) / float(denominator)
+        else:
+            decimal = float(text)
+    except (ValueError, ZeroDivisionError):
+        return float("nan")
+    return float(-np.log10(decimal)) if decimal > 0 else float("nan")
+
+
+def parse_timestamp(value):
+    """Return a record timestamp as numpy datetime64 seconds, or NaT"""
+    try:
+        return np.datetime64(str(value).strip().replace(" ", "T"), "s")
+    except ValueError:
+        return np.datetime64("NaT", "s")
+
+
+def drawing_anchor(drawing):
+    """Return the canvas point a drawing is counted at (its centre), or None"""
+    kind = drawing.get("type")
+    if kind == "freehand":
+        ends = [segment[-2:] for segment in drawing.get("points") or () if len(segment) >= 3]
+        if not ends:
+            return None
+        x, y = np.asarray(ends, dtype=float).mean(axis=0)
+        return float(x), float(y)
+    coords = drawing.get("coords")
+    if coords is None:
+        return None
+    try:
+        if kind == "line":
+            (x1, y1), (x2, y2) = coords
+            return (x1 + x2) / 2, (y1 + y2) / 2
+        if kind == "rect":
+            (left, top), width, height = coords
+            return left + width / 2, top + height / 2
+        if kind == "circle":
+            (x, y), _ = coords
+            return x, y
+        if kind == "point":
+            x, y = coords
+            return x, y
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def clock_grid(canvas_x, canvas_y, canvas_size=CANVAS_SIZE):
+    """Place canvas points on the eye charts; return (eye, hour, ring, chart x, chart y) arrays
+
+    eye is EYE_RIGHT, EYE_LEFT or EYE_OUTSIDE, hour 1-12 (0 outside both
+    panels) and ring an index into RING_NAMES.
+    """
+    fx = np.asarray(canvas_x, dtype=float) / canvas_size[0]
+    fy = 1.0 - np.asarray(canvas_y, dtype=float) / canvas_size[1]  # canvas y grows downwards
+    eye = np.full(fx.shape, EYE_OUTSIDE, dtype=np.int8)
+    x = np.full(fx.shape, np.nan)
+    y = np.full(fx.shape, np.nan)
+    for code, (left, bottom, width, height) in ((EYE_RIGHT, RIGHT_EYE_RECT), (EYE_LEFT, LEFT_EYE_RECT)):
+        inside = (fx >= left) & (fx < left + width) & (fy >= bottom) & (fy < bottom + height)
+        eye[inside] = code
+        x[inside] = (fx[inside] - left) / width * 2 * AXIS_LIMIT - AXIS_LIMIT
+        y[inside] = (fy[inside] - bottom) / height * 2 * AXIS_LIMIT - AXIS_LIMIT
+    placed = eye != EYE_OUTSIDE
+    # Hour labels sit at 90 - 30 * hour degrees
+    angle = np.degrees(np.arctan2(y, x))
+    hour = np.zeros(fx.shape, dtype=np.int8)
+    hour[placed] = (np.rint((90 - angle[placed]) / 30).astype(int) - 1) % 12 + 1
+    ring = np.full(fx.shape, len(RING_NAMES) - 1, dtype=np.int8)
+    ring[placed] = np.digitize(np.hypot(x[placed], y[placed]), RING_EDGES)
+    return eye, hour, ring, x.astype(np.float32), y.astype(np.float32)
+
+
+def patient_fingerprint(patient_dir):
+    """Return the modification times (ns) that change whenever the patient is saved"""
+    stamps = []
+    for name in FINGERPRINT_PATHS:
+        try:
+            stamps.append(os.stat(os.path.join(patient_dir, name)).st_mtime_ns)
+        except OSError:
+            stamps.append(0)
+    return stamps
+
+
+def _medical_history(patient_dir):
+    """Yield every stored medical record version of a patient"""
+    records_dir = os.path.join(patient_dir, "medical_records")
+    names = os.listdir(records_dir) if os.path.isdir(records_dir) else []
+    for name in sorted(names):
+        if name.startswith("record_") and name.endswith(".json"):
+            try:
+                with open(os.path.join(records_dir, name), 'r') as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+    store = PatientVersionStore(patient_dir)
+    history = store.list_history()
+    for entry in history:
+        try:
+            yield store.load_version(entry["version"], history)["medical_record"]
+        except (OSError, ValueError, KeyError):
+            continue
+
+
+def ingest_patient(manager, patient_id):
+    """Read one patient's record history and latest drawings as plain rows"""
+    patient_dir = os.path.join(manager.base_directory, "patients", patient_id)
+    records = [(str(record.get("timestamp", "") or ""), str(record.get("diagnosis", "") or ""),
+                parse_iop(record.get("iop_left")), parse_iop(record.get("iop_right")),
+                parse_va(record.get("va_left")), parse_va(record.get("va_right")))
+               for record in _medical_history(patient_dir)]
+    latest = manager.load_patient(patient_id, audit=False) or {}
+    labels = {}
+    for item in latest.get("legend_data") or ():
+        labels.setdefault(str(item.get("color", "")).lower(), str(item.get("label", "")))
+    lesions = []
+    for source_eye, key in ((EYE_RIGHT, "right_drawings"), (EYE_LEFT, "left_drawings")):
+        for drawing in latest.get(key) or ():
+            anchor = drawing_anchor(drawing)
+            if anchor is not None:
+                lesions.append((source_eye, str(drawing.get("type", "")),
+                                labels.get(str(drawing.get("color", "")).lower(), ""), anchor[0], anchor[1]))
+    return {"diagnosis": str(latest.get("diagnosis", "") or ""), "records": records, "lesions": lesions}
+
+
+_worker = {}
+
+
+def _init_worker(base_directory):
+    _worker["manager"] = DataManager(base_directory)
+
+
+def _ingest_in_worker(item):
+    patient_id, fingerprint = item
+    return patient_id, fingerprint, ingest_patient(_worker["manager"], patient_id)
+
+
+class Dictionary:
+    """Stable string to integer codes for one categorical column"""
+
+    def __init__(self, values=()):
+        """Start from the values of a saved dictionary, in code order"""
+        self.values = list(values)
+        self._codes = {value: code for code, value in enumerate(self.values)}
+
+    def code(self, value):
+        """Return value's code, adding it if new"""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def codes(self, names):
+        """Return the codes of the known values among names"""
+        return [self._codes[name] for name in names if name in self._codes]
+
+
+def _empty_columns():
+    return {
+        "records": {"patient": np.zeros(0, np.int32), "timestamp": np.zeros(0, "datetime64[s]"),
+                    "diagnosis": np.zeros(0, np.int32), "iop_left": np.zeros(0, np.float32),
+                    "iop_right": np.zeros(0, np.float32), "va_left": np.zeros(0, np.float32),
+                    "va_right": np.zeros(0, np.float32)},
+        "lesions": {"patient": np.zeros(0, np.int32), "source_eye": np.zeros(0, np.int8),
+                    "kind": np.zeros(0, np.int32), "label": np.zeros(0, np.int32),
+                    "x": np.zeros(0, np.float32), "y": np.zeros(0, np.float32),
+                    "eye": np.zeros(0, np.int8), "hour": np.zeros(0, np.int8),
+                    "ring": np.zeros(0, np.int8)},
+    }
+
+
+def _quantiles(starts, counts, values, q):
+    # Linear interpolation inside each sorted group, for all groups at once
+    position = starts + q * (counts - 1)
+    low = np.floor(position).astype(int)
+    high = np.ceil(position).astype(int)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def group_summary(codes, values):
+    """Per group code: (codes, count, mean, p25, median, p75) of the finite values"""
+    values = np.asarray(values, dtype=float)
+    keep = np.isfinite(values)
+    codes, values = np.asarray(codes)[keep], values[keep]
+    if not len(values):
+        empty = np.zeros(0)
+        return np.zeros(0, int), empty.astype(int), empty, empty, empty, empty
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+    groups, starts, counts = np.unique(codes, return_index=True, return_counts=True)
+    means = np.add.reduceat(values, starts) / counts
+    return (groups, counts, means, _quantiles(starts, counts, values, 0.25),
+            _quantiles(starts, counts, values, 0.5), _quantiles(starts, counts, values, 0.75))
+
+
+class CohortCache:
+    """Columnar cache of every patient's records and lesions, refreshed incrementally"""
+
+    def __init__(self, base_directory="patient_data"):
+        """Use the cache under base_directory/analytics, loading it if present"""
+        self.base_directory = base_directory
+        self.cache_dir = os.path.join(base_directory, "analytics")
+        self.path = os.path.join(self.cache_dir, CACHE_FILENAME)
+        self.load()
+
+    def load(self):
+        """Load the cache file, or start empty if it is missing or from another format"""
+        self.patient_ids = np.zeros(0, dtype=str)
+        self.fingerprints = np.zeros((0, len(FINGERPRINT_PATHS)), dtype=np.int64)
+        self.patient_diagnosis = np.zeros(0, dtype=np.int32)
+        self.dictionaries = {name: Dictionary() for name in DICTIONARIES}
+        columns = _empty_columns()
+        self.records, self.lesions = columns["records"], columns["lesions"]
+        try:
+            with np.load(self.path, allow_pickle=False) as saved:
+                if int(saved["format_version"]) != CACHE_FORMAT_VERSION:
+                    return False
+                self.patient_ids = saved["patients.id"]
+                self.fingerprints = saved["patients.fingerprint"]
+                self.patient_diagnosis = saved["patients.diagnosis"]
+                self.dictionaries = {name: Dictionary(saved[f"dict.{name}"].tolist())
+                                     for name in DICTIONARIES}
+                self.records = {name: saved[f"records.{name}"] for name in RECORD_COLUMNS}
+                self.lesions = {name: saved[f"lesions.{name}"] for name in LESION_COLUMNS}
+        except (OSError, ValueError, KeyError):
+            return False
+        return True
+
+    def save(self):
+        """Write the cache atomically"""
+        arrays = {"format_version": np.array(CACHE_FORMAT_VERSION),
+                  "patients.id": self.patient_ids, "patients.fingerprint": self.fingerprints,
+                  "patients.diagnosis": self.patient_diagnosis}
+        for name in DICTIONARIES:
+            arrays[f"dict.{name}"] = np.array(self.dictionaries[name].values, dtype=str)
+        arrays.update({f"records.{name}": column for name, column in self.records.items()})
+        arrays.update({f"lesions.{name}": column for name, column in self.lesions.items()})
+        buf = io.BytesIO()
+        np.savez(buf, **arrays)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        atomic_write(self.path, buf.getvalue())
+
+    def scan(self):
+        """Return (patient IDs, fingerprints) of the patient tree as it is now"""
+        patients_dir = os.path.join(self.base_directory, "patients")
+        ids = []
+        if os.path.isdir(patients_dir):
+            with os.scandir(patients_dir) as entries:
+                ids = sorted(entry.name for entry in entries if entry.is_dir())
+        fingerprints = np.array([patient_fingerprint(os.path.join(patients_dir, patient_id))
+                                 for patient_id in ids], dtype=np.int64).reshape(-1, len(FINGERPRINT_PATHS))
+        return np.array(ids, dtype=str), fingerprints
+
+    def refresh(self, workers=None, manager=None):
+        """Re-read new and changed patients, drop deleted ones and save; return counts"""
+        start = time.perf_counter()
+        ids, fingerprints = self.scan()
+        # Old patient index -> new index, or -1 for patients that are gone or must be re-read
+        position = np.minimum(np.searchsorted(ids, self.patient_ids), max(len(ids) - 1, 0))
+        present = np.zeros(len(self.patient_ids), dtype=bool)
+        if len(ids):
+            present = ids[position] == self.patient_ids
+        kept = present.copy()
+        kept[present] = np.all(fingerprints[position[present]] == self.fingerprints[present], axis=1)
+        remap = np.where(kept, position, -1).astype(np.int32)
+        fresh = np.ones(len(ids), dtype=bool)
+        fresh[position[kept]] = False
+        stale = [(str(ids[index]), fingerprints[index].tolist()) for index in np.flatnonzero(fresh)]
+
+        diagnosis = np.zeros(len(ids), dtype=np.int32)
+        diagnosis[remap[kept]] = self.patient_diagnosis[kept]
+        parts = {}
+        for table, columns in (("records", self.records), ("lesions", self.lesions)):
+            patients = remap[columns["patient"]]
+            rows = patients >= 0
+            kept_rows = {name: column[rows] for name, column in columns.items()}
+            kept_rows["patient"] = patients[rows]
+            parts[table] = [kept_rows]
+
+        index_of = {patient_id: index for index, patient_id in enumerate(ids.tolist())}
+        new_records, new_lesions = self._rows(self._ingest(stale, workers, manager), index_of, diagnosis)
+        parts["records"].append(new_records)
+        parts["lesions"].append(new_lesions)
+
+        self.patient_ids, self.fingerprints, self.patient_diagnosis = ids, fingerprints, diagnosis
+        self.records = {name: np.concatenate([part[name] for part in parts["records"]])
+                        for name in RECORD_COLUMNS}
+        self.lesions = {name: np.concatenate([part[name] for part in parts["lesions"]])
+                        for name in LESION_COLUMNS}
+        self.save()
+        return {"patients": len(ids), "ingested": len(stale), "unchanged": int(kept.sum()),
+                "removed": int(len(present) - present.sum()), "records": len(self.records["patient"]),
+                "lesions": len(self.lesions["patient"]), "seconds": time.perf_counter() - start}
+
+    def _ingest(self, stale, workers, manager):
+        if not stale:
+            return []
+        workers = workers or 1
+        if workers <= 1:
+            manager = manager or DataManager(self.base_directory)
+            return [(patient_id, fingerprint, ingest_patient(manager, patient_id))
+                    for patient_id, fingerprint in stale]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.base_directory,)) as pool:
+            chunksize = max(1, min(64, len(stale) // (workers * 4) or 1))
+            return list(pool.map(_ingest_in_worker, stale, chunksize=chunksize))
+
+    def _rows(self, results, index_of, diagnosis):
+        """Turn ingested patients into record and lesion columns"""
+        diagnoses, kinds, labels = (self.dictionaries[name] for name in DICTIONARIES)
+        record_rows, lesion_rows = [], []
+        for patient_id, _, data in results:
+            patient = index_of[patient_id]
+            diagnosis[patient] = diagnoses.code(data["diagnosis"])
+            for timestamp, record_diagnosis, iop_left, iop_right, va_left, va_right in data["records"]:
+                record_rows.append((patient, parse_timestamp(timestamp),
+                                    diagnoses.code(record_diagnosis), iop_left, iop_right, va_left, va_right))
+            for source_eye, kind, label, x, y in data["lesions"]:
+                lesion_rows.append((patient, source_eye, kinds.code(kind), labels.code(label), x, y))
+        records = _empty_columns()["records"]
+        if record_rows:
+            patient, timestamp, codes, iop_left, iop_right, va_left, va_right = zip(*record_rows)
+            records = {"patient": np.array(patient, np.int32),
+                       "timestamp": np.array(timestamp, "datetime64[s]"),
+                       "diagnosis": np.array(codes, np.int32),
+                       "iop_left": np.array(iop_left, np.float32), "iop_right": np.array(iop_right, np.float32),
+                       "va_left": np.array(va_left, np.float32), "va_right": np.array(va_right, np.float32)}
+        lesions = _empty_columns()["lesions"]
+        if lesion_rows:
+            patient, source_eye, kind, label, x, y = zip(*lesion_rows)
+            eye, hour, ring, chart_x, chart_y = clock_grid(x, y)
+            lesions = {"patient": np.array(patient, np.int32), "source_eye": np.array(source_eye, np.int8),
+                       "kind": np.array(kind, np.int32), "label": np.array(label, np.int32),
+                       "x": chart_x, "y": chart_y, "eye": eye, "hour": hour, "ring": ring}
+        return records, lesions
+
+    def _codes(self, dictionary, names):
+        if names is None:
+            return None
+        return np.array(self.dictionaries[dictionary].codes([names] if isinstance(names, str) else names),
+                        dtype=np.int32)
+
+    def record_mask(self, diagnosis=None, since=None, until=None, latest_only=False):
+        """Boolean mask over the record rows matching diagnosis (one or several) and a time range
+
+        latest_only keeps only each patient's newest matching record.
+        """
+        records = self.records
+        mask = np.ones(len(records["patient"]), dtype=bool)
+        codes = self._codes("diagnosis", diagnosis)
+        if codes is not None:
+            mask &= np.isin(records["diagnosis"], codes)
+        if since is not None:
+            mask &= records["timestamp"] >= np.datetime64(str(since).replace(" ", "T"), "s")
+        if until is not None:
+            mask &= records["timestamp"] <= np.datetime64(str(until).replace(" ", "T"), "s")
+        if latest_only and mask.any():
+            rows = np.flatnonzero(mask)
+            order = rows[np.lexsort((records["timestamp"][rows].astype(np.int64), records["patient"][rows]))]
+            patients = records["patient"][order]
+            last = np.append(patients[1:] != patients[:-1], True)
+            mask = np.zeros_like(mask)
+            mask[order[last]] = True
+        return mask
+
+    def lesion_mask(self, eye=None, diagnosis=None, label=None, kind=None):
+        """Boolean mask over the lesion rows by eye name, patient's latest diagnosis, label and type"""
+        lesions = self.lesions
+        mask = np.ones(len(lesions["patient"]), dtype=bool)
+        if eye is not None:
+            mask &= lesions["eye"] == (EYE_LEFT if eye == "left" else EYE_RIGHT)
+        codes = self._codes("diagnosis", diagnosis)
+        if codes is not None:
+            mask &= np.isin(self.patient_diagnosis[lesions["patient"]], codes)
+        for column, names in (("label", label), ("kind", kind)):
+            codes = self._codes(column, names)
+            if codes is not None:
+                mask &= np.isin(lesions[column], codes)
+        return mask
+
+    def _eye_values(self, prefix, eye, mask):
+        if eye == "both":
+            codes = np.concatenate([self.records["diagnosis"][mask]] * 2)
+            return codes, np.concatenate([self.records[f"{prefix}_right"][mask],
+                                          self.records[f"{prefix}_left"][mask]])
+        return self.records["diagnosis"][mask], self.records[f"{prefix}_{eye}"][mask]
+
+    def iop_by_diagnosis(self, eye="both", latest_only=True, since=None, until=None):
+        """IOP distribution per diagnosis: rows of diagnosis, count, mean, p25, median and p75"""
+        mask = self.record_mask(since=since, until=until, latest_only=latest_only)
+        groups, counts, means, p25, p50, p75 = group_summary(*self._eye_values("iop", eye, mask))
+        names = self.dictionaries["diagnosis"].values
+        return [{"diagnosis": names[code], "count": int(count), "mean": float(mean), "p25": float(low),
+                 "median": float(median), "p75": float(high)}
+                for code, count, mean, low, median, high in zip(groups, counts, means, p25, p50, p75)]
+
+    def va_trend(self, period="M", eye="both", diagnosis=None):
+        """Mean logMAR acuity per period ("Y", "M" or "D") over every saved record"""
+        mask = self.record_mask(diagnosis=diagnosis) & ~np.isnat(self.records["timestamp"])
+        stamps = self.records["timestamp"][mask].astype(f"datetime64[{period}]")
+        if eye == "both":
+            stamps = np.concatenate([stamps, stamps])
+        _, values = self._eye_values("va", eye, mask)
+        periods, counts, means, _, medians, _ = group_summary(stamps.astype(np.int64), values)
+        return [{"period": str(np.datetime64(int(value), period)), "count": int(count),
+                 "mean_logmar": float(mean), "median_logmar": float(median)}
+                for value, count, mean, median in zip(periods, counts, means, medians)]
+
+    def clock_hours(self, eye=None, diagnosis=None, label=None, kind=None):
+        """Lesion counts as a (ring, hour) array: rows follow RING_NAMES, columns are hours 1-12"""
+        mask = self.lesion_mask(eye, diagnosis, label, kind) & (self.lesions["eye"] != EYE_OUTSIDE)
+        cells = self.lesions["ring"][mask].astype(int) * 12 + self.lesions["hour"][mask] - 1
+        return np.bincount(cells, minlength=len(RING_NAMES) * 12).reshape(len(RING_NAMES), 12)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cohort analytics over the stored patient records")
+    parser.add_argument("command", choices=("refresh", "iop", "va-trend", "clock-hours"))
+    parser.add_argument("--base-directory", default="patient_data")
+    parser.add_argument("--workers", type=int, default=None, help="processes for refresh")
+    parser.add_argument("--no-refresh", action="store_true", help="query the cache as it is")
+    parser.add_argument("--diagnosis", action="append", help="may be repeated")
+    parser.add_argument("--eye", choices=("left", "right", "both"), default="both")
+    parser.add_argument("--label", action="append", help="legend label of the lesions (may be repeated)")
+    parser.add_argument("--period", choices=("Y", "M", "D"), default="M")
+    parser.add_argument("--all-records", action="store_true", help="iop: every record, not each patient's latest")
+    args = parser.parse_args(argv)
+
+    cache = CohortCache(args.base_directory)
+    if args.command == "refresh" or not args.no_refresh:
+        manager = DataManager(args.base_directory)
+        stats = cache.refresh(workers=args.workers, manager=manager)
+        manager.log_change("SYSTEM", "cohort_refresh",
+                           f"Compiled cohort cache: {stats['ingested']} patients read, "
+                           f"{stats['removed']} removed")
+        manager.flush_audit_log()
+        print(f"{stats['patients']} patients ({stats['ingested']} read, {stats['unchanged']} unchanged, "
+              f"{stats['removed']} removed), {stats['records']} records, {stats['lesions']} lesions "
+              f"in {stats['seconds']:.2f} s", file=sys.stderr)
+    if args.command == "iop":
+        print(f"{'diagnosis':30} {'count':>7} {'mean':>7} {'p25':>7} {'median':>7} {'p75':>7}")
+        for row in cache.iop_by_diagnosis(args.eye, latest_only=not args.all_records):
+            print(f"{row['diagnosis'] or '-':30} {row['count']:7d} {row['mean']:7.1f} {row['p25']:7.1f} "
+                  f"{row['median']:7.1f} {row['p75']:7.1f}")
+    elif args.command == "va-trend":
+        print(f"{'period':12} {'count':>7} {'mean logMAR':>12} {'median':>8}")
+        for row in cache.va_trend(args.period, args.eye, args.diagnosis):
+            print(f"{row['period']:12} {row['count']:7d} {row['mean_logmar']:12.3f} {row['median_logmar']:8.3f}")
+    elif args.command == "clock-hours":
+        eye = None if args.eye == "both" else args.eye
+        grid = cache.clock_hours(eye, args.diagnosis, args.label)
+        print(f"{'ring':10}" + "".join(f"{hour:>6d}" for hour in range(1, 13)) + f"{'total':>8}")
+        for name, row in zip(RING_NAMES, grid):
+            print(f"{name:10}" + "".join(f"{count:6d}" for count in row) + f"{row.sum():8d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,109 @@
 # data_manager.py
 import os
+import re
 import json
 import shutil
+import functools
+import threading
 from datetime import datetime
+from patient_registry import PatientRegistry
+from canvas_diff import DRAWING_COORDS_FORMAT, upgrade_drawings
+from drawing_codec import decode_drawing_document, encode_drawing_document
+from version_store import PatientVersionStore
+from audit_log import get_audit_logger
+from audit_query import AuditIndex
+from backup_store import BackupStore
+from atomic_io import WriteTransaction, atomic_write, resolve_pointer
+from record_ids import new_record_id
+from instrumentation import count, record_bytes, timed
+from patient_locks import PatientLocks
+from record_cache import RecordCache, copy_record, file_fingerprint
+
+# Version of the consolidated per-patient snapshot written by save_complete_patient_record;
+# 2 holds drawings in DRAWING_COORDS_FORMAT 2, older snapshots are read through the record set
+SNAPSHOT_FORMAT_VERSION = 2
+SNAPSHOT_FILENAME = "patient_snapshot.json"
+
+# On-disk formats for fundus drawing files
+DRAWING_FORMAT_JSON = "json"
+DRAWING_FORMAT_BINARY = "binary"
+DRAWING_EXTENSIONS = {DRAWING_FORMAT_JSON: "json", DRAWING_FORMAT_BINARY: "fdz"}
+
+# How save_complete_patient_record keeps history: full timestamped copies or checkpoints + deltas
+HISTORY_MODE_FULL = "full"
+HISTORY_MODE_DELTA = "delta"
+
+# Components of a patient record that save_patient_components can write separately
+COMPONENT_DEMOGRAPHICS = "demographics"
+COMPONENT_MEDICAL_RECORD = "medical_record"
+COMPONENT_DRAWINGS = "drawings"
+RECORD_COMPONENTS = (COMPONENT_DEMOGRAPHICS, COMPONENT_MEDICAL_RECORD, COMPONENT_DRAWINGS)
+
+# A patient ID names its folder under patients/, so it must be one plain path component
+PATIENT_ID_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,63}")
+
+def check_patient_id(patient_id):
+    """Raise ValueError unless patient_id is 1-64 letters, digits, '.', '_' or '-', starting alphanumeric"""
+    if not isinstance(patient_id, str) or not PATIENT_ID_PATTERN.fullmatch(patient_id):
+        raise ValueError(f"Invalid patient ID: {patient_id!r}")
+
+def _record_id(filename):
+    """Return a record file's name without its folder and extension"""
+    return os.path.splitext(os.path.basename(filename))[0]
+
+def _record_timestamp(filename):
+    """Return the timestamp part of a demographics_<timestamp>.json file name"""
+    return _record_id(filename).split("_", 1)[1]
+
+def _patient_write(method):
+    """Run a write under the patient's lock and drop their cached record afterwards"""
+    @functools.wraps(method)
+    def wrapper(self, patient_id, *args, **kwargs):
+        with self.patient_locks.hold(patient_id):
+            try:
+                return method(self, patient_id, *args, **kwargs)
+            finally:
+                self.record_cache.invalidate(patient_id)
+    return wrapper
 
 class DataManager:
     """Handle all data storage operations following healthcare industry standards"""
     
-    def __init__(self, base_directory="patient_data"):
-        """Initialize the data manager with base directory"""
+    def __init__(self, base_directory="patient_data", drawing_format=DRAWING_FORMAT_JSON,
+                 history_mode=HISTORY_MODE_FULL, checkpoint_interval=20):
+        """Initialize the data manager with base directory
+        
+        drawing_format selects how new fundus drawings are written: "json" for
+        the original pretty-printed files or "binary" for the compact
+        drawing_codec encoding. Both formats are always readable.
+        
+        history_mode selects how save_complete_patient_record keeps history:
+        "full" writes timestamped copies of every component, "delta" stores a
+        checkpoint every checkpoint_interval versions and deltas in between.
+        
+        Writes to one patient are serialized by a per-patient lock (see
+        patient_locks), and loads are served from a bounded read cache that
+        is checked against the snapshot file on every load (see record_cache).
+        """
+        if drawing_format not in DRAWING_EXTENSIONS:
+            raise ValueError(f"Unknown drawing format: {drawing_format}")
+        if history_mode not in (HISTORY_MODE_FULL, HISTORY_MODE_DELTA):
+            raise ValueError(f"Unknown history mode: {history_mode}")
         self.base_directory = base_directory
+        self.drawing_format = drawing_format
+        self.history_mode = history_mode
+        self.checkpoint_interval = checkpoint_interval
         self.setup_directories()
+        self.patient_locks = PatientLocks(os.path.join(self.base_directory, "locks"))
+        self.record_cache = RecordCache()
+        self.audit_logger = get_audit_logger(os.path.join(self.base_directory, "audit_logs"))
+        self.registry = PatientRegistry(os.path.join(self.base_directory, "patient_registry.db"))
+        self._audit_indexes = threading.local()
+        if self.registry.count() == 0:
+            self.rebuild_registry()
+        else:
+            # Pick up patient folders added behind the registry's back (restores, copies)
+            self.registry.reconcile(os.path.join(self.base_directory, "patients"))
         
     def setup_directories(self):
         """Create the necessary directory structure if it doesn't exist"""
@@ -21,6 +114,7 @@ class DataManager:
         
     def get_patient_directory(self, patient_id):
         """Return the patient-specific directory, creating it if needed"""
+        check_patient_id(patient_id)
         patient_dir = os.path.join(self.base_directory, "patients", patient_id)
         if not os.path.exists(patient_dir):
             os.makedirs(patient_dir, exist_ok=True)
@@ -28,35 +122,79 @@ class DataManager:
             os.makedirs(os.path.join(patient_dir, "medical_records"), exist_ok=True)
             os.makedirs(os.path.join(patient_dir, "fundus_charts"), exist_ok=True)
             os.makedirs(os.path.join(patient_dir, "images"), exist_ok=True)
+            self.registry.upsert(patient_id)
         return patient_dir
     
     def check_patient_exists(self, patient_id):
         """Check if patient already exists"""
-        patient_dir = os.path.join(self.base_directory, "patients", patient_id)
-        return os.path.exists(patient_dir)
+        return self._registered(patient_id)
     
+    def _registered(self, patient_id):
+        """True if the patient is registered, registering a folder the registry has not seen yet"""
+        if self.registry.exists(patient_id):
+            return True
+        if not isinstance(patient_id, str) or not PATIENT_ID_PATTERN.fullmatch(patient_id):
+            return False
+        patients_dir = os.path.join(self.base_directory, "patients")
+        if not os.path.isdir(os.path.join(patients_dir, patient_id)):
+            return False
+        count("data_manager.registry_miss_on_disk")
+        self.registry.refresh(patients_dir, [patient_id])
+        return True
+    
+    def search_patients(self, id_prefix=None, name_prefix=None, age=None, diagnosis=None, limit=None):
+        """Search the patient registry by ID or name prefix, age and diagnosis"""
+        return self.registry.search(id_prefix=id_prefix, name_prefix=name_prefix,
+                                    age=age, diagnosis=diagnosis, limit=limit)
+    
+    def rebuild_registry(self):
+        """Rebuild the patient registry from the on-disk patient tree"""
+        return self.registry.rebuild(os.path.join(self.base_directory, "patients"))
+    
+    @timed("data_manager.save_patient_demographics")
+    @_patient_write
     def save_patient_demographics(self, patient_id, data):
         """Save patient demographic information"""
         patient_dir = self.get_patient_directory(patient_id)
-        demographics = {
+        with WriteTransaction() as txn:
+            filename, demographics = self._stage_demographics(txn, patient_dir, patient_id, data,
+                                                              new_record_id())
+            txn.point(os.path.join(patient_dir, "demographics", "demographics_latest.json"), filename)
+        self.registry.upsert(patient_id, name=demographics["name"], age=demographics["age"],
+                             last_updated=demographics["last_updated"])
+        self.log_change(patient_id, "demographic_update",
+                        f"Updated demographics at {_record_timestamp(filename)}")
+        return filename
+    
+    def _demographics_payload(self, patient_id, data):
+        return {
             "id": patient_id,
             "name": data.get("name", ""),
             "age": data.get("age", ""),
             "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(patient_dir, "demographics", f"demographics_{timestamp}.json")
-        with open(filename, 'w') as f:
-            json.dump(demographics, f, indent=4)
-        latest_file = os.path.join(patient_dir, "demographics", "demographics_latest.json")
-        shutil.copy2(filename, latest_file)
-        self.log_change(patient_id, "demographic_update", f"Updated demographics at {timestamp}")
-        return filename
     
+    def _stage_demographics(self, txn, patient_dir, patient_id, data, record_id):
+        demographics = self._demographics_payload(patient_id, data)
+        filename = os.path.join(patient_dir, "demographics", f"demographics_{record_id}.json")
+        txn.write_json(filename, demographics)
+        return filename, demographics
+    
+    @timed("data_manager.save_medical_record")
+    @_patient_write
     def save_medical_record(self, patient_id, data):
         """Save medical record information"""
         patient_dir = self.get_patient_directory(patient_id)
-        medical_data = {
+        with WriteTransaction() as txn:
+            filename, medical_data = self._stage_medical_record(txn, patient_dir, data, new_record_id())
+            txn.point(os.path.join(patient_dir, "medical_records", "latest_record.json"), filename)
+        self.registry.upsert(patient_id, diagnosis=medical_data["diagnosis"])
+        self.log_change(patient_id, "medical_record_update",
+                        f"Updated medical record: {_record_id(filename)}")
+        return filename
+    
+    def _medical_record_payload(self, data):
+        return {
             "diagnosis": data.get("diagnosis", ""),
             "diagnosis_other": data.get("diagnosis_other", ""),
             "left_eye": data.get("left_eye", ""),
@@ -68,138 +206,544 @@ class DataManager:
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "provider": data.get("provider", "")
         }
-        record_id = f"record_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        filename = os.path.join(patient_dir, "medical_records", f"{record_id}.json")
-        with open(filename, 'w') as f:
-            json.dump(medical_data, f, indent=4)
-        latest_file = os.path.join(patient_dir, "medical_records", "latest_record.json")
-        shutil.copy2(filename, latest_file)
-        self.log_change(patient_id, "medical_record_update", f"Updated medical record: {record_id}")
-        return filename
     
+    def _stage_medical_record(self, txn, patient_dir, data, record_id):
+        medical_data = self._medical_record_payload(data)
+        filename = os.path.join(patient_dir, "medical_records", f"record_{record_id}.json")
+        txn.write_json(filename, medical_data)
+        return filename, medical_data
+    
+    @timed("data_manager.save_fundus_drawings")
+    @_patient_write
     def save_fundus_drawings(self, patient_id, left_drawings, right_drawings, legend_data=None):
         """Save fundus drawing data"""
         patient_dir = self.get_patient_directory(patient_id)
-        drawing_data = {
+        with WriteTransaction() as txn:
+            filename, _ = self._stage_fundus_drawings(txn, patient_dir, new_record_id(), left_drawings,
+                                                      right_drawings, legend_data)
+            self._point_latest_drawing(txn, patient_dir, filename)
+        self.log_change(patient_id, "fundus_drawing_update",
+                        f"Updated fundus drawings: {_record_id(filename)}")
+        return filename
+    
+    def _drawing_payload(self, left_drawings, right_drawings, legend_data=None):
+        return {
             "left_eye_drawings": left_drawings,
             "right_eye_drawings": right_drawings,
             "legend_data": legend_data or [],
+            "coords_format": DRAWING_COORDS_FORMAT,
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        drawing_id = f"fundus_drawing_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        filename = os.path.join(patient_dir, "fundus_charts", f"{drawing_id}.json")
-        with open(filename, 'w') as f:
-            json.dump(drawing_data, f, indent=4)
-        latest_file = os.path.join(patient_dir, "fundus_charts", "latest_drawing.json")
-        shutil.copy2(filename, latest_file)
-        self.log_change(patient_id, "fundus_drawing_update", f"Updated fundus drawings: {drawing_id}")
-        return filename
     
+    def _stage_fundus_drawings(self, txn, patient_dir, record_id, left_drawings, right_drawings,
+                               legend_data=None):
+        drawing_data = self._drawing_payload(left_drawings, right_drawings, legend_data)
+        drawing_id = f"fundus_drawing_{record_id}"
+        extension = DRAWING_EXTENSIONS[self.drawing_format]
+        filename = os.path.join(patient_dir, "fundus_charts", f"{drawing_id}.{extension}")
+        if self.drawing_format == DRAWING_FORMAT_BINARY:
+            txn.write(filename, encode_drawing_document(drawing_data))
+        else:
+            # Compact: indented dumps use the pure-Python encoder, far too slow for stroke data
+            txn.write_json(filename, drawing_data, indent=None)
+        return filename, drawing_data
+    
+    def _point_latest_drawing(self, txn, patient_dir, filename):
+        # One pointer for both formats; it is checked before any older latest_drawing.fdz copy
+        txn.point(os.path.join(patient_dir, "fundus_charts", "latest_drawing.json"), filename)
+    
+    @timed("data_manager.save_chart_image")
     def save_chart_image(self, patient_id, image_data, image_format="png"):
-        """Save a rendered fundus chart image"""
+        """Save a rendered fundus chart image, writing it atomically via a temp file"""
         patient_dir = self.get_patient_directory(patient_id)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(patient_dir, "images", f"fundus_chart_{timestamp}.{image_format}")
-        with open(filename, 'wb') as f:
-            f.write(image_data)
+        filename = os.path.join(patient_dir, "images", f"fundus_chart_{new_record_id()}.{image_format}")
+        atomic_write(filename, image_data)
         self.log_change(patient_id, "image_saved", f"Saved fundus chart image: {os.path.basename(filename)}")
         return filename
     
-    def save_complete_patient_record(self, patient_id, data):
-        """Save all patient data in appropriate locations"""
-        demo_file = self.save_patient_demographics(patient_id, data)
-        medical_file = self.save_medical_record(patient_id, data)
-        drawing_file = self.save_fundus_drawings(
-            patient_id, 
+    @timed("data_manager.save_complete_patient_record")
+    @_patient_write
+    def save_complete_patient_record(self, patient_id, data, flush_audit=True):
+        """Save all patient data in appropriate locations
+        
+        The three component files, the record set, the snapshot and the latest
+        pointers are committed as one transaction: everything is written and
+        fsynced before the first rename, the component folders are fsynced
+        before the record set pointer is renamed, and that rename commits the
+        save. load_patient trusts the snapshot only when
+        it matches the record set that pointer names, so a crash at any point
+        leaves the previous record visible on every read path, or the new
+        one, never a mix.
+        
+        flush_audit=False leaves the audit entries buffered for a later
+        flush_audit_log(), which bulk imports use to fsync once per batch.
+        """
+        if self.history_mode == HISTORY_MODE_DELTA:
+            return self._save_versioned_record(patient_id, data, flush_audit)
+        patient_dir = self.get_patient_directory(patient_id)
+        # One ID names every file of the save so they can be matched up on disk
+        record_id = new_record_id()
+        txn = WriteTransaction()
+        demo_file, demographics = self._stage_demographics(txn, patient_dir, patient_id, data, record_id)
+        medical_file, medical_data = self._stage_medical_record(txn, patient_dir, data, record_id)
+        drawing_file, drawing_data = self._stage_fundus_drawings(
+            txn,
+            patient_dir,
+            record_id,
             data.get("left_drawings", []), 
             data.get("right_drawings", []),
             data.get("legend_data", [])
         )
-        patient_dir = self.get_patient_directory(patient_id)
+        index_file = self._stage_record_set(txn, patient_dir, record_id, (demo_file, demographics),
+                                            (medical_file, medical_data), (drawing_file, drawing_data),
+                                            RECORD_COMPONENTS)
+        txn.commit()
+        self.registry.upsert(patient_id, name=demographics["name"], age=demographics["age"],
+                             diagnosis=medical_data["diagnosis"],
+                             last_updated=demographics["last_updated"])
+        self.log_change(patient_id, "demographic_update",
+                        f"Updated demographics at {_record_timestamp(demo_file)}")
+        self.log_change(patient_id, "medical_record_update",
+                        f"Updated medical record: {_record_id(medical_file)}")
+        self.log_change(patient_id, "fundus_drawing_update",
+                        f"Updated fundus drawings: {_record_id(drawing_file)}")
+        if flush_audit:
+            self.flush_audit_log()
+        return index_file
+    
+    def _stage_record_set(self, txn, patient_dir, record_id, demographics, medical, drawings, written):
+        """Stage the record set, snapshot and latest pointers of one save
+        
+        demographics, medical and drawings are (file, payload) pairs; only the
+        components named in written have their component pointer moved.
+        """
         record_set = {
-            "demographics_file": os.path.relpath(demo_file, patient_dir),
-            "medical_record_file": os.path.relpath(medical_file, patient_dir),
-            "drawings_file": os.path.relpath(drawing_file, patient_dir),
+            "demographics_file": os.path.relpath(demographics[0], patient_dir),
+            "medical_record_file": os.path.relpath(medical[0], patient_dir),
+            "drawings_file": os.path.relpath(drawings[0], patient_dir),
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         }
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        index_file = os.path.join(patient_dir, f"record_set_{timestamp}.json")
-        with open(index_file, 'w') as f:
-            json.dump(record_set, f, indent=4)
-        latest_index = os.path.join(patient_dir, "latest_record_set.json")
-        shutil.copy2(index_file, latest_index)
+        index_file = os.path.join(patient_dir, f"record_set_{record_id}.json")
+        txn.write_json(index_file, record_set)
+        self._stage_snapshot(txn, patient_dir, record_set, demographics[1], medical[1], drawings[1])
+        # Component pointers are only read when no record set exists, so moving them before
+        # the commit is harmless, and their folders are then fsynced once, with the components
+        if COMPONENT_DEMOGRAPHICS in written:
+            txn.point(os.path.join(patient_dir, "demographics", "demographics_latest.json"), demographics[0])
+        if COMPONENT_MEDICAL_RECORD in written:
+            txn.point(os.path.join(patient_dir, "medical_records", "latest_record.json"), medical[0])
+        if COMPONENT_DRAWINGS in written:
+            self._point_latest_drawing(txn, patient_dir, drawings[0])
+        # The record set pointer commits the save
+        txn.point(os.path.join(patient_dir, "latest_record_set.json"), index_file, commit=True)
+        return index_file
+    
+    @timed("data_manager.save_patient_components")
+    @_patient_write
+    def save_patient_components(self, patient_id, data, components, flush_audit=True):
+        """Save only the given components of a patient record
+        
+        components names any of "demographics", "medical_record" and
+        "drawings"; only their files are written. The new record set and
+        snapshot refer to the current files of the other components, so
+        load_patient still sees one consistent record and history keeps one
+        record set per save. A patient with no full-history record set yet
+        (a new patient, or delta history mode) gets save_complete_patient_record.
+        """
+        components = set(components)
+        unknown = components.difference(RECORD_COMPONENTS)
+        if unknown:
+            raise ValueError(f"Unknown record components: {sorted(unknown)}")
+        patient_dir = self.get_patient_directory(patient_id)
+        previous = None
+        if self.history_mode == HISTORY_MODE_FULL:
+            previous_path = resolve_pointer(os.path.join(patient_dir, "latest_record_set.json"))
+            try:
+                with open(previous_path, 'r') as f:
+                    previous = json.load(f)
+                current = {
+                    COMPONENT_DEMOGRAPHICS: os.path.join(patient_dir, previous["demographics_file"]),
+                    COMPONENT_MEDICAL_RECORD: os.path.join(patient_dir, previous["medical_record_file"]),
+                    COMPONENT_DRAWINGS: os.path.join(patient_dir, previous["drawings_file"]),
+                }
+                stored = {}
+                for component in set(RECORD_COMPONENTS) - components:
+                    if component == COMPONENT_DRAWINGS:
+                        stored[component] = self.read_drawing_file(current[component])
+                    else:
+                        with open(current[component], 'r') as f:
+                            stored[component] = json.load(f)
+            except (TypeError, OSError, ValueError, KeyError):
+                previous = None
+        if previous is None:
+            return self.save_complete_patient_record(patient_id, data, flush_audit)
+        
+        record_id = new_record_id()
+        txn = WriteTransaction()
+        if COMPONENT_DEMOGRAPHICS in components:
+            demographics = self._stage_demographics(txn, patient_dir, patient_id, data, record_id)
+        else:
+            demographics = (current[COMPONENT_DEMOGRAPHICS], stored[COMPONENT_DEMOGRAPHICS])
+        if COMPONENT_MEDICAL_RECORD in components:
+            medical = self._stage_medical_record(txn, patient_dir, data, record_id)
+        else:
+            medical = (current[COMPONENT_MEDICAL_RECORD], stored[COMPONENT_MEDICAL_RECORD])
+        if COMPONENT_DRAWINGS in components:
+            drawings = self._stage_fundus_drawings(txn, patient_dir, record_id,
+                                                   data.get("left_drawings", []),
+                                                   data.get("right_drawings", []),
+                                                   data.get("legend_data", []))
+        else:
+            drawings = (current[COMPONENT_DRAWINGS], stored[COMPONENT_DRAWINGS])
+        index_file = self._stage_record_set(txn, patient_dir, record_id, demographics, medical, drawings,
+                                            components)
+        txn.commit()
+        self.registry.upsert(patient_id, name=demographics[1].get("name", ""),
+                             age=demographics[1].get("age", ""),
+                             diagnosis=medical[1].get("diagnosis", ""),
+                             last_updated=demographics[1].get("last_updated"))
+        if COMPONENT_DEMOGRAPHICS in components:
+            self.log_change(patient_id, "demographic_update",
+                            f"Updated demographics at {_record_timestamp(demographics[0])}")
+        if COMPONENT_MEDICAL_RECORD in components:
+            self.log_change(patient_id, "medical_record_update",
+                            f"Updated medical record: {_record_id(medical[0])}")
+        if COMPONENT_DRAWINGS in components:
+            self.log_change(patient_id, "fundus_drawing_update",
+                            f"Updated fundus drawings: {_record_id(drawings[0])}")
+        if flush_audit:
+            self.flush_audit_log()
         return index_file
     
-    def load_patient(self, patient_id):
-        """Load the latest patient data"""
+    def _save_versioned_record(self, patient_id, data, flush_audit=True):
+        """Store the complete record as the next history version (delta history mode)"""
+        patient_dir = self.get_patient_directory(patient_id)
+        demographics = self._demographics_payload(patient_id, data)
+        medical_data = self._medical_record_payload(data)
+        drawing_data = self._drawing_payload(
+            data.get("left_drawings", []),
+            data.get("right_drawings", []),
+            data.get("legend_data", [])
+        )
+        document = {
+            "demographics": demographics,
+            "medical_record": medical_data,
+            "drawings": drawing_data,
+        }
+        entry = self._version_store(patient_dir).append(document, timestamp=demographics["last_updated"],
+                                                        write=atomic_write)
+        record_set = {
+            # The version number, not the file: compaction renames history files
+            "history_version": entry["version"],
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with WriteTransaction() as txn:
+            self._stage_snapshot(txn, patient_dir, record_set, demographics, medical_data, drawing_data)
+            txn.write_json(os.path.join(patient_dir, "latest_record_set.json"), record_set, commit=True)
+        self.registry.upsert(patient_id, name=demographics["name"], age=demographics["age"],
+                             diagnosis=medical_data["diagnosis"],
+                             last_updated=demographics["last_updated"])
+        self.log_change(patient_id, "patient_record_update",
+                        f"Saved patient record version {entry['version']} ({entry['kind']})")
+        if flush_audit:
+            self.flush_audit_log()
+        return os.path.join(patient_dir, "history", entry["file"])
+    
+    def _version_store(self, patient_dir):
+        return PatientVersionStore(patient_dir, checkpoint_interval=self.checkpoint_interval)
+    
+    def list_history(self, patient_id):
+        """List the saved versions of a patient record, oldest first
+        
+        Delta history entries come from the version store; patients saved in
+        full history mode list one version per record_set file.
+        """
+        if not self._registered(patient_id):
+            return []
         patient_dir = os.path.join(self.base_directory, "patients", patient_id)
-        if not os.path.exists(patient_dir):
+        history = self._version_store(patient_dir).list_history()
+        if history:
+            return history
+        record_sets = sorted(name for name in os.listdir(patient_dir)
+                             if name.startswith("record_set_") and name.endswith(".json"))
+        return [{"version": number, "kind": "record_set", "file": name}
+                for number, name in enumerate(record_sets, start=1)]
+    
+    @timed("data_manager.load_patient_version")
+    def load_patient_version(self, patient_id, version):
+        """Load a past version of a patient record as returned by list_history"""
+        patient_dir = os.path.join(self.base_directory, "patients", patient_id)
+        for entry in self.list_history(patient_id):
+            if entry["version"] != version:
+                continue
+            if entry["kind"] == "record_set":
+                with open(os.path.join(patient_dir, entry["file"]), 'r') as f:
+                    return self._load_record_set(patient_dir, json.load(f))
+            document = self._version_store(patient_dir).load_version(version)
+            return self._compose_patient_data(document["demographics"], document["medical_record"],
+                                              document["drawings"])
+        return None
+    
+    @_patient_write
+    def compact_history(self, patient_id):
+        """Re-chain a patient's delta history and return the bytes saved"""
+        patient_dir = os.path.join(self.base_directory, "patients", patient_id)
+        return self._version_store(patient_dir).compact()
+    
+    def _compose_patient_data(self, demographics, medical_data, drawing_data):
+        """Merge the three record components into the dict returned by load_patient"""
+        data = {}
+        data.update(demographics)
+        data.update(medical_data)
+        data.update(self._drawing_fields(drawing_data))
+        return data
+    
+    def _drawing_fields(self, drawing_data):
+        """Return the patient data fields of a drawing document, upgrading older coordinates"""
+        coords_format = drawing_data.get("coords_format", 1)
+        return {
+            "left_drawings": upgrade_drawings(drawing_data["left_eye_drawings"], coords_format),
+            "right_drawings": upgrade_drawings(drawing_data["right_eye_drawings"], coords_format),
+            "legend_data": drawing_data.get("legend_data", []),
+        }
+    
+    def _stage_snapshot(self, txn, patient_dir, record_set, demographics, medical_data, drawing_data):
+        """Stage the consolidated snapshot that lets load_patient do a single read"""
+        snapshot = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "record_set": record_set,
+            "data": self._compose_patient_data(demographics, medical_data, drawing_data),
+        }
+        encoded = json.dumps(snapshot, separators=(",", ":")).encode("utf-8")
+        txn.write(os.path.join(patient_dir, SNAPSHOT_FILENAME), encoded)
+    
+    def _read_snapshot(self, patient_dir, patient_id=None):
+        """Return the snapshot's patient data, or None if it is missing, unreadable or not committed
+        
+        With patient_id the read cache is used: a cached record parsed from
+        this same version of the file is returned without reading it.
+        """
+        try:
+            with open(os.path.join(patient_dir, SNAPSHOT_FILENAME), 'rb') as f:
+                # fstat the open file, so the fingerprint belongs to the bytes read below
+                fingerprint = file_fingerprint(os.fstat(f.fileno()))
+                if patient_id is not None:
+                    cached = self.record_cache.get(patient_id, fingerprint)
+                    if cached is not None:
+                        count("data_manager.record_cache_hit")
+                        return cached
+                    count("data_manager.record_cache_miss")
+                payload = f.read()
+                record_bytes("io.read", len(payload))
+                snapshot = json.loads(payload)
+        except (OSError, ValueError):
+            return None
+        if snapshot.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            return None
+        # Written before the record set pointer, so it is only current once the pointer names
+        # the same record set. A cache hit needs no check: a new snapshot has a new fingerprint.
+        committed = self._latest_record_set(patient_dir)[1]
+        if committed is None or snapshot.get("record_set") != committed:
+            return None
+        data = snapshot.get("data")
+        if patient_id is None or data is None:
+            return data
+        self.record_cache.put(patient_id, fingerprint, data, fingerprint[1])
+        return copy_record(data)
+    
+    @timed("data_manager.load_patient")
+    def load_patient(self, patient_id, use_snapshot=True, audit=True):
+        """Load the latest patient data
+        
+        The consolidated snapshot is read when present, or taken from the read
+        cache if it has not changed since it was last read; the record set and
+        the individual component files remain the fallback. Bulk and background
+        readers pass audit=False and log one SYSTEM entry for the whole run
+        instead of a data_access entry per patient.
+        """
+        if not self._registered(patient_id):
             return None
-        latest_index_path = os.path.join(patient_dir, "latest_record_set.json")
-        if os.path.exists(latest_index_path):
-            with open(latest_index_path, 'r') as f:
-                record_set = json.load(f)
-            result = {}
-            demo_path = os.path.join(patient_dir, record_set["demographics_file"])
-            if os.path.exists(demo_path):
-                with open(demo_path, 'r') as f:
-                    result.update(json.load(f))
-            med_path = os.path.join(patient_dir, record_set["medical_record_file"])
-            if os.path.exists(med_path):
-                with open(med_path, 'r') as f:
-                    result.update(json.load(f))
-            draw_path = os.path.join(patient_dir, record_set["drawings_file"])
-            if os.path.exists(draw_path):
-                with open(draw_path, 'r') as f:
-                    drawings = json.load(f)
-                    result["left_drawings"] = drawings["left_eye_drawings"]
-                    result["right_drawings"] = drawings["right_eye_drawings"]
-                    result["legend_data"] = drawings.get("legend_data", [])
-            self.log_change(patient_id, "data_access", "Loaded patient record")
+        patient_dir = os.path.join(self.base_directory, "patients", patient_id)
+        if use_snapshot:
+            result = self._read_snapshot(patient_dir, patient_id=patient_id)
+            if result is not None:
+                if audit:
+                    self.log_change(patient_id, "data_access", "Loaded patient record")
+                return result
+        latest_index_path, record_set = self._latest_record_set(patient_dir)
+        if latest_index_path:
+            if record_set is not None and self._record_set_complete(patient_dir, record_set):
+                result = self._load_record_set(patient_dir, record_set)
+            else:
+                # A component file lost after the save (e.g. deleted by hand or a damaged
+                # disk); the snapshot committed with the record set still holds the whole record
+                result = self._read_snapshot(patient_dir)
+                if result is None:
+                    record_set = self._previous_record_set(patient_dir, latest_index_path)
+                    result = self._load_record_set(patient_dir, record_set) if record_set else None
+            if result is not None:
+                if audit:
+                    self.log_change(patient_id, "data_access", "Loaded patient record")
+                return result
+        result = {}
+        demo_path = resolve_pointer(os.path.join(patient_dir, "demographics", "demographics_latest.json"))
+        if demo_path:
+            with open(demo_path, 'r') as f:
+                result.update(json.load(f))
+        med_path = resolve_pointer(os.path.join(patient_dir, "medical_records", "latest_record.json"))
+        if med_path:
+            with open(med_path, 'r') as f:
+                result.update(json.load(f))
+        for extension in DRAWING_EXTENSIONS.values():
+            draw_path = resolve_pointer(os.path.join(patient_dir, "fundus_charts", f"latest_drawing.{extension}"))
+            if draw_path:
+                result.update(self._drawing_fields(self.read_drawing_file(draw_path)))
+                break
+        if result:
+            if audit:
+                self.log_change(patient_id, "data_access", "Loaded patient record from individual components")
             return result
+        return None
+    
+    def _latest_record_set(self, patient_dir):
+        """Return (path, record set) committed by latest_record_set.json
+
+        path is None when the patient has no record set, and the record set
+        None when its file is missing or unreadable.
+        """
+        path = resolve_pointer(os.path.join(patient_dir, "latest_record_set.json"))
+        if path is None:
+            return None, None
+        try:
+            with open(path, 'r') as f:
+                return path, json.load(f)
+        except (OSError, ValueError):
+            return path, None
+    
+    def _record_set_complete(self, patient_dir, record_set):
+        """True if every file a record set names exists"""
+        if "history_version" in record_set:
+            return True
+        files = [record_set.get(key) for key in ("demographics_file", "medical_record_file", "drawings_file")]
+        return all(name and os.path.exists(os.path.join(patient_dir, name)) for name in files)
+    
+    def _previous_record_set(self, patient_dir, committed_path):
+        """Return the newest complete record set saved before committed_path, or None"""
+        committed = os.path.basename(committed_path)
+        names = sorted((name for name in os.listdir(patient_dir)
+                        if name.startswith("record_set_") and name.endswith(".json") and name < committed),
+                       reverse=True)
+        for name in names:
+            try:
+                with open(os.path.join(patient_dir, name), 'r') as f:
+                    record_set = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if self._record_set_complete(patient_dir, record_set):
+                return record_set
+        return None
+    
+    def _load_record_set(self, patient_dir, record_set):
+        """Load the patient data referenced by a record set"""
+        if "history_version" in record_set:
+            document = self._version_store(patient_dir).load_version(record_set["history_version"])
+            return self._compose_patient_data(document["demographics"], document["medical_record"],
+                                              document["drawings"])
         result = {}
-        demo_path = os.path.join(patient_dir, "demographics", "demographics_latest.json")
+        demo_path = os.path.join(patient_dir, record_set["demographics_file"])
         if os.path.exists(demo_path):
             with open(demo_path, 'r') as f:
                 result.update(json.load(f))
-        med_path = os.path.join(patient_dir, "medical_records", "latest_record.json")
+        med_path = os.path.join(patient_dir, record_set["medical_record_file"])
         if os.path.exists(med_path):
             with open(med_path, 'r') as f:
                 result.update(json.load(f))
-        draw_path = os.path.join(patient_dir, "fundus_charts", "latest_drawing.json")
+        draw_path = os.path.join(patient_dir, record_set["drawings_file"])
         if os.path.exists(draw_path):
-            with open(draw_path, 'r') as f:
-                drawings = json.load(f)
-                result["left_drawings"] = drawings["left_eye_drawings"]
-                result["right_drawings"] = drawings["right_eye_drawings"]
-                result["legend_data"] = drawings.get("legend_data", [])
-        if result:
-            self.log_change(patient_id, "data_access", "Loaded patient record from individual components")
-            return result
-        return None
+            result.update(self._drawing_fields(self.read_drawing_file(draw_path)))
+        return result
     
-    def list_patients(self):
-        """List all patient IDs"""
-        patients_dir = os.path.join(self.base_directory, "patients")
-        if not os.path.exists(patients_dir):
+    @timed("data_manager.read_drawing_file")
+    def read_drawing_file(self, path):
+        """Read a fundus drawing file in either the JSON or the binary format"""
+        with open(path, 'rb') as f:
+            payload = f.read()
+        record_bytes("io.read", len(payload))
+        if path.endswith("." + DRAWING_EXTENSIONS[DRAWING_FORMAT_BINARY]):
+            return decode_drawing_document(payload)
+        return json.loads(payload)
+    
+    def list_chart_images(self, patient_id):
+        """Return the paths of a patient's saved chart images, newest first"""
+        images_dir = os.path.join(self.base_directory, "patients", patient_id, "images")
+        try:
+            names = os.listdir(images_dir)
+        except OSError:
             return []
-        return [d for d in os.listdir(patients_dir) 
-                if os.path.isdir(os.path.join(patients_dir, d))]
+        return [os.path.join(images_dir, name)
+                for name in sorted(names, reverse=True) if name.startswith("fundus_chart_")]
+    
+    def list_patients(self):
+        """List all patient IDs, registering patient folders the registry is missing"""
+        self.registry.reconcile(os.path.join(self.base_directory, "patients"))
+        return self.registry.list_ids()
     
-    def create_backup(self):
-        """Create a backup of all patient data"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    @timed("data_manager.create_backup")
+    def create_backup(self, incremental=False):
+        """Create a backup of all patient data
+        
+        With incremental=True only new or changed files are hashed and copied
+        into the content-addressed store under backups/objects, and the backup
+        is recorded as a manifest; the manifest path is returned. Otherwise a
+        full copy of the patient tree is made as before.
+        """
+        timestamp = new_record_id()
+        patients_dir = os.path.join(self.base_directory, "patients")
+        if incremental:
+            store = BackupStore(os.path.join(self.base_directory, "backups"))
+            manifest = store.create(patients_dir, name=f"backup_{timestamp}")
+            stats = manifest["stats"]
+            self.log_change("SYSTEM", "backup_created",
+                            f"Created incremental backup: backup_{timestamp} "
+                            f"({stats['hashed']} of {stats['files']} files changed)")
+            self.flush_audit_log()
+            return os.path.join(store.manifests_dir, f"backup_{timestamp}.json")
         backup_dir = os.path.join(self.base_directory, "backups", f"backup_{timestamp}")
         os.makedirs(backup_dir, exist_ok=True)
-        patients_dir = os.path.join(self.base_directory, "patients")
         if os.path.exists(patients_dir):
             backup_patients_dir = os.path.join(backup_dir, "patients")
             shutil.copytree(patients_dir, backup_patients_dir)
         self.log_change("SYSTEM", "backup_created", f"Created backup: backup_{timestamp}")
+        self.flush_audit_log()
         return backup_dir
     
+    @timed("data_manager.restore_backup")
+    def restore_backup(self, backup_name, target_directory):
+        """Restore an incremental backup's patient tree into target_directory with hash checks
+        
+        Restoring over this manager's own patient tree re-registers every
+        restored patient; another tree is reconciled by the DataManager that
+        opens it.
+        """
+        store = BackupStore(os.path.join(self.base_directory, "backups"))
+        restored = store.restore(backup_name, target_directory)
+        patients_dir = os.path.join(self.base_directory, "patients")
+        if os.path.abspath(target_directory) == os.path.abspath(patients_dir):
+            restored_ids = {relpath.split("/", 1)[0] for relpath in store.load_manifest(backup_name)["files"]}
+            self.registry.refresh(patients_dir, sorted(restored_ids))
+            for patient_id in restored_ids:
+                self.record_cache.invalidate(patient_id)
+        self.log_change("SYSTEM", "backup_restored",
+                        f"Restored {backup_name} ({restored} files) to {target_directory}")
+        self.flush_audit_log()
+        return restored
+    
     def log_change(self, patient_id, action_type, description):
-        """Log an action in the audit trail"""
+        """Log an action in the audit trail
+        
+        Entries are buffered by the shared AuditLogger and written in batches;
+        complete saves and backups flush them with an fsync before returning.
+        """
         log_entry = {
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "patient_id": patient_id,
@@ -208,7 +752,22 @@ class DataManager:
             "user": os.environ.get("USERNAME", "unknown")
         }
         month_year = datetime.now().strftime("%Y_%m")
-        log_file = os.path.join(self.base_directory, "audit_logs", f"audit_log_{month_year}.jsonl")
-        with open(log_file, 'a') as f:
-            f.write(json.dumps(log_entry) + "\n")
+        self.audit_logger.log(log_entry, month_year)
         return True
+    
+    def query_audit_log(self, **filters):
+        """Yield audit entries matching patient_id, action_type, user, since, until and limit
+        
+        Buffered entries are flushed first; see audit_query.AuditIndex.query.
+        Each thread opens the index once and reuses it, like the registry.
+        """
+        self.flush_audit_log(sync=False)
+        index = getattr(self._audit_indexes, "index", None)
+        if index is None:
+            index = AuditIndex(os.path.join(self.base_directory, "audit_logs"))
+            self._audit_indexes.index = index
+        return index.query(**filters)
+    
+    def flush_audit_log(self, sync=True):
+        """Write buffered audit entries now; sync=True also fsyncs them to disk"""
+        return self.audit_logger.flush(sync=sync)
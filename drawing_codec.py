@@ -0,0 +1,180 @@
+"""Compact binary encoding for fundus drawing documents.
+
+A drawing document is the dict written by DataManager.save_fundus_drawings.
+Stroke coordinates are packed into a single NumPy array using the narrowest
+dtype that reproduces every value exactly (int16 on a power-of-two grid,
+float32, or float64), alongside a bitmap recording which values were ints.
+Everything else (colors, widths, fill, freehand commands, legend, timestamp)
+goes into a compact JSON header. decode_drawing_document returns the same
+dict shape json.load would give for today's files.
+"""
+import json
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b"FDZ1"
+FLAG_COMPRESSED = 1
+DRAWING_KEYS = ("left_eye_drawings", "right_eye_drawings")
+HEADER = struct.Struct("<4sBBHIQ")
+
+# Number of values following each fabric.js path command
+PATH_ARITY = {"M": 2, "L": 2, "H": 1, "V": 1, "T": 2, "Q": 4, "S": 4, "C": 6, "Z": 0, "z": 0}
+INT16_SCALES = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+DTYPE_CODES = {0: np.int16, 1: np.float32, 2: np.float64}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _skeleton(value, values):
+    """Replace numbers in a nested coords value with 0 and collect them in order"""
+    if _is_number(value):
+        values.append(value)
+        return 0
+    if isinstance(value, (list, tuple)):
+        return [_skeleton(item, values) for item in value]
+    return {"v": value}
+
+
+def _fill_skeleton(skeleton, values, position):
+    if skeleton == 0 and not isinstance(skeleton, bool):
+        return values[position], position + 1
+    if isinstance(skeleton, dict):
+        return skeleton["v"], position
+    result = []
+    for item in skeleton:
+        filled, position = _fill_skeleton(item, values, position)
+        result.append(filled)
+    return result, position
+
+
+def _encode_path(path, values):
+    """Return the command string for a freehand path, or None if it cannot be packed"""
+    commands = []
+    for segment in path:
+        if not segment or not isinstance(segment[0], str):
+            return None
+        command = segment[0]
+        arity = PATH_ARITY.get(command)
+        if arity is None or len(segment) != arity + 1 or not all(map(_is_number, segment[1:])):
+            return None
+        commands.append(command)
+        values.extend(segment[1:])
+    return "".join(commands)
+
+
+def _encode_stroke(stroke, values):
+    meta = {}
+    for key, value in stroke.items():
+        if key == "points" and isinstance(value, list):
+            mark = len(values)
+            commands = _encode_path(value, values)
+            if commands is not None:
+                meta["_path"] = commands
+                continue
+            del values[mark:]
+        if key in ("coords", "points"):
+            meta[f"_{key}"] = _skeleton(value, values)
+            continue
+        meta[key] = value
+    return meta
+
+
+def _decode_stroke(meta, values, position):
+    stroke = {}
+    for key, value in meta.items():
+        if key == "_path":
+            points = []
+            for command in value:
+                arity = PATH_ARITY[command]
+                points.append([command] + values[position:position + arity])
+                position += arity
+            stroke["points"] = points
+        elif key in ("_coords", "_points"):
+            stroke[key[1:]], position = _fill_skeleton(value, values, position)
+        else:
+            stroke[key] = value
+    return stroke, position
+
+
+def _pack_values(values):
+    """Pick the narrowest exact dtype for values and return (code, scale, array)"""
+    array = np.asarray(values, dtype=np.float64)
+    if array.size == 0:
+        return 0, 1, np.zeros(0, dtype=np.int16)
+    if np.all(np.isfinite(array)):
+        for scale in INT16_SCALES:
+            scaled = array * scale
+            if (np.abs(scaled).max() < 32768 and np.array_equal(scaled, np.round(scaled))):
+                return 0, scale, scaled.astype(np.int16)
+    as_float32 = array.astype(np.float32)
+    if np.array_equal(as_float32.astype(np.float64), array, equal_nan=True):
+        return 1, 1, as_float32
+    return 2, 1, array
+
+
+def encode_drawing_document(document, compress=True, level=6):
+    """Encode a drawing document (as saved by save_fundus_drawings) to bytes"""
+    values = []
+    header = {}
+    eyes = {}
+    for key, value in document.items():
+        if key in DRAWING_KEYS:
+            eyes[key] = [_encode_stroke(stroke, values) for stroke in value or []]
+            header[key] = None
+        else:
+            header[key] = value
+    header["_eyes"] = eyes
+    int_mask = np.packbits(np.fromiter(
+        (isinstance(value, int) for value in values), dtype=bool, count=len(values)))
+    dtype_code, scale, array = _pack_values(values)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    body = header_bytes + int_mask.tobytes() + array.tobytes()
+    flags = 0
+    if compress:
+        body = zlib.compress(body, level)
+        flags |= FLAG_COMPRESSED
+    prefix = HEADER.pack(MAGIC, flags, dtype_code, scale, len(header_bytes), len(values))
+    return prefix + body
+
+
+def decode_drawing_document(payload):
+    """Decode bytes from encode_drawing_document back into the document dict"""
+    magic, flags, dtype_code, scale, header_len, count = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not an encoded drawing document")
+    body = payload[HEADER.size:]
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+    header = json.loads(body[:header_len])
+    mask_len = (count + 7) // 8
+    int_mask = np.unpackbits(np.frombuffer(body, dtype=np.uint8, count=mask_len,
+                                           offset=header_len), count=count).astype(bool)
+    array = np.frombuffer(body, dtype=DTYPE_CODES[dtype_code], count=count,
+                          offset=header_len + mask_len).astype(np.float64)
+    if scale != 1:
+        array = array / scale
+    values = array.tolist()
+    for index in np.flatnonzero(int_mask).tolist():
+        values[index] = int(values[index])
+    eyes = header.pop("_eyes")
+    position = 0
+    document = {}
+    for key, value in header.items():
+        if key in eyes:
+            strokes = []
+            for meta in eyes[key]:
+                stroke, position = _decode_stroke(meta, values, position)
+                strokes.append(stroke)
+            document[key] = strokes
+        else:
+            document[key] = value
+    return document
+
+
+def is_encoded_drawing_document(payload):
+    """Return True if payload starts with the binary drawing magic"""
+    return payload[:len(MAGIC)] == MAGIC
@@ -0,0 +1,95 @@
+"""Per-eye undo/redo history of canvas edits.
+
+Each entry is the DrawingEdit of one canvas update: a splice holding only
+the objects it replaced and the ones that replaced them. Objects that are
+still on the canvas are shared with the live lists, so a deep history of a
+heavily annotated chart costs about the size of the edits, not one copy of
+the chart per step. Undo and redo apply the splice to the CanvasDiffer's
+lists; nothing is converted or parsed again.
+
+The undo stack is a ring buffer bounded by entry count and by an estimate
+of the memory it keeps alive; the oldest edits are dropped first.
+"""
+from collections import deque
+
+# Rough per-object and per-path-command costs used for the memory cap
+OBJECT_OVERHEAD = 600
+PATH_COMMAND_BYTES = 120
+
+
+def estimated_size(objects):
+    """Estimate the memory held by a list of fabric.js canvas objects"""
+    size = 0
+    for obj in objects:
+        size += OBJECT_OVERHEAD + PATH_COMMAND_BYTES * len(obj.get("path") or ())
+    return size
+
+
+def edit_size(edit):
+    """Estimate the memory a DrawingEdit keeps alive (drawings share the objects' paths)"""
+    return estimated_size(edit.old_objects) + estimated_size(edit.new_objects)
+
+
+class DrawingHistory:
+    """Bounded undo/redo stacks of DrawingEdits for one eye"""
+
+    def __init__(self, max_entries=200, max_bytes=4 * 1024 * 1024):
+        """Initialize empty stacks capped at max_entries and about max_bytes"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._undo = deque()
+        self._redo = []
+        self.bytes_held = 0
+        self.dropped = 0
+
+    @property
+    def can_undo(self):
+        """True if there is an edit to undo"""
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        """True if there is an undone edit to redo"""
+        return bool(self._redo)
+
+    def __len__(self):
+        return len(self._undo)
+
+    def clear(self):
+        """Forget every edit, e.g. when another patient is loaded"""
+        self._undo.clear()
+        self._redo = []
+        self.bytes_held = 0
+
+    def record(self, edit):
+        """Push a new edit; this discards the redo stack"""
+        for _, size in self._redo:
+            self.bytes_held -= size
+        self._redo = []
+        size = edit_size(edit)
+        self._undo.append((edit, size))
+        self.bytes_held += size
+        # Keep at least the newest edit even if it alone is over the cap
+        while len(self._undo) > 1 and (len(self._undo) > self.max_entries
+                                       or self.bytes_held > self.max_bytes):
+            _, dropped_size = self._undo.popleft()
+            self.bytes_held -= dropped_size
+            self.dropped += 1
+
+    def undo(self, differ):
+        """Undo the newest edit on differ; return False if there is none"""
+        if not self._undo:
+            return False
+        entry = self._undo.pop()
+        entry[0].undo(differ)
+        self._redo.append(entry)
+        return True
+
+    def redo(self, differ):
+        """Redo the most recently undone edit on differ; return False if there is none"""
+        if not self._redo:
+            return False
+        entry = self._redo.pop()
+        entry[0].redo(differ)
+        self._undo.append(entry)
+        return True
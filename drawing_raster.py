@@ -0,0 +1,151 @@
+"""Batched rasterizer for the stored fundus drawings.
+
+Each eye's canvas shows the whole chart image stretched to CANVAS_SIZE, so a
+drawing at canvas point (x, y) belongs at the same fraction of the chart
+image, whatever its DPI. Drawings are converted to matplotlib paths one type
+at a time: the shapes of every line, rectangle, circle and dot come from
+NumPy array operations, and freehand strokes keep their quadratic curves.
+All paths then go into a single PathCollection with per-path colours and
+widths. The whole set is drawn in one pass, in the order it was drawn on the
+canvas, instead of one artist per stroke.
+"""
+import math
+
+import numpy as np
+from matplotlib.collections import PathCollection
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+from matplotlib.path import Path
+from PIL import Image
+
+from chart_template import rasterize_figure
+
+CANVAS_SIZE = (400, 400)
+RASTER_DPI = 100
+DOT_RADIUS = 5
+NO_COLOR = (0.0, 0.0, 0.0, 0.0)
+
+# matplotlib path codes and vertex counts for the fabric.js path commands
+PATH_CODES = {"M": (Path.MOVETO,), "L": (Path.LINETO,), "Q": (Path.CURVE3,) * 2,
+              "C": (Path.CURVE4,) * 3}
+
+_UNIT_CIRCLE = Path.unit_circle()
+_RECT_CODES = np.array([Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY],
+                       dtype=Path.code_type)
+_RECT_CORNERS = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]], dtype=float)
+
+
+def _freehand_path(points):
+    vertices = []
+    codes = []
+    for segment in points:
+        command = segment[0]
+        if command in ("Z", "z"):
+            if vertices:
+                vertices.append(vertices[-1])
+                codes.append(Path.CLOSEPOLY)
+            continue
+        segment_codes = PATH_CODES.get(command)
+        if segment_codes is None:
+            continue
+        values = segment[1:]
+        for index, code in enumerate(segment_codes):
+            vertices.append(values[2 * index:2 * index + 2])
+            codes.append(code)
+    if not vertices:
+        return None
+    if codes[0] != Path.MOVETO:
+        codes[0] = Path.MOVETO
+    return Path(np.asarray(vertices, dtype=float), codes)
+
+
+def _line_paths(coords):
+    segments = np.asarray(coords, dtype=float).reshape(-1, 2, 2)
+    return [Path(segment) for segment in segments]
+
+
+def _rect_paths(coords):
+    boxes = np.asarray([(left, top, width, height) for (left, top), width, height in coords],
+                       dtype=float)
+    corners = boxes[:, None, :2] + _RECT_CORNERS[None] * boxes[:, None, 2:]
+    return [Path(vertices, _RECT_CODES) for vertices in corners]
+
+
+def _circle_paths(centers, radii):
+    centers = np.asarray(centers, dtype=float).reshape(-1, 1, 2)
+    radii = np.asarray(radii, dtype=float).reshape(-1, 1, 1)
+    outlines = centers + _UNIT_CIRCLE.vertices[None] * radii
+    return [Path(vertices, _UNIT_CIRCLE.codes) for vertices in outlines]
+
+
+def drawing_paths(drawings):
+    """Return (paths, edge RGBA, face RGBA, widths in canvas pixels) for drawings, in order"""
+    slots = []
+    styles = []
+    groups = {"line": [], "rect": [], "circle": [], "point": []}
+    for drawing in drawings:
+        kind = drawing.get("type")
+        try:
+            color = to_rgba(drawing.get("color", "black"), drawing.get("alpha", 1.0))
+        except ValueError:
+            continue
+        filled = drawing.get("fill") == "solid"
+        if kind == "freehand":
+            path = _freehand_path(drawing.get("points") or [])
+            if path is None:
+                continue
+            slots.append(path)
+        elif kind in groups and drawing.get("coords") is not None:
+            slots.append((kind, len(groups[kind])))
+            groups[kind].append(drawing["coords"])
+            filled = filled or kind == "point"
+        else:
+            continue
+        styles.append((color, color if filled else NO_COLOR, float(drawing.get("width", 1) or 1)))
+
+    built = {}
+    if groups["line"]:
+        built["line"] = _line_paths(groups["line"])
+    if groups["rect"]:
+        built["rect"] = _rect_paths(groups["rect"])
+    if groups["circle"]:
+        built["circle"] = _circle_paths([center for center, _ in groups["circle"]],
+                                        [radius for _, radius in groups["circle"]])
+    if groups["point"]:
+        built["point"] = _circle_paths(groups["point"], [DOT_RADIUS] * len(groups["point"]))
+    paths = [slot if isinstance(slot, Path) else built[slot[0]][slot[1]] for slot in slots]
+    edges = np.array([style[0] for style in styles], dtype=float).reshape(-1, 4)
+    faces = np.array([style[1] for style in styles], dtype=float).reshape(-1, 4)
+    widths = np.array([style[2] for style in styles], dtype=float)
+    return paths, edges, faces, widths
+
+
+def rasterize_drawings(drawings, size, canvas_size=CANVAS_SIZE):
+    """Rasterize drawings onto a transparent RGBA layer of size (width, height) pixels"""
+    width, height = size
+    fig = Figure(figsize=(width / RASTER_DPI, height / RASTER_DPI), facecolor=NO_COLOR)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_xlim(0, canvas_size[0])
+    ax.set_ylim(canvas_size[1], 0)  # canvas y grows downwards
+    ax.axis('off')
+    paths, edges, faces, widths = drawing_paths(drawings)
+    if paths:
+        # Canvas pixels to points; the canvas is stretched unevenly, so use the mean scale
+        scale = math.sqrt(width / canvas_size[0] * height / canvas_size[1]) * 72 / RASTER_DPI
+        collection = PathCollection(paths, edgecolors=edges, facecolors=faces,
+                                    linewidths=widths * scale, capstyle='round', joinstyle='round',
+                                    transform=ax.transData)
+        ax.add_collection(collection, autolim=False)
+    layer = rasterize_figure(fig, RASTER_DPI)
+    if layer.size != (width, height):
+        layer = layer.resize((width, height))
+    return layer
+
+
+def render_drawings(image, left_drawings=None, right_drawings=None, canvas_size=CANVAS_SIZE):
+    """Return image (a rendered chart) with both eyes' drawings composited on top"""
+    drawings = list(right_drawings or []) + list(left_drawings or [])
+    if not drawings:
+        return image
+    layer = rasterize_drawings(drawings, image.size, canvas_size)
+    return Image.alpha_composite(image.convert("RGBA"), layer).convert("RGB")
@@ -0,0 +1,242 @@
+"""Opt-in timing and I/O instrumentation.
+
+Named spans time a block of code, byte counts track file I/O, and counters
+track events. Each goes into a histogram with fixed buckets in the
+process-wide Recorder and, while a rerun is bound to one with
+session_recorder(), into that session's Recorder too. Recorders export as
+JSONL lines or Prometheus text.
+
+Instrumentation is off unless FUNDUS_INSTRUMENTATION=1 is set or enable()
+is called. When off, span() returns a shared no-op context manager and the
+other calls return after a single flag check.
+"""
+import bisect
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+# Upper bucket bounds: 0.1 ms doubling to ~105 s, and 64 B quadrupling to 64 GiB
+LATENCY_BUCKETS = tuple(0.0001 * 2 ** i for i in range(21))
+BYTES_BUCKETS = tuple(64 * 4 ** i for i in range(16))
+
+_enabled = os.environ.get("FUNDUS_INSTRUMENTATION", "") not in ("", "0")
+_local = threading.local()
+
+
+class Histogram:
+    """Counts of observations per bucket, with their sum"""
+
+    def __init__(self, bounds):
+        """Initialize empty buckets with the given upper bounds (plus +Inf)"""
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        """Add one observation"""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket holding quantile q (an estimate)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else float("inf")
+        return float("inf")
+
+    def to_dict(self):
+        """Return the histogram as plain data"""
+        return {"count": self.count, "sum": self.total, "buckets": list(self.counts)}
+
+
+class Recorder:
+    """Span latencies, byte counts and counters for a process or a session"""
+
+    def __init__(self):
+        """Initialize an empty recorder"""
+        self._lock = threading.Lock()
+        self.spans = {}
+        self.bytes = {}
+        self.counters = {}
+
+    def observe_span(self, name, seconds):
+        """Record one span duration"""
+        with self._lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe_bytes(self, name, size):
+        """Record one transfer of size bytes"""
+        with self._lock:
+            histogram = self.bytes.get(name)
+            if histogram is None:
+                histogram = self.bytes[name] = Histogram(BYTES_BUCKETS)
+            histogram.observe(size)
+
+    def increment(self, name, amount=1):
+        """Add amount to a counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        """Drop everything recorded so far"""
+        with self._lock:
+            self.spans, self.bytes, self.counters = {}, {}, {}
+
+    def summary(self):
+        """Return one row per span and byte histogram with count, mean, p50, p95 and total"""
+        rows = []
+        with self._lock:
+            for kind, histograms in (("span", self.spans), ("bytes", self.bytes)):
+                for name, histogram in sorted(histograms.items()):
+                    rows.append({"kind": kind, "name": name, "count": histogram.count,
+                                 "mean": histogram.total / histogram.count if histogram.count else 0.0,
+                                 "p50": histogram.quantile(0.5), "p95": histogram.quantile(0.95),
+                                 "total": histogram.total})
+        return rows
+
+    def to_jsonl(self, **labels):
+        """Return the recorder as JSONL, one line per metric, stamped with the time and labels"""
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        lines = []
+        with self._lock:
+            for kind, histograms, bounds in (("span", self.spans, LATENCY_BUCKETS),
+                                             ("bytes", self.bytes, BYTES_BUCKETS)):
+                for name, histogram in sorted(histograms.items()):
+                    lines.append(dict(histogram.to_dict(), timestamp=stamp, kind=kind, name=name,
+                                      bounds=list(bounds), **labels))
+            for name, value in sorted(self.counters.items()):
+                lines.append({"timestamp": stamp, "kind": "counter", "name": name, "value": value,
+                              **labels})
+        return "".join(json.dumps(line) + "\n" for line in lines)
+
+    def to_prometheus(self, prefix="fundus"):
+        """Return the recorder in the Prometheus text exposition format"""
+        out = []
+        with self._lock:
+            for metric, unit, histograms in (("span", "seconds", self.spans), ("io", "bytes", self.bytes)):
+                if not histograms:
+                    continue
+                family = f"{prefix}_{metric}_{unit}"
+                out.append(f"# TYPE {family} histogram")
+                for name, histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        out.append(f'{family}_bucket{{name="{name}",le="{le}"}} {cumulative}')
+                    out.append(f'{family}_sum{{name="{name}"}} {histogram.total!r}')
+                    out.append(f'{family}_count{{name="{name}"}} {histogram.count}')
+            if self.counters:
+                out.append(f"# TYPE {prefix}_events_total counter")
+                for name, value in sorted(self.counters.items()):
+                    out.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+        return "\n".join(out) + "\n"
+
+
+PROCESS = Recorder()
+
+
+def enabled():
+    """True if instrumentation is on"""
+    return _enabled
+
+
+def enable(on=True):
+    """Turn instrumentation on (or off)"""
+    global _enabled
+    _enabled = on
+
+
+def _recorders():
+    session = getattr(_local, "session", None)
+    return (PROCESS, session) if session is not None else (PROCESS,)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        for recorder in _recorders():
+            recorder.observe_span(self.name, elapsed)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing a block as span name (a shared no-op when disabled)"""
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    """Decorator timing every call of a function as span name"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_bytes(name, size):
+    """Record a read or write of size bytes"""
+    if not _enabled:
+        return
+    for recorder in _recorders():
+        recorder.observe_bytes(name, size)
+
+
+def count(name, amount=1):
+    """Increment a counter"""
+    if not _enabled:
+        return
+    for recorder in _recorders():
+        recorder.increment(name, amount)
+
+
+@contextlib.contextmanager
+def session_recorder(recorder):
+    """Also record into recorder (a session's Recorder) on this thread inside the block"""
+    previous = getattr(_local, "session", None)
+    _local.session = recorder
+    try:
+        yield recorder
+    finally:
+        _local.session = previous
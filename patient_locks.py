@@ -0,0 +1,74 @@
+"""Per-patient write locks.
+
+Each patient has a re-entrant thread lock, so sessions in one process saving
+different patients never wait for each other, while two saves of the same
+patient run one after the other. The outermost holder also takes an
+exclusive flock on locks/<patient_id>.lock under the data directory. That
+serializes writers in other processes (batch imports, a second app server)
+and other DataManager instances in the same process. The lock files live
+outside the patient tree so backups do not pick them up.
+"""
+import contextlib
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+
+
+class _PatientLock:
+    __slots__ = ("lock", "depth", "fd")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+
+
+class PatientLocks:
+    """Re-entrant per-patient locks backed by lock files for other processes"""
+
+    def __init__(self, lock_directory):
+        """Keep lock files in lock_directory, creating it if needed"""
+        self.lock_directory = lock_directory
+        os.makedirs(lock_directory, exist_ok=True)
+        self._guard = threading.Lock()
+        self._locks = {}
+        self.contended = 0
+
+    def _entry(self, patient_id):
+        with self._guard:
+            entry = self._locks.get(patient_id)
+            if entry is None:
+                entry = self._locks[patient_id] = _PatientLock()
+            return entry
+
+    @contextlib.contextmanager
+    def hold(self, patient_id):
+        """Hold patient_id's write lock for the duration of the block"""
+        entry = self._entry(patient_id)
+        if not entry.lock.acquire(blocking=False):
+            with self._guard:
+                self.contended += 1
+            entry.lock.acquire()
+        try:
+            entry.depth += 1
+            if entry.depth == 1 and fcntl is not None:
+                fd = os.open(os.path.join(self.lock_directory, f"{patient_id}.lock"),
+                             os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except OSError:
+                    os.close(fd)
+                    raise
+                entry.fd = fd
+            yield
+        finally:
+            entry.depth -= 1
+            if entry.depth == 0 and entry.fd is not None:
+                fd, entry.fd = entry.fd, None
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+            entry.lock.release()
@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+
+from atomic_io import resolve_pointer
+
+# Searchable patient fields kept in the registry alongside the patient id
+REGISTRY_FIELDS = ("name", "age", "diagnosis", "last_updated")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    name_lower TEXT NOT NULL DEFAULT '',
+    age TEXT NOT NULL DEFAULT '',
+    diagnosis TEXT NOT NULL DEFAULT '',
+    last_updated TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_patients_name ON patients (name_lower);
+CREATE INDEX IF NOT EXISTS idx_patients_age ON patients (age, patient_id);
+CREATE INDEX IF NOT EXISTS idx_patients_diagnosis ON patients (diagnosis, age, patient_id);
+"""
+
+
+def _prefix_upper_bound(prefix):
+    return prefix + "\U0010ffff"
+
+
+class PatientRegistry:
+    """SQLite index of patients so lookups and searches avoid scanning the patient tree"""
+
+    def __init__(self, db_path):
+        """Open (or create) the registry database at db_path"""
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, patient_id, **fields):
+        """Insert the patient or update the given fields"""
+        fields = {key: str(value or "") for key, value in fields.items() if key in REGISTRY_FIELDS}
+        if "name" in fields:
+            fields["name_lower"] = fields["name"].lower()
+        columns = ["patient_id"] + list(fields)
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+        conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO patients ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(patient_id) {conflict}",
+                [patient_id] + list(fields.values()),
+            )
+
+    def remove(self, patient_id):
+        """Drop a patient from the registry"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM patients WHERE patient_id = ?", (patient_id,))
+
+    def exists(self, patient_id):
+        """Return True if the patient is registered"""
+        row = self._connect().execute(
+            "SELECT 1 FROM patients WHERE patient_id = ?", (patient_id,)).fetchone()
+        return row is not None
+
+    def get(self, patient_id):
+        """Return the registered fields for a patient, or None"""
+        row = self._connect().execute(
+            f"SELECT patient_id, {', '.join(REGISTRY_FIELDS)} FROM patients WHERE patient_id = ?",
+            (patient_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("patient_id",) + REGISTRY_FIELDS, row))
+
+    def count(self):
+        """Return the number of registered patients"""
+        return self._connect().execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+
+    def list_ids(self):
+        """Return all registered patient IDs in sorted order"""
+        rows = self._connect().execute("SELECT patient_id FROM patients ORDER BY patient_id")
+        return [row[0] for row in rows]
+
+    def search(self, id_prefix=None, name_prefix=None, age=None, diagnosis=None, limit=None):
+        """Return registry rows matching every given filter
+
+        Prefix filters on id and name are case-sensitive and case-insensitive
+        respectively, and both are answered from an index range scan.
+        """
+        clauses = []
+        params = []
+        if id_prefix:
+            clauses.append("patient_id >= ? AND patient_id < ?")
+            params += [id_prefix, _prefix_upper_bound(id_prefix)]
+        if name_prefix:
+            prefix = name_prefix.lower()
+            clauses.append("name_lower >= ? AND name_lower < ?")
+            params += [prefix, _prefix_upper_bound(prefix)]
+        if age not in (None, ""):
+            clauses.append("age = ?")
+            params.append(str(age))
+        if diagnosis:
+            clauses.append("diagnosis = ?")
+            params.append(diagnosis)
+        query = f"SELECT patient_id, {', '.join(REGISTRY_FIELDS)} FROM patients"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY patient_id"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        rows = self._connect().execute(query, params)
+        return [dict(zip(("patient_id",) + REGISTRY_FIELDS, row)) for row in rows]
+
+    def refresh(self, patients_dir, patient_ids):
+        """Re-read the given patients from their folders under patients_dir and upsert them"""
+        rows = [_scan_patient(os.path.join(patients_dir, patient_id), patient_id)
+                for patient_id in patient_ids if os.path.isdir(os.path.join(patients_dir, patient_id))]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO patients (patient_id, name, name_lower, age, diagnosis, last_updated) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(patient_id) DO UPDATE SET name = excluded.name, "
+                "name_lower = excluded.name_lower, age = excluded.age, diagnosis = excluded.diagnosis, "
+                "last_updated = excluded.last_updated", rows)
+        return len(rows)
+
+    def reconcile(self, patients_dir):
+        """Register patient folders the registry is missing and drop rows whose folder is gone
+
+        Only folder names are listed, so this stays cheap on a large tree;
+        returns (added, removed) counts.
+        """
+        on_disk = set()
+        if os.path.exists(patients_dir):
+            with os.scandir(patients_dir) as entries:
+                on_disk = {entry.name for entry in entries if entry.is_dir()}
+        registered = set(self.list_ids())
+        added = self.refresh(patients_dir, sorted(on_disk - registered))
+        removed = sorted(registered - on_disk)
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM patients WHERE patient_id = ?", [(pid,) for pid in removed])
+        return added, len(removed)
+
+    def rebuild(self, patients_dir):
+        """Replace the registry contents with a scan of the on-disk patient tree"""
+        with self._connect() as conn:
+            # Hold the write lock while scanning so upserts from other processes are not lost
+            conn.execute("BEGIN IMMEDIATE")
+            rows = []
+            if os.path.exists(patients_dir):
+                with os.scandir(patients_dir) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            rows.append(_scan_patient(entry.path, entry.name))
+            conn.execute("DELETE FROM patients")
+            conn.executemany(
+                "INSERT INTO patients (patient_id, name, name_lower, age, diagnosis, last_updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _read_latest(path):
+    target = resolve_pointer(path)
+    return _read_json(target) if target else {}
+
+
+def _scan_patient(patient_dir, patient_id):
+    snapshot = _read_json(os.path.join(patient_dir, "patient_snapshot.json")).get("data")
+    if snapshot:
+        demographics = record = snapshot
+    else:
+        demographics = _read_latest(os.path.join(patient_dir, "demographics", "demographics_latest.json"))
+        record = _read_latest(os.path.join(patient_dir, "medical_records", "latest_record.json"))
+    name = str(demographics.get("name", "") or "")
+    return (patient_id, name, name.lower(), str(demographics.get("age", "") or ""),
+            str(record.get("diagnosis", "") or ""), str(demographics.get("last_updated", "") or ""))
@@ -0,0 +1,101 @@
+"""Process-wide read cache of loaded patient records.
+
+Entries are keyed by patient ID and tagged with the fingerprint (inode,
+size, modification time) of the snapshot file they were parsed from. A
+lookup passes the fingerprint of the file as it is now, so a snapshot
+replaced by another process is a miss and is read again. DataManager also
+drops a patient's entry after each of its own writes. Every save replaces the
+snapshot by renaming a new file over it, so the fingerprint changes with
+each save.
+
+Callers get their own copy of the record's lists, so a session editing its
+drawings never changes the cached record or another session's copy.
+"""
+import threading
+from collections import OrderedDict
+
+
+def file_fingerprint(stat_result):
+    """Return what identifies one version of a file: (inode, size, mtime in ns)"""
+    return (stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def copy_record(data):
+    """Copy a patient record dict and its lists; list entries are replaced, never edited"""
+    return {key: list(value) if isinstance(value, list) else value for key, value in data.items()}
+
+
+class RecordCache:
+    """Bounded LRU cache of patient records validated by snapshot fingerprint"""
+
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024):
+        """Initialize an empty cache bounded by entry count and snapshot bytes"""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes_held = 0
+
+    def get(self, patient_id, fingerprint):
+        """Return a copy of the cached record if it was read from fingerprint, else None"""
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != fingerprint:
+                # The snapshot changed on disk since it was cached
+                self._entries.pop(patient_id)
+                self.bytes_held -= entry[2]
+                self.stale += 1
+                return None
+            self._entries.move_to_end(patient_id)
+            self.hits += 1
+            data = entry[1]
+        return copy_record(data)
+
+    def put(self, patient_id, fingerprint, data, nbytes):
+        """Cache data as read from the snapshot with fingerprint and evict the least recently used"""
+        with self._lock:
+            old = self._entries.pop(patient_id, None)
+            if old is not None:
+                self.bytes_held -= old[2]
+            self._entries[patient_id] = (fingerprint, data, nbytes)
+            self.bytes_held += nbytes
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                              or self.bytes_held > self.max_bytes):
+                _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                self.bytes_held -= evicted_bytes
+                self.evictions += 1
+
+    def invalidate(self, patient_id):
+        """Drop patient_id's entry, e.g. after writing their record"""
+        with self._lock:
+            entry = self._entries.pop(patient_id, None)
+            if entry is not None:
+                self.bytes_held -= entry[2]
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes_held = 0
+
+    def stats(self):
+        """Return cache counters as a dict"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "bytes_held": self.bytes_held,
+            }
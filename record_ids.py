@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+
+def _process_token():
+    # The pid keeps processes running together apart; 32 random bits cover a reused pid or
+    # another host writing to the same tree
+    return f"{os.getpid()}-{os.urandom(4).hex()}"
+
+
+# Distinguishes IDs made by concurrent processes within the same microsecond
+PROCESS_TOKEN = _process_token()
+
+
+class RecordIdGenerator:
+    """Monotonic, sortable IDs for record file names
+
+    An ID reads as YYYYmmdd_HHMMSS_microseconds_sequence_process, e.g.
+    20250303_101500_123456_000_4242-9f1c03ab. Within a process IDs strictly increase
+    even if the clock stalls or steps back: a repeated microsecond bumps the
+    sequence. IDs sort after the older second-resolution names
+    (20250303_101500) made in the same second.
+    """
+
+    def __init__(self, token=None):
+        """Create a generator whose IDs end in token (default: this process's PROCESS_TOKEN)"""
+        self.token = token or PROCESS_TOKEN
+        self._lock = threading.Lock()
+        self._last = 0
+        self._sequence = 0
+
+    def next_id(self):
+        """Return the next ID"""
+        with self._lock:
+            now = time.time_ns() // 1000
+            if now > self._last:
+                self._last = now
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence > 999:
+                    self._last += 1
+                    self._sequence = 0
+            micros, sequence = self._last, self._sequence
+        stamp = datetime.fromtimestamp(micros // 1_000_000).strftime("%Y%m%d_%H%M%S")
+        return f"{stamp}_{micros % 1_000_000:06d}_{sequence:03d}_{self.token}"
+
+
+_generator = RecordIdGenerator()
+
+
+def _new_token_after_fork():
+    # A forked child (e.g. a ProcessPoolExecutor worker) would otherwise share its
+    # parent's token, and its generator lock may have been held by another thread
+    global PROCESS_TOKEN, _generator
+    PROCESS_TOKEN = _process_token()
+    _generator = RecordIdGenerator()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_new_token_after_fork)
+
+
+def new_record_id():
+    """Return the next process-wide record ID"""
+    return _generator.next_id()
@@ -1,13 +1,27 @@
 # app.py
 import streamlit as st
 from streamlit_drawable_canvas import st_canvas
-import matplotlib.pyplot as plt
-import numpy as np
 from PIL import Image
-import io
 import json
 from data_manager import DataManager
+from chart_cache import ChartCache, chart_cache_key
+from canvas_diff import DRAWABLE_TYPES, ChangeSet, CanvasDiffer
+from autosave import Autosaver
+from drawing_history import DrawingHistory
+from record_ids import new_record_id
+import instrumentation
+from instrumentation import span
+# chart_template, chart_rendering and chart_export pull in matplotlib, so they are
+# imported where first needed to let the page start drawing sooner
+import os
+import queue
 import base64
+from datetime import datetime
+
+# Undo/redo memory per session, split between the two eyes
+HISTORY_BYTES_PER_SESSION = 8 * 1024 * 1024
+# Newest saved charts shown as thumbnails
+GALLERY_LIMIT = 12
 
 # Initialize session state with default values
 if 'app_state' not in st.session_state:
@@ -26,23 +40,28 @@ if 'app_state' not in st.session_state:
         'left_drawings': [],
         'right_drawings': [],
         'legend_data': [],
-        'left_history': [],
-        'right_history': [],
+        'left_history': DrawingHistory(max_bytes=HISTORY_BYTES_PER_SESSION // 2),
+        'right_history': DrawingHistory(max_bytes=HISTORY_BYTES_PER_SESSION // 2),
         'drawing_mode': 'line',
         'editing_mode': 'draw',
         'drawing_color': 'red',
         'fill_type': 'none',
         'opacity': 0.7,
         'line_width': 2,
-        'current_eye': None
+        'current_eye': None,
+        'export_jobs': [],
+        'autosave_patient': None,
+        # Autosave keeps each browser session's view of a patient apart
+        'session_id': new_record_id(),
+        'canvas_differs': {'left': CanvasDiffer('left'), 'right': CanvasDiffer('right')}
     }
 
 def main():
     st.set_page_config(page_title="Retinal Fundus Chart Generator", layout="wide")
     st.title("Retinal Fundus Chart Generator")
 
-    # Initialize DataManager
-    data_manager = DataManager("patient_data")
+    # One DataManager per process, shared by every session and rerun
+    data_manager = get_data_manager("patient_data")
 
     # Sidebar for patient info
     with st.sidebar:
@@ -93,6 +112,9 @@ def main():
         # Patient management buttons
         if st.button("Load Patient"):
             if patient_id:
+                session_id = st.session_state.app_state['session_id']
+                # This session's unsaved edits go to disk before the record is read back
+                get_autosaver(data_manager.base_directory).flush(patient_id, session_id)
                 patient_data = data_manager.load_patient(patient_id)
                 if patient_data:
                     st.session_state.app_state.update({
@@ -111,6 +133,12 @@ def main():
                         'right_drawings': patient_data.get("right_drawings", []),
                         'legend_data': patient_data.get("legend_data", [])
                     })
+                    load_canvas("right", st.session_state.app_state['right_drawings'])
+                    load_canvas("left", st.session_state.app_state['left_drawings'])
+                    # Edits to a loaded patient are autosaved from here on
+                    get_autosaver(data_manager.base_directory).track(patient_id, current_patient_record(patient_id),
+                                                                      session_id)
+                    st.session_state.app_state['autosave_patient'] = patient_id
                     st.success(f"Loaded patient {patient_id}")
                 else:
                     st.error("Patient not found")
@@ -119,26 +147,18 @@ def main():
         
         if st.button("Save Patient"):
             if patient_id:
-                patient_data = {
-                    "id": patient_id,
-                    "name": st.session_state.app_state['patient_name'],
-                    "age": st.session_state.app_state['patient_age'],
-                    "diagnosis": st.session_state.app_state['diagnosis'],
-                    "diagnosis_other": st.session_state.app_state['diagnosis_other'],
-                    "left_eye": st.session_state.app_state['left_eye'],
-                    "right_eye": st.session_state.app_state['right_eye'],
-                    "va_right": st.session_state.app_state['va_right'],
-                    "va_left": st.session_state.app_state['va_left'],
-                    "iop_right": st.session_state.app_state['iop_right'],
-                    "iop_left": st.session_state.app_state['iop_left'],
-                    "left_drawings": st.session_state.app_state['left_drawings'],
-                    "right_drawings": st.session_state.app_state['right_drawings'],
-                    "legend_data": st.session_state.app_state['legend_data'],
-                    "provider": "Streamlit User"
-                }
-                data_manager.save_complete_patient_record(patient_id, patient_data)
+                # Writes only the components changed since this session loaded or saved the patient
+                tracked = st.session_state.app_state.get('autosave_patient') == patient_id
+                autosaver = get_autosaver(data_manager.base_directory)
+                autosaver.save_now(patient_id, current_patient_record(patient_id), changed_only=tracked,
+                                   session=st.session_state.app_state['session_id'])
+                st.session_state.app_state['autosave_patient'] = patient_id
                 st.session_state.app_state['current_patient'] = patient_id
-                st.success(f"Saved patient {patient_id}")
+                failure = autosaver.last_failure(patient_id)
+                if failure:
+                    st.error(f"Could not save patient {patient_id}: {failure}")
+                else:
+                    st.success(f"Saved patient {patient_id}")
             else:
                 st.error("Please enter a Patient ID")
 
@@ -158,9 +178,12 @@ def main():
                 'left_drawings': [],
                 'right_drawings': [],
                 'legend_data': [],
-                'left_history': [],
-                'right_history': []
+                'left_history': DrawingHistory(max_bytes=HISTORY_BYTES_PER_SESSION // 2),
+                'right_history': DrawingHistory(max_bytes=HISTORY_BYTES_PER_SESSION // 2),
+                'autosave_patient': None
             })
+            load_canvas("right", st.session_state.app_state['right_drawings'])
+            load_canvas("left", st.session_state.app_state['left_drawings'])
             st.experimental_rerun()
 
     # Main content area
@@ -186,26 +209,16 @@ def main():
         line_width = st.slider("Width", 1, 10, 2, label_visibility="collapsed", key="width_slider")
         st.session_state.app_state['line_width'] = line_width
 
-        # Generate base chart
-        fig = generate_base_chart(
-            st.session_state.app_state['patient_name'],
-            st.session_state.app_state['current_patient'],
-            st.session_state.app_state['patient_age'],
-            st.session_state.app_state['diagnosis'],
-            st.session_state.app_state['diagnosis_other'],
-            st.session_state.app_state['left_eye'],
-            st.session_state.app_state['right_eye'],
-            st.session_state.app_state['va_left'],
-            st.session_state.app_state['va_right'],
-            st.session_state.app_state['iop_left'],
-            st.session_state.app_state['iop_right']
-        )
-        
-        # Convert Matplotlib figure to image for canvas background
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=100, bbox_inches='tight')
-        buf.seek(0)
-        img = Image.open(buf)
+        canvas_width = 400  # Reduced width for side-by-side display
+        canvas_height = 400
+
+        # Generate base chart (cached on the header fields and legend, already canvas-sized)
+        with span("app.canvas_background"):
+            img = get_canvas_background(
+                chart_header(st.session_state.app_state['current_patient']),
+                st.session_state.app_state['legend_data'],
+                (canvas_width, canvas_height)
+            )
         
         # Display canvases side by side
         col_right, col_left = st.columns(2)
@@ -227,48 +240,55 @@ def main():
         elif drawing_mode == "dot":
             drawing_mode = "point"
 
-        canvas_width = 400  # Reduced width for side-by-side display
-        canvas_height = 400
-        
         with col_right:
             st.write("Right Eye (O.D.)")
-            right_canvas_result = st_canvas(
-                fill_color=f"rgba({','.join(map(str, Image.new('RGB', (1,1), stroke_color).getpixel((0,0))))},{opacity})" if fill_type == "solid" else "rgba(0,0,0,0)",
-                stroke_width=stroke_width,
-                stroke_color=stroke_color,
-                background_image=img,
-                update_streamlit=True,
-                height=canvas_height,
-                width=canvas_width,
-                drawing_mode=drawing_mode if edit_mode == "Draw" else "transform",
-                key="right_canvas",
-                display_toolbar=True,
-            )
+            show_history_controls("right")
+            with span("app.st_canvas.right"):
+                right_canvas_result = st_canvas(
+                    fill_color=f"rgba({','.join(map(str, Image.new('RGB', (1,1), stroke_color).getpixel((0,0))))},{opacity})" if fill_type == "solid" else "rgba(0,0,0,0)",
+                    stroke_width=stroke_width,
+                    stroke_color=stroke_color,
+                    background_image=img,
+                    update_streamlit=True,
+                    height=canvas_height,
+                    width=canvas_width,
+                    drawing_mode=drawing_mode if edit_mode == "Draw" else "transform",
+                    initial_drawing=st.session_state.app_state.get('right_canvas_drawing'),
+                    key=f"right_canvas_{st.session_state.app_state.get('right_canvas_nonce', 0)}",
+                    display_toolbar=True,
+                )
 
         with col_left:
             st.write("Left Eye (O.S.)")
-            left_canvas_result = st_canvas(
-                fill_color=f"rgba({','.join(map(str, Image.new('RGB', (1,1), stroke_color).getpixel((0,0))))},{opacity})" if fill_type == "solid" else "rgba(0,0,0,0)",
-                stroke_width=stroke_width,
-                stroke_color=stroke_color,
-                background_image=img,
-                update_streamlit=True,
-                height=canvas_height,
-                width=canvas_width,
-                drawing_mode=drawing_mode if edit_mode == "Draw" else "transform",
-                key="left_canvas",
-                display_toolbar=True,
-            )
+            show_history_controls("left")
+            with span("app.st_canvas.left"):
+                left_canvas_result = st_canvas(
+                    fill_color=f"rgba({','.join(map(str, Image.new('RGB', (1,1), stroke_color).getpixel((0,0))))},{opacity})" if fill_type == "solid" else "rgba(0,0,0,0)",
+                    stroke_width=stroke_width,
+                    stroke_color=stroke_color,
+                    background_image=img,
+                    update_streamlit=True,
+                    height=canvas_height,
+                    width=canvas_width,
+                    drawing_mode=drawing_mode if edit_mode == "Draw" else "transform",
+                    initial_drawing=st.session_state.app_state.get('left_canvas_drawing'),
+                    key=f"left_canvas_{st.session_state.app_state.get('left_canvas_nonce', 0)}",
+                    display_toolbar=True,
+                )
 
-        # Process canvas drawings
-        if right_canvas_result.json_data:
-            process_canvas_data(right_canvas_result.json_data, "right")
-        if left_canvas_result.json_data:
-            process_canvas_data(left_canvas_result.json_data, "left")
+        # Process canvas drawings, keeping only what changed since the last rerun
+        canvas_changes = st.session_state.app_state['canvas_changes'] = {}
+        with span("app.process_canvas_data"):
+            if right_canvas_result.json_data:
+                canvas_changes["right"] = process_canvas_data(right_canvas_result.json_data, "right")
+            if left_canvas_result.json_data:
+                canvas_changes["left"] = process_canvas_data(left_canvas_result.json_data, "left")
 
         # Chart controls
         if st.button("Save Chart"):
             save_chart(data_manager, patient_id)
+        show_export_status(data_manager)
+        show_chart_gallery(data_manager, patient_id)
 
     with col2:
         st.subheader("Legend")
@@ -286,138 +306,282 @@ def main():
         for i, item in enumerate(st.session_state.app_state['legend_data']):
             st.write(f"{item['label']} - {item['color']}")
 
-def generate_base_chart(name, pid, age, diagnosis, diagnosis_other, left_eye, right_eye, 
-                       va_left, va_right, iop_left, iop_right):
-    fig = plt.figure(figsize=(10, 5))
-    gs = fig.add_gridspec(1, 3)
-    
-    right_ax = fig.add_subplot(gs[0, 0], aspect='equal')
-    left_ax = fig.add_subplot(gs[0, 1], aspect='equal')
-    legend_ax = fig.add_subplot(gs[0, 2])
-    legend_ax.axis('off')
-    
-    draw_eye_chart(right_ax, "Right Eye", right_eye, va_right, iop_right)
-    draw_eye_chart(left_ax, "Left Eye", left_eye, va_left, iop_left)
-    
-    diag_text = diagnosis if diagnosis != "Other" else f"Other: {diagnosis_other}"
-    fig.suptitle(f"Patient: {name} | ID: {pid} | Age: {age} | Diagnosis: {diag_text}", fontsize=9)
-    
-    draw_legend(legend_ax)
-    
-    fig.tight_layout()
-    return fig
+    with span("app.autosave"):
+        autosave(data_manager, patient_id)
+    if instrumentation.enabled():
+        show_instrumentation_panel()
 
-def draw_eye_chart(ax, title, findings, va, iop):
-    ax.clear()
-    
-    # Draw the concentric circles
-    outer_circle = plt.Circle((0, 0), 1.0, fill=False, color='black')
-    middle_circle = plt.Circle((0, 0), 0.8, fill=False, color='black')
-    inner_circle = plt.Circle((0, 0), 0.6, fill=False, color='black')
-    ax.add_patch(outer_circle)
-    ax.add_patch(middle_circle)
-    ax.add_patch(inner_circle)
-    
-    # Draw clock hour markings AND radial lines
-    for hour in range(1, 13):
-        angle = np.radians(90 - hour * 30)  # Start from top (12 o'clock)
-        
-        # Add hour markers
-        x_label = 1.1 * np.cos(angle)
-        y_label = 1.1 * np.sin(angle)
-        ax.text(x_label, y_label, f"{hour}", ha='center', va='center', fontsize=8)
-        
-        # Draw the radial lines
-        x1, y1 = 0.4 * np.cos(angle), 0.4 * np.sin(angle)  # Start at inner circle (0.4)
-        x2, y2 = 1.0 * np.cos(angle), 1.0 * np.sin(angle)  # End at outer circle (1.0)
-        ax.plot([x1, x2], [y1, y2], 'k-', linewidth=0.5)
-    
-    # Set title and additional info (O.D. and O.S.)
-    eye_abbr = "O.D." if title == "Right Eye" else "O.S."
-    ax.set_title(f"{eye_abbr}\nVA: {va} | IOP: {iop} mmHg", fontsize=8, pad=10)
-    
-    # Add date and patient info at bottom (matching the image)
-    current_date = "2025-03-03"  # Fixed date as per image
-    ax.text(0, -1.3, f"Date: {current_date}", fontsize=6, ha='center')
-    ax.text(0, -1.45, f"Number: {st.session_state.app_state.get('current_patient', '')}", fontsize=6, ha='center')
-    ax.text(0, -1.6, f"Name: {st.session_state.app_state.get('patient_name', '')}", fontsize=6, ha='center')
-    
-    # Set plot limits and remove axes
-    ax.set_xlim(-1.5, 1.5)
-    ax.set_ylim(-1.5, 1.5)
-    ax.axis('off')
+@st.cache_resource
+def get_data_manager(base_directory):
+    """Process-wide DataManager, so reruns skip directory setup and registry checks"""
+    return DataManager(base_directory)
+
+@st.cache_resource
+def get_autosaver(base_directory):
+    """Process-wide background autosave of loaded or saved patients"""
+    return Autosaver(get_data_manager(base_directory), debounce=2.0, max_staleness=10.0,
+                     max_write_rate=0.5)
+
+def current_patient_record(patient_id):
+    """Collect the record that Save Patient and autosave write"""
+    state = st.session_state.app_state
+    return {
+        "id": patient_id,
+        "name": state['patient_name'],
+        "age": state['patient_age'],
+        "diagnosis": state['diagnosis'],
+        "diagnosis_other": state['diagnosis_other'],
+        "left_eye": state['left_eye'],
+        "right_eye": state['right_eye'],
+        "va_right": state['va_right'],
+        "va_left": state['va_left'],
+        "iop_right": state['iop_right'],
+        "iop_left": state['iop_left'],
+        "left_drawings": state['left_drawings'],
+        "right_drawings": state['right_drawings'],
+        "legend_data": state['legend_data'],
+        "provider": "Streamlit User"
+    }
+
+def autosave(data_manager, patient_id):
+    """Queue this rerun's edits to the loaded patient and show the autosave status"""
+    if not patient_id or st.session_state.app_state.get('autosave_patient') != patient_id:
+        return
+    session_id = st.session_state.app_state['session_id']
+    autosaver = get_autosaver(data_manager.base_directory)
+    autosaver.record(patient_id, current_patient_record(patient_id), session_id)
+    failure = autosaver.last_failure(patient_id)
+    if failure:
+        st.sidebar.error(f"Autosave failed, retrying: {failure}")
+    elif autosaver.pending(patient_id, session_id):
+        st.sidebar.caption("Unsaved changes, autosave pending")
+    elif autosaver.last_saved(patient_id):
+        saved_at = datetime.fromtimestamp(autosaver.last_saved(patient_id)).strftime("%H:%M:%S")
+        st.sidebar.caption(f"Last saved at {saved_at}")
+
+@st.cache_resource
+def get_chart_cache():
+    """Process-wide cache of rendered background charts"""
+    return ChartCache(max_entries=32)
+
+@st.cache_resource
+def get_template_renderer():
+    """Process-wide renderer holding the rasterized chart templates"""
+    from chart_template import TemplateChartRenderer
+    return TemplateChartRenderer()
+
+def chart_header(pid):
+    """Collect the patient header fields that appear on the chart"""
+    state = st.session_state.app_state
+    return {
+        "name": state['patient_name'],
+        "pid": pid,
+        "age": state['patient_age'],
+        "diagnosis": state['diagnosis'],
+        "diagnosis_other": state['diagnosis_other'],
+        "left_eye": state['left_eye'],
+        "right_eye": state['right_eye'],
+        "va_left": state['va_left'],
+        "va_right": state['va_right'],
+        "iop_left": state['iop_left'],
+        "iop_right": state['iop_right'],
+    }
+
+def get_base_chart_image(header, legend_data, dpi=100):
+    """Return the background chart as a PIL image, rendering only on a cache miss"""
+    def render():
+        from chart_rendering import render_chart
+        image = render_chart(header, legend_data, dpi, renderer=get_template_renderer())
+        return image, image.width * image.height * len(image.getbands())
+    return get_chart_cache().get_or_render(header, legend_data, dpi, render)
+
+def get_canvas_background(header, legend_data, size):
+    """Return the base chart scaled to the canvas once, so st_canvas does not resize it every rerun"""
+    cache = get_chart_cache()
+    key = f"{chart_cache_key(header, legend_data, 100)}-{size[0]}x{size[1]}"
+    image = cache.get(key)
+    if image is None:
+        image = get_base_chart_image(header, legend_data, dpi=100).resize(size)
+        cache.put(key, image, image.width * image.height * len(image.getbands()))
+    return image
+
+def get_canvas_differ(eye):
+    """Return the session's CanvasDiffer for an eye"""
+    differ = st.session_state.app_state.setdefault('canvas_differs', {}).get(eye)
+    if differ is None:
+        differ = st.session_state.app_state['canvas_differs'][eye] = CanvasDiffer(eye)
+    return differ
+
+def get_drawing_history(eye):
+    """Return the session's undo/redo history for an eye"""
+    history = st.session_state.app_state.get(f'{eye}_history')
+    if not isinstance(history, DrawingHistory):
+        history = st.session_state.app_state[f'{eye}_history'] = DrawingHistory(
+            max_bytes=HISTORY_BYTES_PER_SESSION // 2)
+    return history
+
+def reload_canvas(eye, objects):
+    """Show objects on an eye's canvas
+
+    st_canvas only reloads when initial_drawing differs from the last one it
+    loaded, so the canvas key gets a new nonce to remount it every time.
+    """
+    state = st.session_state.app_state
+    state[f'{eye}_canvas_drawing'] = {"version": "4.4.0", "objects": objects}
+    state[f'{eye}_canvas_nonce'] = state.get(f'{eye}_canvas_nonce', 0) + 1
+
+def load_canvas(eye, drawings):
+    """Point an eye's canvas, differ and history at a patient's drawings, e.g. after Load Patient"""
+    reload_canvas(eye, get_canvas_differ(eye).load(drawings))
+    get_drawing_history(eye).clear()
+    # Until the remounted canvas reports the loaded objects, what it sends is not an edit
+    st.session_state.app_state[f'{eye}_loading'] = True
+
+def show_history_controls(eye):
+    """Undo/redo buttons for an eye; a click reloads the canvas from the restored objects"""
+    history = get_drawing_history(eye)
+    undo = st.button("Undo", key=f"{eye}_undo", disabled=not history.can_undo)
+    redo = st.button("Redo", key=f"{eye}_redo", disabled=not history.can_redo)
+    differ = get_canvas_differ(eye)
+    if (undo and history.undo(differ)) or (redo and history.redo(differ)):
+        # Remounted, the canvas drops the undone objects and reports the restored ones
+        reload_canvas(eye, differ.objects())
 
 def process_canvas_data(canvas_data, eye):
-    drawings = st.session_state.app_state[f'{eye}_drawings']
+    """Apply the objects that changed on an eye's canvas and return the ChangeSet"""
+    state = st.session_state.app_state
+    drawings = state[f'{eye}_drawings']
     objects = canvas_data.get("objects", [])
-    
-    # Clear existing drawings for this eye
-    drawings.clear()
-    
-    for obj in objects:
-        if obj["type"] in ["path", "rect", "line", "circle", "point"]:
-            color = f"#{obj['stroke'][1:]}" if obj['stroke'].startswith('#') else obj['stroke']
-            drawing_data = {
-                "type": obj["type"],
-                "color": color,
-                "width": obj["strokeWidth"],
-                "alpha": obj.get("opacity", st.session_state.app_state['opacity'])
-            }
-            
-            if obj["type"] == "path":
-                drawing_data["points"] = obj["path"]
-                drawing_data["type"] = "freehand"
-            elif obj["type"] == "rect":
-                drawing_data["coords"] = ((obj["left"], obj["top"]), obj["width"], obj["height"])
-                drawing_data["fill"] = "solid" if obj["fill"] != "transparent" else "none"
-            elif obj["type"] == "line":
-                drawing_data["coords"] = ((obj["x1"], obj["y1"]), (obj["x2"], obj["y2"]))
-            elif obj["type"] == "circle":
-                drawing_data["coords"] = ((obj["left"] + obj["radius"], obj["top"] + obj["radius"]), obj["radius"])
-                drawing_data["fill"] = "solid" if obj["fill"] != "transparent" else "none"
-            elif obj["type"] == "point":
-                drawing_data["coords"] = (obj["left"], obj["top"])
-                drawing_data["radius"] = 5  # Fixed size for dot
-            
-            drawings.append(drawing_data)
-
-def draw_legend(ax):
-    y_pos = 0.9
-    for item in st.session_state.app_state['legend_data']:
-        if item["fill_type"] == "none":
-            ax.plot([0.1, 0.3], [y_pos, y_pos], color=item["color"], linewidth=item["line_width"])
-        else:
-            rect = plt.Rectangle((0.1, y_pos-0.03), 0.2, 0.06, color=item["color"], 
-                               alpha=item["alpha"], linewidth=item["line_width"])
-            ax.add_patch(rect)
-        ax.text(0.35, y_pos, item["label"], va='center', fontsize=9)
-        y_pos -= 0.1
+    differ = get_canvas_differ(eye)
+    if state.get(f'{eye}_loading'):
+        if drawings and not any(obj.get("type") in DRAWABLE_TYPES for obj in objects):
+            return ChangeSet(eye)
+        state[f'{eye}_loading'] = False
+        if differ.adopt(objects):
+            return ChangeSet(eye)
+    changes = differ.apply(objects, drawings, state['opacity'])
+    history = get_drawing_history(eye)
+    if changes.full_rebuild:
+        history.clear()
+    elif changes.edit is not None:
+        history.record(changes.edit)
+    return changes
+
+@st.cache_resource
+def get_export_queue(base_directory):
+    """Process-wide background worker for 300-dpi chart exports"""
+    from chart_export import ChartExportQueue
+    return ChartExportQueue(get_data_manager(base_directory), max_pending=8,
+                            renderer=get_template_renderer(),
+                            previews=get_preview_worker(base_directory))
+
+@st.cache_resource
+def get_preview_store(base_directory):
+    """Process-wide store of chart thumbnails and previews"""
+    from chart_previews import PreviewStore
+    return PreviewStore(base_directory)
+
+@st.cache_resource
+def get_preview_worker(base_directory):
+    """Process-wide background builder of previews for newly saved charts"""
+    from chart_previews import PreviewWorker
+    return PreviewWorker(get_preview_store(base_directory))
 
 def save_chart(data_manager, patient_id):
     if not patient_id:
         st.error("Please enter a patient ID first")
         return
     
-    fig = generate_base_chart(
-        st.session_state.app_state['patient_name'],
-        patient_id,
-        st.session_state.app_state['patient_age'],
-        st.session_state.app_state['diagnosis'],
-        st.session_state.app_state['diagnosis_other'],
-        st.session_state.app_state['left_eye'],
-        st.session_state.app_state['right_eye'],
-        st.session_state.app_state['va_left'],
-        st.session_state.app_state['va_right'],
-        st.session_state.app_state['iop_left'],
-        st.session_state.app_state['iop_right']
-    )
-    
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=300, bbox_inches='tight')
-    buf.seek(0)
-    image_bytes = buf.getvalue()
-    filename = data_manager.save_chart_image(patient_id, image_bytes)
-    st.success(f"Chart saved as {filename}")
+    export_queue = get_export_queue(data_manager.base_directory)
+    try:
+        job = export_queue.submit(patient_id, chart_header(patient_id),
+                                  st.session_state.app_state['legend_data'], dpi=300,
+                                  left_drawings=st.session_state.app_state['left_drawings'],
+                                  right_drawings=st.session_state.app_state['right_drawings'])
+    except queue.Full:
+        st.warning("Chart export queue is busy, please try again in a moment")
+        return
+    jobs = st.session_state.app_state.setdefault('export_jobs', [])
+    if job.job_id not in jobs:
+        jobs.append(job.job_id)
+    st.info("Chart export queued")
+
+def show_export_status(data_manager):
+    """Report progress of this session's background chart exports"""
+    jobs = st.session_state.app_state.setdefault('export_jobs', [])
+    if not jobs:
+        return
+    from chart_export import JOB_DONE, JOB_FAILED
+    export_queue = get_export_queue(data_manager.base_directory)
+    for job_id in list(jobs):
+        job = export_queue.get_job(job_id)
+        if job is None:
+            jobs.remove(job_id)
+        elif job.status == JOB_DONE:
+            st.success(f"Chart saved as {job.filename}")
+            jobs.remove(job_id)
+        elif job.status == JOB_FAILED:
+            st.error(f"Chart export failed: {job.error}")
+            jobs.remove(job_id)
+        else:
+            st.progress(job.progress, text=f"Exporting chart for {job.patient_id} ({job.status})")
+
+def show_chart_gallery(data_manager, patient_id):
+    """Thumbnails of the patient's saved charts, newest first, once the user opens the gallery"""
+    images = data_manager.list_chart_images(patient_id) if patient_id else []
+    if not images or not st.toggle(f"Show saved charts ({len(images)})", key="chart_gallery"):
+        return
+    store = get_preview_store(data_manager.base_directory)
+    worker = get_preview_worker(data_manager.base_directory)
+    for path in images[:GALLERY_LIMIT]:
+        name = os.path.basename(path)
+        try:
+            thumb = store.cached_path(path, "thumb")
+        except OSError:
+            st.caption(f"{name} (preview unavailable)")
+            continue
+        if thumb is not None:
+            st.image(thumb, caption=name)
+        else:
+            # Charts saved before previews existed are built in the background, not on this rerun
+            worker.submit(path)
+            st.caption(f"{name} (preview being prepared)")
+    if len(images) > GALLERY_LIMIT:
+        st.caption(f"{len(images) - GALLERY_LIMIT} older charts not shown")
+
+def get_session_recorder():
+    """This session's instrumentation Recorder"""
+    recorder = st.session_state.app_state.get('instrumentation')
+    if recorder is None:
+        recorder = st.session_state.app_state['instrumentation'] = instrumentation.Recorder()
+    return recorder
+
+def show_instrumentation_panel():
+    """Debug sidebar panel with span latencies, I/O sizes and counters"""
+    with st.sidebar.expander("Performance (debug)"):
+        scope = st.radio("Scope", ["Session", "Process"], horizontal=True, key="instrumentation_scope")
+        recorder = get_session_recorder() if scope == "Session" else instrumentation.PROCESS
+        rows = []
+        for row in recorder.summary():
+            scale, unit = (1000, "ms") if row["kind"] == "span" else (1, "B")
+            rows.append({"name": row["name"], "count": row["count"],
+                         "mean": f"{row['mean'] * scale:,.1f} {unit}",
+                         "p50": f"{row['p50'] * scale:,.1f} {unit}",
+                         "p95": f"{row['p95'] * scale:,.1f} {unit}"})
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        for name, value in sorted(recorder.counters.items()):
+            st.caption(f"{name}: {value}")
+        st.download_button("Export JSONL", recorder.to_jsonl(scope=scope.lower()),
+                           file_name="instrumentation.jsonl", mime="application/jsonl")
+        st.download_button("Export Prometheus", recorder.to_prometheus(),
+                           file_name="instrumentation.prom", mime="text/plain")
+        if st.button("Reset", key="instrumentation_reset"):
+            recorder.reset()
 
 if __name__ == "__main__":
-    main()
+    if instrumentation.enabled():
+        with instrumentation.session_recorder(get_session_recorder()), span("app.rerun"):
+            main()
+    else:
+        main()
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import streamlit as st
+import streamlit_drawable_canvas
+from streamlit.testing.v1 import AppTest
+from streamlit_drawable_canvas import CanvasResult
+
+from autosave import Autosaver
+
+APP_PATH = os.path.join(ROOT, "streamlit_app.py")
+
+
+class FakeCanvas:
+    """Stands in for st_canvas, loading initial_drawing the way the frontend does
+
+    The frontend only reloads when initial_drawing differs from the drawing
+    it last loaded under the same key. It then reports the loaded drawing,
+    which the script sees on its next run, as the component value.
+    """
+
+    def __init__(self):
+        """Start with no canvases mounted"""
+        self.loaded = {}
+        self.objects = {}
+        self.reported = {}
+        self.keys = {}
+
+    def __call__(self, initial_drawing=None, key=None, **kwargs):
+        value = self.reported.get(key)
+        drawing = {"version": "4.4.0"} if initial_drawing is None else dict(initial_drawing)
+        if drawing != self.loaded.get(key, {}):
+            self.loaded[key] = drawing
+            self.objects[key] = list(drawing.get("objects", []))
+            self.reported[key] = {"version": "4.4.0", "objects": list(self.objects[key])}
+        self.keys[key.split("_")[0]] = key
+        return CanvasResult(None, value)
+
+    def shown(self, eye):
+        """Objects on an eye's canvas as the user sees it"""
+        return self.objects[self.keys[eye]]
+
+    def draw(self, eye, obj):
+        """Add an object to an eye's canvas as the user would"""
+        key = self.keys[eye]
+        self.objects[key].append(obj)
+        self.reported[key] = {"version": "4.4.0", "objects": list(self.objects[key])}
+
+
+@pytest.fixture
+def autosavers(monkeypatch):
+    """Every Autosaver the app starts, closed (and so flushed) after the test"""
+    started = []
+    init = Autosaver.__init__
+
+    def capture(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        started.append(self)
+
+    monkeypatch.setattr(Autosaver, "__init__", capture)
+    yield started
+    for autosaver in started:
+        autosaver.close()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, autosavers):
+    """The app run in tmp_path with a FakeCanvas; returns (AppTest, canvas)"""
+    monkeypatch.chdir(tmp_path)
+    canvas = FakeCanvas()
+    monkeypatch.setattr(streamlit_drawable_canvas, "st_canvas", canvas)
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    yield at, canvas
+    for autosaver in autosavers:
+        autosaver.close()
+    st.cache_resource.clear()
@@ -0,0 +1,55 @@
+import json
+
+from audit_query import AuditIndex, scan_entries
+from data_manager import DataManager
+
+
+def entry(timestamp, patient_id, action_type="data_access", user="dr_a"):
+    return {"timestamp": timestamp, "patient_id": patient_id, "action_type": action_type,
+            "description": "", "user": user}
+
+
+def write_log(directory, month, entries, tail=""):
+    with open(directory / f"audit_log_{month}.jsonl", 'a') as f:
+        f.write("".join(json.dumps(item) + "\n" for item in entries) + tail)
+
+
+def test_index_matches_a_scan_and_picks_up_appended_lines(tmp_path):
+    write_log(tmp_path, "2025_01", [entry("2025-01-05 09:00:00", "P1"),
+                                    entry("2025-01-06 09:00:00", "P2", "backup_created")])
+    write_log(tmp_path, "2025_02", [entry("2025-02-01 10:00:00", "P1", user="dr_b")],
+              tail='{"timestamp": "2025-02-01 11:')
+    index = AuditIndex(str(tmp_path))
+    try:
+        for filters in ({}, {"patient_id": "P1"}, {"action_type": "backup_created"},
+                        {"user": "dr_b"}, {"since": "2025-01-06", "until": "2025-01-31"}):
+            assert list(index.query(**filters)) == list(scan_entries(str(tmp_path), **filters))
+        # The unfinished line is left for the next refresh
+        assert index.count() == 3
+
+        write_log(tmp_path, "2025_02", [], tail='30:00", "patient_id": "P3"}\n')
+        assert [item["patient_id"] for item in index.query(newest_first=True, limit=2)] == ["P3", "P1"]
+        assert index.count(patient_id="P3") == 1
+    finally:
+        index.close()
+
+
+def test_a_replaced_log_file_is_indexed_again(tmp_path):
+    write_log(tmp_path, "2025_03", [entry("2025-03-01 08:00:00", f"P{n}") for n in range(5)])
+    index = AuditIndex(str(tmp_path))
+    try:
+        assert index.count() == 5
+        (tmp_path / "audit_log_2025_03.jsonl").write_text(json.dumps(entry("2025-03-02 08:00:00", "P9")) + "\n")
+        assert [item["patient_id"] for item in index.query()] == ["P9"]
+    finally:
+        index.close()
+
+
+def test_data_manager_reuses_one_index_per_thread(tmp_path):
+    manager = DataManager(str(tmp_path / "data"))
+    manager.log_change("SYSTEM", "backup_created", "first")
+    assert len(list(manager.query_audit_log(action_type="backup_created"))) == 1
+    index = manager._audit_indexes.index
+    manager.log_change("SYSTEM", "backup_created", "second")
+    assert len(list(manager.query_audit_log(action_type="backup_created"))) == 2
+    assert manager._audit_indexes.index is index
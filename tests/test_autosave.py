@@ -0,0 +1,72 @@
+import time
+
+from autosave import Autosaver
+from data_manager import DataManager
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_thread_survives_unexpected_errors(tmp_path, monkeypatch):
+    manager = DataManager(str(tmp_path))
+    save = manager.save_patient_components
+    calls = []
+
+    def flaky(patient_id, data, components):
+        calls.append(data["age"])
+        if len(calls) == 1:
+            raise RuntimeError("disk quota bug")
+        return save(patient_id, data, components)
+
+    monkeypatch.setattr(manager, "save_patient_components", flaky)
+    autosaver = Autosaver(manager, debounce=0.05, max_staleness=1.0, max_write_rate=0)
+    try:
+        autosaver.track("P1", {"name": "Ann", "age": "60"})
+        autosaver.record("P1", {"name": "Ann", "age": "61"})
+        wait_for(lambda: autosaver.counters["failures"] == 1)
+        assert "disk quota bug" in autosaver.last_failure("P1")
+
+        # The failed save is retried and later edits are still written
+        wait_for(lambda: autosaver.counters["writes"] == 1)
+        assert autosaver.last_failure("P1") is None
+        autosaver.record("P1", {"name": "Ann", "age": "62"})
+        wait_for(lambda: autosaver.counters["writes"] == 2)
+        assert autosaver._thread.is_alive()
+        assert manager.load_patient("P1")["age"] == "62"
+    finally:
+        autosaver.close()
+
+
+def test_sessions_editing_one_patient_never_overwrite_each_other(tmp_path):
+    manager = DataManager(str(tmp_path))
+    loaded = {"name": "Ann", "age": "60", "diagnosis": "Glaucoma"}
+    manager.save_complete_patient_record("P1", loaded)
+    autosaver = Autosaver(manager, debounce=60.0, max_staleness=60.0, max_write_rate=0)
+    try:
+        autosaver.track("P1", loaded, session="a")
+        autosaver.track("P1", loaded, session="b")
+        autosaver.record("P1", dict(loaded, name="Ann Smith"), session="b")
+        # A's rerun with its unchanged form is not an edit
+        assert autosaver.record("P1", loaded, session="a") == set()
+        autosaver.flush()
+        assert manager.load_patient("P1")["name"] == "Ann Smith"
+
+        # Another session loading the patient keeps A's pending edit
+        autosaver.record("P1", dict(loaded, diagnosis="Other"), session="a")
+        autosaver.track("P1", manager.load_patient("P1"), session="b")
+        assert autosaver.pending("P1", session="a")
+        autosaver.flush()
+        saved = manager.load_patient("P1")
+        assert (saved["name"], saved["diagnosis"]) == ("Ann Smith", "Other")
+
+        # Reloading in the same session writes its own pending edit first
+        autosaver.record("P1", dict(saved, age="61"), session="b")
+        autosaver.track("P1", saved, session="b")
+        assert not autosaver.pending("P1", session="b")
+        assert manager.load_patient("P1")["age"] == "61"
+    finally:
+        autosaver.close()
@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+import backup_store
+from backup_store import BackupStore
+
+
+def write(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(payload)
+
+
+def tree(root):
+    """{relative path: bytes} of every file under root"""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+def test_incremental_backup_restores_each_version(tmp_path):
+    source = str(tmp_path / "patients")
+    write(os.path.join(source, "P1", "record.json"), b'{"name": "Ann"}')
+    write(os.path.join(source, "P2", "record.json"), b'{"name": "Bob"}')
+    store = BackupStore(str(tmp_path / "backups"))
+    first = store.create(source, name="first")
+    first_tree = tree(source)
+
+    write(os.path.join(source, "P1", "record.json"), b'{"name": "Ann Smith"}')
+    second = store.create(source, name="second")
+    assert second["stats"]["hashed"] == 1 and first["stats"]["hashed"] == 2
+    assert store.verify("second") == []
+
+    store.restore("first", str(tmp_path / "restored_first"))
+    store.restore("second", str(tmp_path / "restored_second"))
+    assert tree(str(tmp_path / "restored_first")) == first_tree
+    assert tree(str(tmp_path / "restored_second")) == tree(source)
+    assert not [name for name in os.listdir(store.objects_dir) if name.endswith(".tmp")]
+
+
+def test_object_holds_the_bytes_that_were_hashed(tmp_path, monkeypatch):
+    source = str(tmp_path / "patients")
+    path = os.path.join(source, "P1", "snapshot.json")
+    write(path, b"old")
+    copy = backup_store._copy_hashed
+
+    def replaced_while_copying(src, temp):
+        # An autosave renames a new file over the one being backed up
+        write(path + ".new", b"new")
+        os.replace(path + ".new", path)
+        return copy(src, temp)
+
+    monkeypatch.setattr(backup_store, "_copy_hashed", replaced_while_copying)
+    store = BackupStore(str(tmp_path / "backups"))
+    store.create(source, name="first")
+    monkeypatch.undo()
+    assert store.verify("first") == []
+    # The file changed after it was read, so the next backup picks it up
+    assert store.create(source, name="second")["stats"]["hashed"] == 1
+    store.restore("second", str(tmp_path / "restored"))
+    assert tree(str(tmp_path / "restored")) == {os.path.join("P1", "snapshot.json"): b"new"}
+
+
+def test_corrupt_object_fails_restore_and_keeps_the_live_file(tmp_path):
+    source = str(tmp_path / "patients")
+    write(os.path.join(source, "P1", "record.json"), b'{"name": "Ann"}')
+    store = BackupStore(str(tmp_path / "backups"))
+    manifest = store.create(source, name="first")
+    digest = manifest["files"]["P1/record.json"]["hash"]
+    with open(os.path.join(store.objects_dir, digest[:2], digest), 'wb') as f:
+        f.write(b"bit rot")
+    assert store.verify("first") == ["P1/record.json"]
+
+    target = str(tmp_path / "live")
+    write(os.path.join(target, "P1", "record.json"), b'{"name": "Ann Smith"}')
+    with pytest.raises(ValueError):
+        store.restore("first", target)
+    assert tree(target) == {os.path.join("P1", "record.json"): b'{"name": "Ann Smith"}'}
+
+
+def test_objects_are_fsynced_before_the_manifest(tmp_path, monkeypatch):
+    source = str(tmp_path / "patients")
+    write(os.path.join(source, "P1", "record.json"), b'{"name": "Ann"}')
+    events = []
+    fsync, replace = os.fsync, os.replace
+
+    def recording_fsync(fd):
+        events.append("fsync file")
+        fsync(fd)
+
+    def recording_replace(src, dst):
+        events.append(f"rename {os.path.basename(dst)}")
+        replace(src, dst)
+
+    monkeypatch.setattr(backup_store.os, "fsync", recording_fsync)
+    monkeypatch.setattr(backup_store.os, "replace", recording_replace)
+    monkeypatch.setattr(backup_store, "fsync_directory", lambda directory: events.append("fsync dir"))
+    store = BackupStore(str(tmp_path / "backups"))
+    manifest = store.create(source, name="first")
+    digest = manifest["files"]["P1/record.json"]["hash"]
+    committed = events.index("rename first.json")
+    assert events.index("fsync file") < events.index(f"rename {digest}") < events.index("fsync dir") < committed
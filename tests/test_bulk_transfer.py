@@ -0,0 +1,107 @@
+import csv
+import json
+import os
+
+import pytest
+
+from bulk_transfer import CSV_COLUMNS, export_records, import_records, partitioned_batches
+from data_manager import DataManager
+
+
+def test_jsonl_import_reports_bad_lines_and_saves_the_rest(tmp_path):
+    source = tmp_path / "archive.jsonl"
+    source.write_text("\n".join([
+        json.dumps({"patient_id": "P1", "name": "Ann", "age": "60"}),
+        '{"patient_id": "P2", "name": ',
+        json.dumps(["P3", "Bob"]),
+        "42",
+        json.dumps({"patient_id": "P4", "name": "Cy", "age": "70"}),
+    ]) + "\n")
+    base = str(tmp_path / "data")
+    stats = import_records(str(source), base, workers=1, batch_size=2)
+
+    assert stats["saved"] == 2
+    assert stats["failed"] == 3
+    lines = [number for number, _ in stats["errors"]]
+    assert lines == [2, 3, 4]
+    assert stats["errors"][0][1].startswith("invalid JSON")
+    manager = DataManager(base)
+    assert manager.load_patient("P1")["name"] == "Ann"
+    assert manager.load_patient("P4")["name"] == "Cy"
+
+
+def test_csv_import_treats_empty_drawing_cells_as_none(tmp_path):
+    source = tmp_path / "archive.csv"
+    with open(source, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, restval="")
+        writer.writeheader()
+        writer.writerow({"patient_id": "P1", "name": "Ann",
+                         "left_drawings": json.dumps([{"type": "point", "coords": [1, 2]}])})
+        writer.writerow({"patient_id": "P2", "name": "Bob", "right_drawings": "[{broken"})
+    base = str(tmp_path / "data")
+    stats = import_records(str(source), base, workers=1)
+
+    assert stats["saved"] == 1
+    assert [number for number, _ in stats["errors"]] == [2]
+    record = DataManager(base).load_patient("P1")
+    assert record["left_drawings"] == [{"type": "point", "coords": [1, 2]}]
+    assert record["right_drawings"] == []
+    assert record["legend_data"] == []
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+
+def test_each_patient_keeps_its_last_row_as_latest(tmp_path):
+    visits = [{"patient_id": f"P{index % 3}", "name": f"visit {index}"} for index in range(60)]
+    source = tmp_path / "archive.jsonl"
+    write_jsonl(source, visits)
+    batches = list(partitioned_batches(enumerate(visits, start=1), 4))
+    for patient_id in ("P0", "P1", "P2"):
+        assert len({partition for partition, batch in batches
+                    for _, record in batch if record["patient_id"] == patient_id}) == 1
+
+    base = str(tmp_path / "data")
+    assert import_records(str(source), base, workers=4, batch_size=1)["saved"] == 60
+    manager = DataManager(base)
+    assert [manager.load_patient(f"P{index}")["name"] for index in range(3)] == \
+        ["visit 57", "visit 58", "visit 59"]
+
+
+def test_ids_that_are_not_one_path_component_are_rejected(tmp_path):
+    source = tmp_path / "archive.jsonl"
+    write_jsonl(source, [{"patient_id": "../escaped", "name": "Eve"}, {"patient_id": "a/b", "name": "Eve"},
+                         {"patient_id": "P1", "name": "Ann"}])
+    base = str(tmp_path / "data")
+    stats = import_records(str(source), base, workers=1)
+    assert stats["saved"] == 1
+    assert [number for number, _ in stats["errors"]] == [1, 2]
+    assert "Invalid patient ID" in stats["errors"][0][1]
+    assert not os.path.exists(os.path.join(base, "escaped"))
+    assert sorted(os.listdir(os.path.join(base, "patients"))) == ["P1"]
+
+
+def test_resume_skips_finished_batches_and_refuses_another_batch_size(tmp_path):
+    source = tmp_path / "archive.jsonl"
+    write_jsonl(source, [{"patient_id": f"P{index}", "name": "Ann"} for index in range(10)])
+    base = str(tmp_path / "data")
+    first = import_records(str(source), base, workers=2, batch_size=3)
+    again = import_records(str(source), base, workers=1, batch_size=3)
+    assert again["skipped_batches"] == first["batches"] and again["saved"] == 0
+    with pytest.raises(ValueError):
+        import_records(str(source), base, workers=2, batch_size=5)
+
+
+def test_export_logs_one_system_entry_instead_of_a_read_per_patient(tmp_path):
+    base = str(tmp_path / "data")
+    manager = DataManager(base)
+    for index in range(3):
+        manager.save_complete_patient_record(f"P{index}", {"name": f"Patient {index}"})
+    target = tmp_path / "export.jsonl"
+    stats = export_records(str(target), base, workers=1, batch_size=2)
+
+    assert stats["exported"] == 3
+    assert list(manager.query_audit_log(action_type="data_access")) == []
+    exports = list(manager.query_audit_log(action_type="bulk_export"))
+    assert [entry["patient_id"] for entry in exports] == ["SYSTEM"]
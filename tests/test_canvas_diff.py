@@ -0,0 +1,66 @@
+import json
+import os
+
+from canvas_diff import CanvasDiffer, canvas_object_to_drawing, drawing_to_canvas_object
+from data_manager import SNAPSHOT_FILENAME, DataManager
+
+# As saved before coords_format 2: a circle centred without its stroke, a line with ends
+# relative to its (unsaved) centre
+LEGACY_CIRCLE = {"type": "circle", "color": "red", "width": 4, "alpha": 1.0, "fill": "none",
+                 "coords": [[100, 120], 30]}
+LEGACY_LINE = {"type": "line", "color": "blue", "width": 2, "alpha": 1.0, "coords": [[-20, -10], [20, 10]]}
+RECT = {"type": "rect", "color": "green", "width": 2, "alpha": 1.0, "fill": "none", "coords": [[10, 20], 30, 40]}
+
+
+def save_legacy(base):
+    """Save a patient, then turn its files into what the old code wrote"""
+    manager = DataManager(base)
+    index_file = manager.save_complete_patient_record(
+        "P1", {"name": "Ann", "left_drawings": [LEGACY_CIRCLE, LEGACY_LINE, RECT], "right_drawings": []})
+    manager.flush_audit_log()
+    patient_dir = os.path.dirname(index_file)
+    with open(index_file, 'r') as f:
+        drawings_file = os.path.join(patient_dir, json.load(f)["drawings_file"])
+    with open(drawings_file, 'r') as f:
+        document = json.load(f)
+    del document["coords_format"]
+    with open(drawings_file, 'w') as f:
+        json.dump(document, f)
+    os.remove(os.path.join(patient_dir, SNAPSHOT_FILENAME))
+
+
+def test_legacy_drawings_are_upgraded_on_load_and_round_trip(tmp_path):
+    base = str(tmp_path)
+    save_legacy(base)
+    manager = DataManager(base)
+    circle, line, rect = manager.load_patient("P1")["left_drawings"]
+    assert circle["coords"] == [[102, 122], 30]
+    assert line["coords"] is None and line["relative_coords"] == LEGACY_LINE["coords"]
+    assert rect == RECT
+
+    # The circle lands where it was drawn and converts back to the same drawing
+    obj = drawing_to_canvas_object(circle)
+    assert (obj["left"], obj["top"]) == (100 - 30, 120 - 30)
+    assert canvas_object_to_drawing(obj, 1.0)["coords"] == ((102, 122), 30)
+    assert drawing_to_canvas_object(line) is None
+
+    # Saved again in the current format, it loads unchanged
+    upgraded = manager.load_patient("P1")
+    manager.save_complete_patient_record("P1", upgraded)
+    assert manager.load_patient("P1")["left_drawings"] == [circle, line, rect]
+    manager.flush_audit_log()
+
+
+def test_differ_keeps_drawings_the_canvas_cannot_show(tmp_path):
+    base = str(tmp_path)
+    save_legacy(base)
+    drawings = DataManager(base).load_patient("P1")["left_drawings"]
+    differ = CanvasDiffer("left")
+    objects = differ.load(drawings)
+    assert len(objects) == 2 and drawings[-1]["type"] == "line"
+
+    added = {"type": "circle", "stroke": "red", "strokeWidth": 2, "fill": "transparent",
+             "left": 0, "top": 0, "radius": 5, "width": 10, "height": 10}
+    changes = differ.apply(objects + [added], drawings, 1.0)
+    assert len(changes.added) == 1
+    assert [d["type"] for d in drawings] == ["circle", "rect", "circle", "line"]
@@ -0,0 +1,34 @@
+import os
+import threading
+
+import chart_export
+from chart_export import JOB_DONE, ChartExportQueue
+from data_manager import DataManager
+
+
+def test_only_unfinished_exports_are_deduplicated(tmp_path, monkeypatch):
+    release = threading.Event()
+
+    def render(header, legend_data, dpi, renderer, left, right):
+        assert release.wait(10), "timed out"
+        return b"\x89PNG"
+
+    monkeypatch.setattr(chart_export, "render_chart_png", render)
+    manager = DataManager(str(tmp_path / "data"))
+    manager.save_complete_patient_record("P1", {"name": "Ann"})
+    exports = ChartExportQueue(manager, renderer=object())
+    header = {"name": "Ann"}
+
+    first = exports.submit("P1", header, [], dpi=72)
+    assert exports.submit("P1", header, [], dpi=72) is first
+    assert exports.deduplicated == 1
+    release.set()
+    assert first.wait(10) and first.status == JOB_DONE
+
+    # The chart was written; exporting it again writes a new file
+    os.remove(first.filename)
+    second = exports.submit("P1", header, [], dpi=72)
+    assert second is not first
+    assert second.wait(10) and second.status == JOB_DONE
+    assert os.path.exists(second.filename)
+    manager.flush_audit_log()
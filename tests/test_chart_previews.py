@@ -0,0 +1,59 @@
+import io
+import os
+import sqlite3
+import time
+
+from PIL import Image
+
+import chart_previews
+from chart_previews import STATUS_BUILT, STATUS_FAILED, PreviewStore, PreviewWorker
+
+
+def chart(directory, name):
+    """Write a small PNG chart image and return its path"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), "white").save(buf, format="PNG")
+    with open(path, 'wb') as f:
+        f.write(buf.getvalue())
+    return path
+
+
+def test_failing_build_does_not_stop_later_builds(tmp_path, monkeypatch):
+    store = PreviewStore(str(tmp_path))
+    images = str(tmp_path / "patients" / "P1" / "images")
+    bad, good = chart(images, "fundus_chart_1.png"), chart(images, "fundus_chart_2.png")
+    build = store.build
+
+    def flaky(path):
+        if path == bad:
+            raise sqlite3.OperationalError("database is locked")
+        return build(path)
+
+    monkeypatch.setattr(store, "build", flaky)
+    worker = PreviewWorker(store)
+    assert worker.submit(bad) and worker.submit(good)
+    deadline = time.monotonic() + 10
+    while worker.stats()["built"] + worker.stats()["failed"] < 2:
+        assert worker._thread.is_alive(), "worker thread died"
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+    assert worker.stats()["failed"] == 1 and "database is locked" in worker.last_error
+    assert store.cached_path(good) is not None
+    assert worker._thread.is_alive()
+
+
+def test_backfill_reports_unexpected_errors_per_image(tmp_path, monkeypatch):
+    store = PreviewStore(str(tmp_path))
+    image = chart(str(tmp_path / "patients" / "P1" / "images"), "fundus_chart_1.png")
+    build = store.build
+
+    def bomb(path):
+        raise Image.DecompressionBombError("too big")
+
+    monkeypatch.setitem(chart_previews._worker, "store", store)
+    monkeypatch.setattr(store, "build", bomb)
+    assert chart_previews.backfill_image(image) == (image, STATUS_FAILED, "DecompressionBombError: too big")
+    monkeypatch.setattr(store, "build", build)
+    assert chart_previews.backfill_image(image)[1] == STATUS_BUILT
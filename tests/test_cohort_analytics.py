@@ -0,0 +1,60 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from chart_template import AXIS_LIMIT, RIGHT_EYE_RECT
+from cohort_analytics import EYE_OUTSIDE, EYE_RIGHT, CohortCache, clock_grid, parse_va
+from data_manager import DataManager
+
+
+def canvas_point(chart_x, chart_y, rect=RIGHT_EYE_RECT, canvas=400):
+    """Canvas pixel of a point given in chart units of an eye panel"""
+    left, bottom, width, height = rect
+    fx = left + (chart_x + AXIS_LIMIT) / (2 * AXIS_LIMIT) * width
+    fy = bottom + (chart_y + AXIS_LIMIT) / (2 * AXIS_LIMIT) * height
+    return fx * canvas, (1 - fy) * canvas
+
+
+def test_clock_grid_places_points_on_hours_and_rings():
+    points = [canvas_point(0, 0), canvas_point(0, 0.7), canvas_point(0.9, 0), canvas_point(0, -1.2), (399, 399)]
+    eye, hour, ring, x, y = clock_grid([p[0] for p in points], [p[1] for p in points])
+    assert eye.tolist() == [EYE_RIGHT] * 4 + [EYE_OUTSIDE]
+    assert hour[1:4].tolist() == [12, 3, 6]
+    assert ring.tolist() == [0, 1, 2, 3, 3]
+    assert x[2] == pytest.approx(0.9, abs=1e-5)
+
+
+def test_parse_va_reads_snellen_and_decimal():
+    assert parse_va("6/6") == 0.0
+    assert parse_va("20/40") == pytest.approx(np.log10(2))
+    assert parse_va("0.5") == pytest.approx(np.log10(2))
+    assert np.isnan(parse_va("CF")) and np.isnan(parse_va("0/6"))
+
+
+def test_refresh_reads_only_changed_patients(tmp_path):
+    base = str(tmp_path / "data")
+    manager = DataManager(base)
+    point = list(canvas_point(0, 0.7))
+    for patient_id, diagnosis, iop in (("P1", "Glaucoma", "24"), ("P2", "Glaucoma", "18"), ("P3", "AMD", "12")):
+        manager.save_complete_patient_record(patient_id, {
+            "name": patient_id, "diagnosis": diagnosis, "iop_left": iop, "iop_right": iop, "va_left": "6/12",
+            "right_drawings": [{"type": "point", "color": "red", "coords": point}],
+            "legend_data": [{"color": "red", "label": "Haemorrhage"}]})
+
+    cache = CohortCache(base)
+    stats = cache.refresh(manager=manager)
+    assert (stats["ingested"], stats["records"], stats["lesions"]) == (3, 3, 3)
+    glaucoma = {row["diagnosis"]: row for row in cache.iop_by_diagnosis()}["Glaucoma"]
+    assert glaucoma["count"] == 4 and glaucoma["mean"] == 21.0
+    assert cache.clock_hours(eye="right", label=["Haemorrhage"])[1, 11] == 3
+
+    manager.save_complete_patient_record("P3", {"name": "P3", "diagnosis": "Glaucoma", "iop_left": "30"})
+    shutil.rmtree(tmp_path / "data" / "patients" / "P2")
+    reloaded = CohortCache(base)
+    stats = reloaded.refresh(manager=manager)
+    assert (stats["ingested"], stats["unchanged"], stats["removed"]) == (1, 1, 1)
+    assert stats["records"] == 3 and stats["lesions"] == 1
+    assert {row["diagnosis"]: row["count"] for row in reloaded.iop_by_diagnosis(eye="left")} == {"Glaucoma": 2}
+    # Background ingest does not write per-patient read entries
+    assert list(manager.query_audit_log(action_type="data_access")) == []
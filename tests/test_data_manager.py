@@ -0,0 +1,209 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import atomic_io
+from data_manager import HISTORY_MODE_DELTA, SNAPSHOT_FILENAME, DataManager
+
+
+def record(generation):
+    """Patient data whose every component carries the generation"""
+    return {"name": f"gen {generation}", "age": "60", "diagnosis": f"gen {generation}",
+            "left_drawings": [{"type": "point", "color": "red", "coords": [generation, 1]}],
+            "right_drawings": [], "legend_data": [{"label": f"gen {generation}"}]}
+
+
+def visible(base):
+    """The generation load_patient returns through the snapshot and through the record set"""
+    manager = DataManager(base)
+    seen = []
+    for use_snapshot in (True, False):
+        data = manager.load_patient("P1", use_snapshot=use_snapshot)
+        assert data["name"] == data["diagnosis"] == data["legend_data"][0]["label"], data
+        seen.append(data["name"])
+    manager.flush_audit_log()
+    return seen
+
+
+def crash_before_rename(base, crash_at):
+    """Save generation 2 in a child that exits just before its crash_at-th rename; True if it did"""
+    pid = os.fork()
+    if pid == 0:
+        calls = [0]
+        replace = os.replace
+
+        def crashing_replace(src, dst):
+            calls[0] += 1
+            if calls[0] == crash_at:
+                os._exit(17)
+            replace(src, dst)
+
+        atomic_io.os.replace = crashing_replace
+        DataManager(base).save_complete_patient_record("P1", record(2))
+        os._exit(0)
+    _, status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(status) == 17
+
+
+def test_crash_at_every_rename_leaves_one_record_on_every_read_path(tmp_path, monkeypatch):
+    dry_run = str(tmp_path / "dry_run")
+    DataManager(dry_run).save_complete_patient_record("P1", record(1))
+    renames = []
+    replace = os.replace
+    with monkeypatch.context() as patch:
+        patch.setattr(atomic_io.os, "replace", lambda src, dst: (renames.append(dst), replace(src, dst)))
+        DataManager(dry_run).save_complete_patient_record("P1", record(2))
+    commit_at = [os.path.basename(path) for path in renames].index("latest_record_set.json") + 1
+
+    for crash_at in range(1, len(renames) + 2):
+        base = str(tmp_path / f"crash_{crash_at}")
+        DataManager(base).save_complete_patient_record("P1", record(1))
+        crashed = crash_before_rename(base, crash_at)
+        assert crashed == (crash_at <= len(renames))
+        expected = "gen 1" if crash_at <= commit_at else "gen 2"
+        assert visible(base) == [expected, expected], f"crash before rename {crash_at}"
+
+
+def test_lost_component_file_is_read_from_the_committed_snapshot(tmp_path):
+    base = str(tmp_path)
+    manager = DataManager(base)
+    manager.save_complete_patient_record("P1", record(1))
+    index_file = manager.save_complete_patient_record("P1", record(2))
+    manager.flush_audit_log()
+    patient_dir = os.path.dirname(index_file)
+    with open(index_file, 'r') as f:
+        record_set = json.load(f)
+
+    # As if a power loss dropped a directory entry the commit did not fsync
+    os.remove(os.path.join(patient_dir, record_set["drawings_file"]))
+    assert visible(base) == ["gen 2", "gen 2"]
+    os.remove(os.path.join(patient_dir, SNAPSHOT_FILENAME))
+    assert visible(base) == ["gen 1", "gen 1"]
+
+
+def test_every_folder_is_fsynced_once_and_components_before_the_commit(tmp_path, monkeypatch):
+    manager = DataManager(str(tmp_path))
+    manager.save_complete_patient_record("P1", record(1), flush_audit=False)
+    events = []
+    replace = os.replace
+
+    def recording_replace(src, dst):
+        events.append(("rename", os.path.basename(dst)))
+        replace(src, dst)
+
+    monkeypatch.setattr(atomic_io, "fsync_directory", lambda directory: events.append(("fsync", directory)))
+    monkeypatch.setattr(atomic_io.os, "replace", recording_replace)
+    index_file = manager.save_complete_patient_record("P1", record(2), flush_audit=False)
+    patient_dir = os.path.dirname(index_file)
+    synced = [directory for kind, directory in events if kind == "fsync"]
+    assert sorted(synced) == sorted([patient_dir] + [os.path.join(patient_dir, folder) for folder in
+                                                     ("demographics", "medical_records", "fundus_charts")])
+    commit = events.index(("rename", "latest_record_set.json"))
+    assert all(events.index(("fsync", directory)) < commit for directory in synced[:-1])
+    assert synced[-1] == patient_dir and events.index(("fsync", patient_dir)) > commit
+
+
+def torn_write_in_child(base, tear_at):
+    """Save generation 2 in a child killed half way through writing its tear_at-th temp file"""
+    pid = os.fork()
+    if pid == 0:
+        calls = [0]
+        write_temp = atomic_io._write_temp
+
+        def tearing_write_temp(path, payload, sync=True):
+            calls[0] += 1
+            if calls[0] == tear_at:
+                write_temp(path, payload[:len(payload) // 2], sync)
+                os._exit(17)
+            return write_temp(path, payload, sync)
+
+        atomic_io._write_temp = tearing_write_temp
+        DataManager(base).save_complete_patient_record("P1", record(2))
+        os._exit(0)
+    _, status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(status) == 17
+
+
+def test_torn_temp_files_never_become_visible(tmp_path):
+    for tear_at in (1, 3, 5, 7):
+        base = str(tmp_path / f"tear_{tear_at}")
+        DataManager(base).save_complete_patient_record("P1", record(1))
+        assert torn_write_in_child(base, tear_at)
+        assert visible(base) == ["gen 1", "gen 1"], f"torn temp file {tear_at}"
+        # The stray temp files do not stop the next save
+        DataManager(base).save_complete_patient_record("P1", record(3))
+        assert visible(base) == ["gen 3", "gen 3"]
+
+
+def test_failed_write_leaves_no_temp_files_and_the_old_record(tmp_path, monkeypatch):
+    base = str(tmp_path)
+    manager = DataManager(base)
+    manager.save_complete_patient_record("P1", record(1))
+    calls = [0]
+    write_temp = atomic_io._write_temp
+
+    def full_disk(path, payload, sync=True):
+        calls[0] += 1
+        if calls[0] == 4:
+            raise OSError(28, "No space left on device")
+        return write_temp(path, payload, sync)
+
+    monkeypatch.setattr(atomic_io, "_write_temp", full_disk)
+    with pytest.raises(OSError):
+        manager.save_complete_patient_record("P1", record(2))
+    monkeypatch.undo()
+    assert visible(base) == ["gen 1", "gen 1"]
+    strays = [name for _, _, names in os.walk(os.path.join(base, "patients")) for name in names
+              if name.endswith(".tmp")]
+    assert strays == []
+
+
+def test_patient_folders_added_outside_the_app_are_found(tmp_path):
+    other = DataManager(str(tmp_path / "other"))
+    other.save_complete_patient_record("P2", record(2))
+    other.flush_audit_log()
+    manager = DataManager(str(tmp_path / "main"))
+    manager.save_complete_patient_record("P1", record(1))
+
+    shutil.copytree(os.path.join(other.base_directory, "patients", "P2"),
+                    os.path.join(manager.base_directory, "patients", "P2"))
+    assert manager.check_patient_exists("P2")
+    assert manager.load_patient("P2")["name"] == "gen 2"
+    assert manager.search_patients(name_prefix="gen 2")[0]["patient_id"] == "P2"
+    assert not manager.check_patient_exists("..")
+
+    shutil.copytree(os.path.join(other.base_directory, "patients", "P2"),
+                    os.path.join(manager.base_directory, "patients", "P3"))
+    assert manager.list_patients() == ["P1", "P2", "P3"]
+    shutil.rmtree(os.path.join(manager.base_directory, "patients", "P1"))
+    assert DataManager(manager.base_directory).registry.list_ids() == ["P2", "P3"]
+    manager.flush_audit_log()
+
+
+def test_restore_backup_registers_the_restored_patients(tmp_path):
+    manager = DataManager(str(tmp_path))
+    manager.save_complete_patient_record("P1", record(1))
+    backup = os.path.splitext(os.path.basename(manager.create_backup(incremental=True)))[0]
+    shutil.rmtree(os.path.join(manager.base_directory, "patients", "P1"))
+    manager.registry.remove("P1")
+
+    manager.restore_backup(backup, os.path.join(manager.base_directory, "patients"))
+    assert manager.registry.get("P1")["name"] == "gen 1"
+    assert manager.load_patient("P1")["name"] == "gen 1"
+    manager.flush_audit_log()
+
+
+def test_delta_history_survives_compaction(tmp_path):
+    manager = DataManager(str(tmp_path / "data"), history_mode=HISTORY_MODE_DELTA, checkpoint_interval=2)
+    for generation in range(5):
+        manager.save_complete_patient_record("P1", record(generation))
+    with open(os.path.join(manager.base_directory, "patients", "P1", "latest_record_set.json")) as f:
+        record_set = json.load(f)
+    assert record_set["history_version"] == 5 and "history_file" not in record_set
+
+    manager.compact_history("P1")
+    assert manager.load_patient("P1", use_snapshot=False)["name"] == "gen 4"
+    assert manager.load_patient_version("P1", 2)["name"] == "gen 1"
+    manager.flush_audit_log()
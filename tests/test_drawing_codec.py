@@ -0,0 +1,47 @@
+import pytest
+
+from drawing_codec import decode_drawing_document, encode_drawing_document, is_encoded_drawing_document
+
+
+def document(coords):
+    return {
+        "left_eye_drawings": [
+            {"type": "line", "color": "#ff0000", "width": 2, "coords": [coords[:2], coords[2:4]]},
+            {"type": "freehand", "color": "blue", "points": [["M", 1, 2], ["Q", 3, 4, 5.5, 6], ["L", 7, 8]]},
+            {"type": "circle", "coords": [coords[:2], 10], "fill": "solid"},
+        ],
+        "right_eye_drawings": [{"type": "point", "coords": coords[:2], "label": None}],
+        "legend_data": [{"color": "red", "label": "Haemorrhage"}],
+        "timestamp": "2025-01-01 10:00:00",
+    }
+
+
+@pytest.mark.parametrize("coords", [
+    [10, 20, 30, 40],            # ints
+    [10.5, 20.25, 30.125, 40],   # fits int16 on a power-of-two grid
+    [0.1, 1e6, -3.75, 1e-7],     # needs float64
+])
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip_is_exact(coords, compress):
+    original = document(coords)
+    payload = encode_drawing_document(original, compress=compress)
+    assert is_encoded_drawing_document(payload)
+    decoded = decode_drawing_document(payload)
+    assert decoded == original
+    # Ints stay ints and floats stay floats, as json.load would give them
+    assert [type(value) for value in decoded["right_eye_drawings"][0]["coords"]] == \
+        [type(value) for value in coords[:2]]
+
+
+def test_unpackable_values_survive():
+    original = {"left_eye_drawings": [{"type": "freehand", "points": [["M", "x", 1], ["Z"]]},
+                                      {"type": "line", "coords": None}],
+                "right_eye_drawings": None}
+    assert decode_drawing_document(encode_drawing_document(original)) == \
+        {"left_eye_drawings": original["left_eye_drawings"], "right_eye_drawings": []}
+
+
+def test_plain_json_is_not_mistaken_for_a_binary_document():
+    assert not is_encoded_drawing_document(b'{"left_eye_drawings": []}')
+    with pytest.raises(ValueError):
+        decode_drawing_document(b'{"left_eye_drawings": []}' + b" " * 32)
@@ -0,0 +1,41 @@
+import os
+
+from data_manager import DataManager
+from patient_registry import PatientRegistry
+
+
+def test_upsert_get_and_search(tmp_path):
+    registry = PatientRegistry(str(tmp_path / "registry.db"))
+    registry.upsert("P002", name="bob Jones", age=70, diagnosis="Glaucoma")
+    registry.upsert("P001", name="Ann Smith", age=60, diagnosis="Cataract")
+    registry.upsert("Q001", name="Annie Lee", age=60)
+    registry.upsert("P002", diagnosis="AMD")
+
+    assert registry.get("P002") == {"patient_id": "P002", "name": "bob Jones", "age": "70",
+                                    "diagnosis": "AMD", "last_updated": ""}
+    assert registry.get("P404") is None
+    assert registry.count() == 3 and registry.list_ids() == ["P001", "P002", "Q001"]
+    assert [row["patient_id"] for row in registry.search(id_prefix="P")] == ["P001", "P002"]
+    assert [row["patient_id"] for row in registry.search(name_prefix="ann")] == ["P001", "Q001"]
+    assert [row["patient_id"] for row in registry.search(name_prefix="BOB")] == ["P002"]
+    assert [row["patient_id"] for row in registry.search(age=60, limit=1)] == ["P001"]
+    registry.remove("Q001")
+    assert not registry.exists("Q001")
+
+
+def test_rebuild_and_reconcile_follow_the_patient_tree(tmp_path):
+    base = str(tmp_path / "data")
+    manager = DataManager(base)
+    for index in range(3):
+        manager.save_complete_patient_record(f"P{index}", {"name": f"Patient {index}", "diagnosis": "Glaucoma"})
+    manager.flush_audit_log()
+    patients_dir = os.path.join(base, "patients")
+    registry = PatientRegistry(str(tmp_path / "fresh.db"))
+    assert registry.rebuild(patients_dir) == 3
+    assert registry.get("P1")["name"] == "Patient 1"
+    assert registry.get("P1")["diagnosis"] == "Glaucoma"
+
+    os.rename(os.path.join(patients_dir, "P2"), os.path.join(patients_dir, "P9"))
+    assert registry.reconcile(patients_dir) == (1, 1)
+    assert registry.list_ids() == ["P0", "P1", "P9"]
+    assert registry.get("P9")["name"] == "Patient 2"
@@ -0,0 +1,75 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import record_ids
+from data_manager import DataManager
+from record_ids import new_record_id
+
+
+def token_of(record_id):
+    return record_id.rsplit("_", 1)[1]
+
+
+def test_forked_child_gets_its_own_token():
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        os.write(write_end, f"{record_ids.PROCESS_TOKEN} {new_record_id()}".encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as f:
+        child_token, child_id = f.read().split()
+    os.waitpid(pid, 0)
+
+    assert child_token != record_ids.PROCESS_TOKEN
+    assert token_of(child_id) == child_token
+    assert token_of(new_record_id()) == record_ids.PROCESS_TOKEN
+
+
+def test_pool_workers_do_not_reuse_the_parent_token():
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        ids = [pool.submit(new_record_id).result() for _ in range(4)]
+    assert record_ids.PROCESS_TOKEN not in {token_of(record_id) for record_id in ids}
+
+
+def many_ids(count):
+    return [new_record_id() for _ in range(count)]
+
+
+def test_ids_are_unique_across_processes_and_threads(tmp_path):
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        batches = list(pool.map(many_ids, [20000] * 8))
+    ids = [record_id for batch in batches for record_id in batch] + many_ids(20000)
+    assert len(set(ids)) == len(ids)
+    assert all(batch == sorted(batch) for batch in batches)
+
+
+def test_concurrent_saves_each_keep_their_files(tmp_path):
+    manager = DataManager(str(tmp_path))
+    errors = []
+
+    def worker(thread_index):
+        try:
+            for save in range(40):
+                manager.save_complete_patient_record(f"P{save % 2}", {"name": f"thread {thread_index}",
+                                                                      "diagnosis": str(save)}, flush_audit=False)
+                manager.save_chart_image(f"P{save % 2}", b"\x89PNG")
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manager.flush_audit_log()
+    assert not errors
+    for folder, prefix in ((".", "record_set_"), ("demographics", "demographics_2"),
+                           ("medical_records", "record_2"), ("fundus_charts", "fundus_drawing_"),
+                           ("images", "fundus_chart_")):
+        names = [name for patient in ("P0", "P1")
+                 for name in os.listdir(os.path.join(str(tmp_path), "patients", patient, folder))
+                 if name.startswith(prefix) and not name.endswith(".tmp")]
+        assert len(names) == 6 * 40, folder
@@ -0,0 +1,128 @@
+import io
+import threading
+import time
+
+from PIL import Image
+
+from chart_previews import PreviewStore
+from data_manager import DataManager
+
+LEFT = [{"type": "freehand", "color": "red", "width": 2, "alpha": 0.7,
+         "points": [["M", 10, 10], ["Q", 12, 12, 14, 14]]},
+        {"type": "line", "color": "blue", "width": 3, "alpha": 1.0, "coords": [[20, 20], [60, 80]]}]
+RIGHT = [{"type": "rect", "color": "green", "width": 2, "alpha": 0.7, "coords": [[30, 40], 50, 20],
+          "fill": "none"}]
+RECORD = {"name": "Ann", "age": "60", "diagnosis": "Glaucoma", "left_drawings": LEFT, "right_drawings": RIGHT}
+
+
+def button(at, label):
+    return next(b for b in at.sidebar.button if b.label == label)
+
+
+def load(at, patient_id):
+    at.run()
+    at.sidebar.text_input[0].set_value(patient_id).run()
+    button(at, "Load Patient").click().run()
+    assert not at.exception
+
+
+def test_load_patient_keeps_drawings_through_rerun_and_autosave(app, autosavers):
+    at, canvas = app
+    DataManager("patient_data").save_complete_patient_record("P1", RECORD)
+    load(at, "P1")
+    assert len(canvas.shown("left")) == 2 and len(canvas.shown("right")) == 1
+    at.run()  # the reloaded canvases report the loaded objects
+    at.run()
+    assert not at.exception
+
+    autosaver, = autosavers
+    assert not autosaver.pending("P1")
+    autosaver.flush()
+    saved = DataManager("patient_data").load_patient("P1")
+    assert saved["left_drawings"] == LEFT
+    assert saved["right_drawings"] == RIGHT
+
+
+def test_edit_after_load_is_autosaved(app, autosavers):
+    at, canvas = app
+    DataManager("patient_data").save_complete_patient_record("P1", RECORD)
+    load(at, "P1")
+    at.run()
+    canvas.draw("left", {"type": "circle", "left": 100, "top": 100, "radius": 10, "stroke": "red",
+                         "strokeWidth": 2, "fill": "transparent", "width": 20, "height": 20})
+    at.run()
+
+    autosavers[0].flush()
+    saved = DataManager("patient_data").load_patient("P1")
+    assert saved["left_drawings"][:2] == LEFT
+    assert [d["type"] for d in saved["left_drawings"]] == ["freehand", "line", "circle"]
+    assert saved["right_drawings"] == RIGHT
+
+
+def circle(x):
+    return {"type": "circle", "left": x, "top": 100, "radius": 10, "stroke": "red", "strokeWidth": 2,
+            "fill": "transparent", "width": 20, "height": 20}
+
+
+def draw(at, canvas, eye, obj):
+    canvas.draw(eye, obj)
+    at.run()
+    at.run()  # the history buttons render before the canvas, so enable them on the next run
+
+
+def test_undo_reloads_canvas_when_restoring_the_drawing_it_last_loaded(app):
+    at, canvas = app
+    at.run()
+    at.run()  # the mounted canvases report their empty drawing
+    draw(at, canvas, "left", circle(10))
+    at.button(key="left_undo").click().run()
+    assert canvas.shown("left") == []
+    at.button(key="left_redo").click().run()
+    assert canvas.shown("left") == [circle(10)]
+    at.run()
+
+    # A: the canvas loaded [s1] for the redo; B: the user draws s2; undo restores A
+    draw(at, canvas, "left", circle(50))
+    assert len(at.session_state["app_state"]["left_drawings"]) == 2
+    at.button(key="left_undo").click().run()
+    assert canvas.shown("left") == [circle(10)]
+    at.run()
+    assert len(at.session_state["app_state"]["left_drawings"]) == 1
+
+    # The undone stroke must not come back with the next one
+    draw(at, canvas, "left", circle(90))
+    assert not at.exception
+    drawings = at.session_state["app_state"]["left_drawings"]
+    assert [d["coords"][0][0] for d in drawings] == [21.0, 101.0]
+
+
+def test_gallery_builds_previews_in_the_background_only_once_opened(app, monkeypatch):
+    at, _ = app
+    manager = DataManager("patient_data")
+    manager.save_complete_patient_record("P1", RECORD)
+    buf = io.BytesIO()
+    Image.new("RGB", (800, 600), "white").save(buf, format="PNG")
+    chart = manager.save_chart_image("P1", buf.getvalue())
+    manager.flush_audit_log()
+    builders = []
+    build = PreviewStore.build
+
+    def recording_build(self, path):
+        builders.append(threading.current_thread().name)
+        return build(self, path)
+
+    monkeypatch.setattr(PreviewStore, "build", recording_build)
+    load(at, "P1")
+    at.run()
+    assert not at.get("imgs") and builders == []
+
+    at.toggle(key="chart_gallery").set_value(True).run()
+    assert at.caption[-1].value.endswith("(preview being prepared)")
+    store = PreviewStore("patient_data")
+    deadline = time.monotonic() + 10
+    while store.cached_path(chart) is None:
+        assert time.monotonic() < deadline, "preview never built"
+        time.sleep(0.05)
+    at.run()
+    assert len(at.get("imgs")) == 1
+    assert builders == ["chart-previews"]
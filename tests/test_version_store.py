@@ -0,0 +1,37 @@
+import os
+
+from version_store import INDEX_FILENAME, PatientVersionStore, apply_delta, diff_values
+
+
+def document(generation):
+    return {"demographics": {"name": "Ann", "age": str(60 + generation)},
+            "medical_record": {"diagnosis": "Glaucoma", "iop_left": str(generation)},
+            "drawings": {"left_eye_drawings": [{"type": "point", "coords": [n, n]} for n in range(40 + generation)]}}
+
+
+def test_delta_round_trip():
+    old, new = document(2), document(3)
+    assert apply_delta(old, diff_values(old, new)) == new
+
+
+def test_every_version_rebuilds_across_checkpoints(tmp_path):
+    store = PatientVersionStore(str(tmp_path), checkpoint_interval=3)
+    for generation in range(7):
+        entry = store.append(document(generation))
+        assert entry["version"] == generation + 1
+    assert [entry["kind"] for entry in store.list_history()] == ["checkpoint", "delta", "delta"] * 2 + ["checkpoint"]
+    assert store.latest_version() == 7
+    for generation in range(7):
+        assert store.load_version(generation + 1) == document(generation)
+
+
+def test_compact_keeps_every_version_and_removes_old_files(tmp_path):
+    store = PatientVersionStore(str(tmp_path), checkpoint_interval=1)
+    for generation in range(6):
+        store.append(document(generation))
+    before = set(os.listdir(store.history_dir))
+    store.checkpoint_interval = 3
+    assert store.compact() > 0
+    assert before & set(os.listdir(store.history_dir)) == {INDEX_FILENAME}
+    assert [entry["kind"] for entry in store.list_history()] == ["checkpoint", "delta", "delta"] * 2
+    assert [store.load_version(version) for version in range(1, 7)] == [document(n) for n in range(6)]
@@ -0,0 +1,189 @@
+"""Delta-based version history for patient records.
+
+Each saved version of a patient document is stored either as a full
+checkpoint or as a compact delta against the previous version. A checkpoint
+is written every checkpoint_interval versions, or sooner when a delta would
+be larger than half the full document, so rebuilding any version replays at
+most checkpoint_interval - 1 deltas.
+"""
+import json
+import os
+from datetime import datetime
+
+from atomic_io import WriteTransaction, atomic_write, fsync_directory
+from record_ids import new_record_id
+
+INDEX_FILENAME = "history_index.jsonl"
+
+
+def diff_values(old, new):
+    """Return a delta that turns old into new, or None if they are equal"""
+    if old == new:
+        return None
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed = {}
+        for key, value in new.items():
+            if key not in old:
+                changed[key] = {"=": value}
+            else:
+                delta = diff_values(old[key], value)
+                if delta is not None:
+                    changed[key] = delta
+        removed = [key for key in old if key not in new]
+        delta = {"d": changed}
+        if removed:
+            delta["r"] = removed
+        return delta
+    if isinstance(old, list) and isinstance(new, list):
+        start = 0
+        limit = min(len(old), len(new))
+        while start < limit and old[start] == new[start]:
+            start += 1
+        end_old, end_new = len(old), len(new)
+        while end_old > start and end_new > start and old[end_old - 1] == new[end_new - 1]:
+            end_old -= 1
+            end_new -= 1
+        return {"s": [start, end_old, new[start:end_new]]}
+    return {"=": new}
+
+
+def apply_delta(value, delta):
+    """Apply a delta from diff_values to value and return the result"""
+    if delta is None:
+        return value
+    if "=" in delta:
+        return delta["="]
+    if "s" in delta:
+        start, end_old, inserted = delta["s"]
+        return value[:start] + inserted + value[end_old:]
+    result = dict(value)
+    for key in delta.get("r", []):
+        result.pop(key, None)
+    for key, child in delta["d"].items():
+        result[key] = apply_delta(result.get(key), child)
+    return result
+
+
+def _encode(payload):
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+class PatientVersionStore:
+    """Versioned history of one patient's documents under <patient_dir>/history"""
+
+    def __init__(self, patient_dir, checkpoint_interval=20):
+        """Use the history folder inside patient_dir, created on the first append"""
+        self.history_dir = os.path.join(patient_dir, "history")
+        self.checkpoint_interval = checkpoint_interval
+        self._index_path = os.path.join(self.history_dir, INDEX_FILENAME)
+
+    def list_history(self):
+        """Return the index entries for every stored version, oldest first"""
+        if not os.path.exists(self._index_path):
+            return []
+        with open(self._index_path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def latest_version(self):
+        """Return the newest version number, or 0 if there is no history"""
+        history = self.list_history()
+        return history[-1]["version"] if history else 0
+
+    def append(self, document, timestamp=None, write=None):
+        """Store document as the next version and return its index entry
+
+        write(path, payload) is used for the version file and defaults to
+        atomic_write. The index line is appended afterwards and fsynced, so
+        an entry never outlives a power loss that the file it names does not.
+        """
+        # Normalise tuples to lists so the document compares equal to its stored form
+        full = _encode(document)
+        document = json.loads(full)
+        history = self.list_history()
+        version = history[-1]["version"] + 1 if history else 1
+        previous = None
+        if history and (version - 1) % self.checkpoint_interval != 0:
+            previous = self.load_version(history[-1]["version"], history)
+        kind, payload = self._encode_version(version, previous, document, full)
+        filename = f"{kind}_{version:08d}.json"
+        os.makedirs(self.history_dir, exist_ok=True)
+        (write or atomic_write)(os.path.join(self.history_dir, filename), payload)
+        entry = {
+            "version": version,
+            "kind": kind,
+            "file": filename,
+            "bytes": len(payload),
+            "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        created = not os.path.exists(self._index_path)
+        with open(self._index_path, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if created:
+            fsync_directory(self.history_dir)
+        return entry
+
+    def load_version(self, version, history=None):
+        """Rebuild the document stored as version"""
+        history = history if history is not None else self.list_history()
+        by_version = {entry["version"]: entry for entry in history}
+        if version not in by_version:
+            raise KeyError(f"Unknown history version: {version}")
+        chain = []
+        current = version
+        while True:
+            entry = by_version[current]
+            chain.append(entry)
+            if entry["kind"] == "checkpoint":
+                break
+            current -= 1
+        document = None
+        for entry in reversed(chain):
+            with open(os.path.join(self.history_dir, entry["file"]), 'rb') as f:
+                payload = json.loads(f.read())
+            document = payload if entry["kind"] == "checkpoint" else apply_delta(document, payload)
+        return document
+
+    def compact(self):
+        """Re-chain the history with the configured checkpoint interval
+
+        Every version is rebuilt and rewritten as a checkpoint every
+        checkpoint_interval versions with deltas in between. The new files are
+        written under a fresh generation name and committed in one
+        transaction with the new index as its commit point; only then are the
+        superseded files removed. Returns the number of bytes saved.
+        """
+        history = self.list_history()
+        if not history:
+            return 0
+        generation = new_record_id()
+        new_entries = []
+        previous = None
+        txn = WriteTransaction()
+        for entry in history:
+            document = self.load_version(entry["version"], history)
+            kind, payload = self._encode_version(entry["version"], previous, document)
+            filename = f"{kind}_{entry['version']:08d}.{generation}.json"
+            txn.write(os.path.join(self.history_dir, filename), payload)
+            new_entries.append(dict(entry, kind=kind, file=filename, bytes=len(payload)))
+            previous = document
+        index = "".join(json.dumps(entry) + "\n" for entry in new_entries)
+        txn.write(self._index_path, index.encode("utf-8"), commit=True)
+        txn.commit()
+        keep = {entry["file"] for entry in new_entries} | {INDEX_FILENAME}
+        for name in os.listdir(self.history_dir):
+            if name not in keep:
+                os.remove(os.path.join(self.history_dir, name))
+        return sum(entry["bytes"] for entry in history) - sum(entry["bytes"] for entry in new_entries)
+
+    def _encode_version(self, version, previous, document, full=None):
+        """Return ("checkpoint" | "delta", payload) for storing document as version"""
+        full = full if full is not None else _encode(document)
+        if previous is None or (version - 1) % self.checkpoint_interval == 0:
+            return "checkpoint", full
+        delta = _encode(diff_values(previous, document))
+        if len(delta) * 2 < len(full):
+            return "delta", delta
+        return "checkpoint", full
+